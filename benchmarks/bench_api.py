@@ -0,0 +1,173 @@
+"""
+Recorded-page benchmark for SearchTruthAPI with regression baselines
+
+Replays the recorded pages in benchmarks/fixtures through the public
+SearchTruthAPI methods (search_quran, search_hadith, search_dictionary,
+fetch_cities). An injected httpx transport serves the page, so the whole
+fetch, decode and parse path runs without touching the network. For each
+page it reports:
+
+    call     wall time of the API call (best of --rounds)
+    parse    CPU time of the HTML parser inside it (best of --rounds)
+    peak     peak traced memory during one call, above what was live before
+    retained memory still allocated after the call, i.e. not released
+    results  fingerprint of the returned list, to catch output changes
+
+and compares them with benchmarks/baselines/bench_api.json. The run fails
+when a page's results change, its parse time grows by more than
+--time-tolerance or its peak memory by more than --memory-tolerance;
+after an intended change, refresh the baseline with --update-baseline.
+Peak memory and results are deterministic, CPU time is not: baselines
+are only comparable on the machine that recorded them.
+
+Usage: python benchmarks/bench_api.py [--rounds N] [--time-tolerance 0.5] [--update-baseline]
+"""
+import gc
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import tracemalloc
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_parsers import load_fixtures  # noqa: E402
+from http_client import HTTPClient  # noqa: E402
+from search_apis import SearchTruthAPI  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'bench_api.json')
+
+# Regressions smaller than these are measurement noise, whatever the tolerance
+MIN_PARSE_REGRESSION_MS = 0.3
+MIN_PEAK_REGRESSION_KB = 16
+
+# How each fixture's parser is reached through the public API
+CALLS = {
+    'quran': lambda api, args: api.search_quran(args['keyword'], max_results=args['max_results']),
+    'hadith': lambda api, args: api.search_hadith(args['keyword'], max_results=args['max_results']),
+    'dictionary': lambda api, args: api.search_dictionary(args['word'], max_results=args['max_results']),
+    'cities': lambda api, args: api.fetch_cities('Pakistan'),
+}
+
+class TimedAPI(SearchTruthAPI):
+    """SearchTruthAPI that records the CPU time of its last parse"""
+    
+    parse_seconds = 0.0
+    
+    async def _parse(self, parser, *args):
+        def timed(*parser_args):
+            start = time.thread_time()
+            try:
+                return parser(*parser_args)
+            finally:
+                self.parse_seconds = time.thread_time() - start
+        
+        return await super()._parse(timed, *args)
+
+def replaying(content: bytes) -> SearchTruthAPI:
+    """An uncached API whose every request is answered with content"""
+    transport = httpx.MockTransport(lambda request: httpx.Response(
+        200, content=content, headers={'Content-Type': 'text/html'}
+    ))
+    return TimedAPI(client=HTTPClient(transport=transport, hedge_budget=0))
+
+def fingerprint(results) -> str:
+    return hashlib.sha256(json.dumps(results, ensure_ascii=False).encode()).hexdigest()[:16]
+
+async def measure(fixture: dict, content: bytes, rounds: int) -> dict:
+    api = replaying(content)
+    call = CALLS[fixture['parser']]
+    try:
+        results = await call(api, fixture['args'])  # warm up the executor and connection
+        
+        best_call = best_parse = float('inf')
+        gc.disable()  # a collection landing in one call is noise, not parser cost
+        try:
+            for _ in range(rounds):
+                start = time.perf_counter()
+                await call(api, fixture['args'])
+                best_call = min(best_call, time.perf_counter() - start)
+                best_parse = min(best_parse, api.parse_seconds)
+        finally:
+            gc.enable()
+        
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await call(api, fixture['args'])
+            after, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        await api.aclose()
+    
+    return {
+        "call_ms": round(best_call * 1000, 3),
+        "parse_ms": round(best_parse * 1000, 3),
+        "peak_kb": round((peak - before) / 1024, 1),
+        "retained_kb": round((after - before) / 1024, 1),
+        "results": fingerprint(results)
+    }
+
+def regressions(name: str, current: dict, baseline: dict, time_tolerance: float, memory_tolerance: float) -> list:
+    """Human-readable reasons current is worse than baseline"""
+    problems = []
+    if current["results"] != baseline["results"]:
+        problems.append(f"{name}: results changed ({baseline['results']} -> {current['results']})")
+    for metric, tolerance, floor in (("parse_ms", time_tolerance, MIN_PARSE_REGRESSION_MS),
+                                     ("peak_kb", memory_tolerance, MIN_PEAK_REGRESSION_KB)):
+        limit = max(baseline[metric] * (1 + tolerance), baseline[metric] + floor)
+        if current[metric] > limit:
+            problems.append(f"{name}: {metric} {baseline[metric]} -> {current[metric]} (limit {limit:.1f})")
+    return problems
+
+async def run(rounds: int) -> dict:
+    return {fixture['file']: await measure(fixture, content, rounds) for fixture, content in load_fixtures()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--rounds', type=int, default=50, help='timed calls per fixture')
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help='allowed relative growth of parse time')
+    parser.add_argument('--memory-tolerance', type=float, default=0.1, help='allowed relative growth of peak memory')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help='store this run as the new baseline')
+    args = parser.parse_args()
+    
+    measured = asyncio.run(run(args.rounds))
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    
+    problems = []
+    print(f"{'fixture':<34} {'call':>9} {'parse':>9} {'peak':>9} {'retained':>9}  vs baseline")
+    for name, current in measured.items():
+        base = baseline.get(name)
+        if base is None:
+            verdict = "new"
+        else:
+            found = regressions(name, current, base, args.time_tolerance, args.memory_tolerance)
+            problems.extend(found)
+            verdict = "REGRESSED" if found else f"parse {current['parse_ms'] - base['parse_ms']:+.2f}ms"
+        print(f"{name:<34} {current['call_ms']:>7.2f}ms {current['parse_ms']:>7.2f}ms "
+              f"{current['peak_kb']:>6.1f}KiB {current['retained_kb']:>6.1f}KiB  {verdict}")
+    
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(measured, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+    elif problems:
+        print(f"\n{len(problems)} regression(s):")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Before/after CPU benchmark for the SearchTruth page parsers
+
+Replays the recorded pages in benchmarks/fixtures through the original
+BeautifulSoup/html.parser implementation and the lxml parsers in
+parsers.py, checks that both produce identical results and reports the
+CPU time per page.
+
+Usage: python benchmarks/bench_parsers.py [--repeat N]
+"""
+import os
+import re
+import sys
+import html
+import json
+import time
+import argparse
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import parsers  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# ========== REFERENCE (html.parser) IMPLEMENTATION ==========
+
+def _clean_text(text):
+    text = re.sub(r'\s+', ' ', text)
+    text = html.unescape(text)
+    return text.strip()
+
+def legacy_parse_quran(content, keyword, max_results):
+    soup = BeautifulSoup(content, 'html.parser')
+    results = []
+    for selector in ['div[style*="margin"]', 'table[width="100%"]', '.search_result', '.verse_div']:
+        elements = soup.select(selector)
+        if elements:
+            for element in elements[:max_results]:
+                text = element.get_text(strip=True, separator=' ')
+                if text and len(text) > 20 and keyword.lower() in text.lower():
+                    results.append(_clean_text(text)[:500])
+            if results:
+                break
+    if not results:
+        lines = [line.strip() for line in soup.get_text().split('\n') if line.strip()]
+        for line in lines:
+            if keyword.lower() in line.lower() and len(line) > 30:
+                clean_line = _clean_text(line)
+                if clean_line not in results:
+                    results.append(clean_line[:500])
+                    if len(results) >= max_results:
+                        break
+    return results
+
+def legacy_parse_hadith(content, keyword, max_results):
+    soup = BeautifulSoup(content, 'html.parser')
+    results = []
+    for selector in ['div[style*="margin"]', 'table[border="0"]', '.hadith_result', 'tr[bgcolor]']:
+        elements = soup.select(selector)
+        if elements:
+            for element in elements[:max_results]:
+                text = element.get_text(strip=True, separator=' ')
+                if text and len(text) > 30 and keyword.lower() in text.lower():
+                    results.append(_clean_text(text)[:600])
+            if results:
+                break
+    if not results:
+        paragraphs = [p.strip() for p in soup.get_text().split('\n\n') if p.strip()]
+        for para in paragraphs:
+            if keyword.lower() in para.lower() and len(para) > 50:
+                results.append(_clean_text(para)[:600])
+                if len(results) >= max_results:
+                    break
+    return results
+
+def legacy_parse_dictionary(content, word, max_results):
+    soup = BeautifulSoup(content, 'html.parser')
+    results = []
+    for entry in soup.find_all('tr', bgcolor=True)[:max_results]:
+        text = entry.get_text(strip=True, separator=' | ')
+        if text and len(text) > 10:
+            results.append(_clean_text(text)[:400])
+    if not results:
+        for table in soup.find_all('table', width=lambda x: x and x == '100%'):
+            text = table.get_text(strip=True, separator=' | ')
+            if word.lower() in text.lower() and len(text) > 20:
+                results.append(text[:400])
+                if len(results) >= max_results:
+                    break
+    return results
+
+def legacy_parse_cities(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    cities = []
+    for link in soup.find_all('a', href=lambda x: x and 'prayertimes' in x and 'city=' in x):
+        city_name = link.get_text(strip=True)
+        if city_name and city_name not in cities:
+            cities.append(city_name)
+    return cities
+
+LEGACY = {
+    'quran': legacy_parse_quran,
+    'hadith': legacy_parse_hadith,
+    'dictionary': legacy_parse_dictionary,
+    'cities': legacy_parse_cities
+}
+
+CURRENT = {
+    'quran': parsers.parse_quran,
+    'hadith': parsers.parse_hadith,
+    'dictionary': parsers.parse_dictionary,
+    'cities': parsers.parse_cities
+}
+
+# ========== BENCHMARK ==========
+
+def load_fixtures():
+    with open(os.path.join(FIXTURES_DIR, 'manifest.json')) as f:
+        manifest = json.load(f)
+    for fixture in manifest:
+        with open(os.path.join(FIXTURES_DIR, fixture['file']), 'rb') as f:
+            yield fixture, f.read()
+
+def cpu_time(fn, args, repeat, rounds=5):
+    """Best per-call CPU time over several rounds, to damp scheduler noise"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.process_time()
+        for _ in range(repeat):
+            fn(*args)
+        best = min(best, (time.process_time() - start) / repeat)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=20, help='parses per fixture and implementation')
+    args = parser.parse_args()
+    
+    mismatches = 0
+    total_before = total_after = 0.0
+    print(f"{'fixture':<34} {'html.parser':>12} {'lxml':>10} {'speedup':>8}  output")
+    for fixture, content in load_fixtures():
+        call_args = (content,) + tuple(fixture['args'].values())
+        expected = LEGACY[fixture['parser']](*call_args)
+        actual = CURRENT[fixture['parser']](*call_args)
+        same = expected == actual
+        mismatches += not same
+        
+        before = cpu_time(LEGACY[fixture['parser']], call_args, args.repeat)
+        after = cpu_time(CURRENT[fixture['parser']], call_args, args.repeat)
+        total_before += before
+        total_after += after
+        print(f"{fixture['file']:<34} {before * 1000:>10.2f}ms {after * 1000:>8.2f}ms "
+              f"{before / after:>7.1f}x  {'identical' if same else 'DIFFERENT'}")
+    
+    print(f"{'total':<34} {total_before * 1000:>10.2f}ms {total_after * 1000:>8.2f}ms "
+          f"{total_before / total_after:>7.1f}x")
+    if mismatches:
+        print(f"\n{mismatches} fixture(s) produced different results")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
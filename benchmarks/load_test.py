@@ -0,0 +1,361 @@
+"""
+End-to-end load test of the bot against local stand-ins
+
+Builds the real Application from main.py and drives it with simulated
+users, with nothing leaving the process:
+
+* FakeBotAPI replaces api.telegram.org: it answers every Bot API call
+  after --bot-api-ms and remembers the keyboard each chat is shown, so
+  users press the buttons the bot actually sent
+* StubOrigin replaces www.searchtruth.com: it serves the recorded pages
+  in benchmarks/fixtures after about --origin-ms, with the recorded
+  keyword swapped for the searched one so every search finds results
+
+Each user starts at /start and runs --flows of these menu flows:
+
+    quran       main_quran -> quran_search -> keyword -> qtrans_*
+    hadith      main_hadith -> hadith_search -> hcollection_* -> keyword
+    dictionary  main_dict -> dict_search -> word -> dicttype_*
+
+Updates go through the update queue, the update processor, handlers,
+caches, rate limiter and persistence exactly as in production. The report
+gives updates per second, handler latency (update queued to update
+handled) per step, event loop lag and the upstream and Bot API traffic.
+
+State and cache files are written to a temporary directory. Telegram's
+flood limits are lifted unless --flood-control is given, so the numbers
+show what the bot itself can handle.
+
+Usage: python benchmarks/load_test.py [--users 1000] [--flows 2] [--ramp 10] [--think 1]
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import itertools
+import logging
+import tempfile
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FIXTURES_DIR = os.path.join(REPO_DIR, 'benchmarks', 'fixtures')
+sys.path.insert(0, REPO_DIR)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "SearchTruth", "username": "searchtruth_load_bot"}
+
+# Steps of each flow: press a button whose callback_data starts with the prefix, or send a search
+FLOWS = {
+    'quran': [('press', 'main_quran'), ('press', 'quran_search'), ('type', 'quran'), ('press', 'qtrans_')],
+    'hadith': [('press', 'main_hadith'), ('press', 'hadith_search'), ('press', 'hcollection_'), ('type', 'hadith')],
+    'dictionary': [('press', 'main_dict'), ('press', 'dict_search'), ('type', 'dictionary'), ('press', 'dicttype_')],
+}
+
+# Origin path -> (recorded page, keyword recorded in it, query parameter carrying the keyword)
+ORIGIN_PAGES = {
+    '/search.php': ('quran_mercy.html', 'mercy', 'keyword'),
+    '/searchHadith.php': ('hadith_prayer.html', 'prayer', 'keyword'),
+    '/dictionary/arabic_english_dictionary.php': ('dictionary_book_cp1256.html', 'book', 'word'),
+}
+SEARCH_WORDS = {'quran': 'mercy', 'hadith': 'prayer', 'dictionary': 'book'}
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+class ChatScreen:
+    """What one chat shows: its messages' keyboards and the newest message"""
+    
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.keyboards: Dict[int, Optional[dict]] = {}
+        self.latest = 0
+    
+    def button(self, prefix: str) -> Optional[str]:
+        """callback_data of the first button on the newest message starting with prefix"""
+        markup = self.keyboards.get(self.latest) or {}
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        for row in markup.get('inline_keyboard', []):
+            for button in row:
+                if button.get('callback_data', '').startswith(prefix):
+                    return button['callback_data']
+        return None
+
+class FakeBotAPI(BaseRequest):
+    """In-process stand-in for the Telegram Bot API"""
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter()
+        self.error_replies = 0
+        self.chats: Dict[int, ChatScreen] = defaultdict(ChatScreen)
+    
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        pass
+    
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result = self._answer(endpoint, request_data.parameters if request_data else {})
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+    
+    def _answer(self, endpoint: str, params: Dict):
+        if endpoint == 'getMe':
+            return BOT_USER
+        if endpoint not in ('sendMessage', 'editMessageText'):
+            return True
+        
+        chat_id = int(params['chat_id'])
+        screen = self.chats[chat_id]
+        if endpoint == 'sendMessage':
+            message_id = screen.latest = next(screen.ids)
+        else:
+            message_id = int(params['message_id'])
+        screen.keyboards[message_id] = params.get('reply_markup')
+        text = params.get('text', '')
+        if text.startswith('❌'):
+            self.error_replies += 1
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text
+        }
+
+class StubOrigin:
+    """httpx handler serving recorded SearchTruth pages for any keyword"""
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self._recorded = {}
+        self._pages = {}
+    
+    def _page(self, name: str, recorded: str, keyword: str) -> bytes:
+        page = self._pages.get((name, keyword))
+        if page is None:
+            if name not in self._recorded:
+                with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                    self._recorded[name] = f.read()
+            pattern = re.compile(re.escape(recorded.encode()), re.IGNORECASE)
+            page = self._pages[(name, keyword)] = pattern.sub(keyword.encode(), self._recorded[name])
+        return page
+    
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency:
+            # Log-normal around the median, like real response times
+            await asyncio.sleep(random.lognormvariate(math.log(self.latency), 0.5))
+        page = ORIGIN_PAGES.get(request.url.path)
+        if page is None:
+            return httpx.Response(404)
+        name, recorded, param = page
+        keyword = request.url.params.get(param, recorded)
+        return httpx.Response(200, content=self._page(name, recorded, keyword),
+                              headers={'Content-Type': 'text/html'})
+
+class LoadTest:
+    """Runs simulated users against an Application and collects timings"""
+    
+    def __init__(self, application, bot_api: FakeBotAPI, queries: int, think: float, timeout: float = 60):
+        self.application = application
+        self.bot_api = bot_api
+        self.queries = queries
+        self.think = think
+        self.timeout = timeout
+        self.update_ids = itertools.count(1)
+        self._pending: Dict[int, tuple] = {}  # update_id -> (future, queued at)
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.loop_lag: List[float] = []
+        self.failures = Counter()
+        self.handled = 0
+    
+    async def handled_update(self, update: Update, context) -> None:
+        """Last handler group: the update went through every handler"""
+        entry = self._pending.pop(update.update_id, None)
+        if entry is not None and not entry[0].done():
+            entry[0].set_result(time.perf_counter() - entry[1])
+        self.handled += 1
+    
+    async def _submit(self, label: str, payload: dict) -> bool:
+        update_id = next(self.update_ids)
+        payload["update_id"] = update_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[update_id] = (future, time.perf_counter())
+        await self.application.update_queue.put(Update.de_json(payload, self.application.bot))
+        try:
+            self.latency[label].append(await asyncio.wait_for(future, self.timeout))
+            return True
+        except asyncio.TimeoutError:
+            self._pending.pop(update_id, None)
+            self.failures[f"{label}: timed out"] += 1
+            return False
+    
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    
+    def _message(self, user_id: int, text: str) -> dict:
+        message = {
+            "message_id": next(self.bot_api.chats[user_id].ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text
+        }
+        if text.startswith('/'):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        return message
+    
+    async def send(self, label: str, user_id: int, text: str) -> bool:
+        return await self._submit(label, {"message": self._message(user_id, text)})
+    
+    async def press(self, label: str, user_id: int, prefix: str) -> bool:
+        screen = self.bot_api.chats[user_id]
+        data = screen.button(prefix)
+        if data is None:
+            self.failures[f"{label}: no button"] += 1
+            return False
+        return await self._submit(label, {"callback_query": {
+            "id": str(next(self.update_ids)),
+            "from": self._user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": screen.latest,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "menu"
+            }
+        }})
+    
+    async def run_user(self, user_id: int, flows: List[str]) -> None:
+        for flow in flows:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.think)
+            if not await self.send(f"{flow} /start", user_id, '/start'):
+                continue
+            for action, arg in FLOWS[flow]:
+                await asyncio.sleep(random.uniform(0.5, 1.5) * self.think)
+                label = f"{flow} {arg if action == 'press' else 'search text'}"
+                if action == 'press':
+                    done = await self.press(label, user_id, arg)
+                else:
+                    word = f"{SEARCH_WORDS[arg]}{random.randrange(self.queries)}"
+                    done = await self.send(label, user_id, word)
+                if not done:
+                    break
+    
+    async def sample_loop_lag(self, interval: float = 0.02) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(time.perf_counter() - start - interval)
+
+async def run(args) -> None:
+    workdir = tempfile.mkdtemp(prefix='searchtruth-load-')
+    os.chdir(workdir)  # state and cache files land here, not in the checkout
+    
+    import main
+    from cache import search_cache
+    from http_client import http_client
+    from rate_limiter import TokenBucket
+    from search_apis import search_api
+    
+    logging.getLogger().setLevel(logging.WARNING)
+    origin = StubOrigin(args.origin_ms / 1000)
+    http_client.transport = httpx.MockTransport(origin)
+    # Always go to the origin, whatever offline indexes exist
+    search_api.quran_library = search_api.hadith_library = search_api.dictionary = None
+    
+    bot_api = FakeBotAPI(args.bot_api_ms / 1000)
+    application = main.build_application(request=bot_api)
+    if not args.flood_control:
+        limiter = application.bot.rate_limiter
+        limiter.global_bucket = TokenBucket(1e9, 1e9)
+        limiter.chat_rate = limiter.chat_burst = limiter.group_rate = 1e9
+    
+    test = LoadTest(application, bot_api, args.queries, args.think)
+    application.add_handler(TypeHandler(Update, test.handled_update), group=99)
+    
+    await application.initialize()
+    await application.start()
+    lag_task = asyncio.get_running_loop().create_task(test.sample_loop_lag())
+    
+    rng = random.Random(args.seed)
+    users = []
+    started = time.perf_counter()
+    for user_id in range(1000, 1000 + args.users):
+        flows = [rng.choice(list(FLOWS)) for _ in range(args.flows)]
+        users.append(asyncio.get_running_loop().create_task(test.run_user(user_id, flows)))
+        await asyncio.sleep(args.ramp / args.users)
+    await asyncio.gather(*users)
+    elapsed = time.perf_counter() - started
+    
+    lag_task.cancel()
+    processing = application.update_processor.stats()
+    limiter_stats = application.bot.rate_limiter.stats()
+    await application.stop()
+    await application.shutdown()
+    await http_client.aclose()
+    
+    all_latency = [value for values in test.latency.values() for value in values]
+    print(f"\n{args.users} users x {args.flows} flows in {elapsed:.1f}s (ramp {args.ramp}s, think {args.think}s)")
+    print(f"updates handled: {test.handled}  ->  {test.handled / elapsed:.1f} updates/s")
+    print(f"\n{'step':<34} {'count':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for label, values in sorted(test.latency.items()) + [("all updates", all_latency)]:
+        print(f"{label:<34} {len(values):>6} {percentile(values, 0.5) * 1000:>8.1f} "
+              f"{percentile(values, 0.99) * 1000:>8.1f} {max(values, default=0) * 1000:>8.1f}")
+    print(f"\nevent loop lag: p50 {percentile(test.loop_lag, 0.5) * 1000:.1f} ms, "
+          f"p99 {percentile(test.loop_lag, 0.99) * 1000:.1f} ms, max {max(test.loop_lag, default=0) * 1000:.1f} ms")
+    print(f"origin requests: {origin.requests}, search cache: {search_cache.stats()}")
+    print(f"Bot API calls: {dict(bot_api.calls)}")
+    print(f"update processing: {processing}")
+    print(f"rate limiter: {limiter_stats}")
+    failures = sum(test.failures.values()) + bot_api.error_replies
+    print(f"failures: {failures} {dict(test.failures)} ({bot_api.error_replies} error replies)")
+    print(f"state and cache files: {workdir}")
+    if failures:
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--flows', type=int, default=2, help='menu flows each user runs')
+    parser.add_argument('--ramp', type=float, default=10, help='seconds over which users arrive')
+    parser.add_argument('--think', type=float, default=1.0, help='mean seconds a user waits between steps')
+    parser.add_argument('--queries', type=int, default=500, help='distinct search words, sets the cache hit ratio')
+    parser.add_argument('--origin-ms', type=float, default=150, help='median SearchTruth response time')
+    parser.add_argument('--bot-api-ms', type=float, default=30, help='Bot API response time')
+    parser.add_argument('--flood-control', action='store_true', help="keep Telegram's outbound rate limits")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""
+Tiered result cache for SearchTruth searches
+
+An in-memory LRU with TTL sits in front of a persistent SQLite store, so
+popular searches survive restarts. Only parsed result lists are cached,
+never raw HTML. Expired entries are kept for a further stale_ttl so they
+can still be served (get_stale) while SearchTruth is unavailable.
+"""
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from config import (
+    CACHE_TTL, CACHE_MEMORY_ENTRIES, CACHE_DB_PATH, CACHE_DB_MAX_BYTES, CACHE_DB_TOUCH_INTERVAL, CACHE_STALE_TTL
+)
+
+try:
+    import redis
+    STORE_ERRORS = (sqlite3.Error, redis.RedisError)
+except ImportError:
+    redis = None
+    STORE_ERRORS = (sqlite3.Error,)
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """Bounded in-memory LRU cache with per-entry TTL"""
+    
+    def __init__(self, max_entries: int = CACHE_MEMORY_ENTRIES, ttl: float = CACHE_TTL, stale_ttl: float = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable):
+        """Return the cached value or None if missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        expires_at, value = entry
+        now = time.time()
+        if expires_at < now:
+            if expires_at + self.stale_ttl < now:
+                del self._data[key]
+            self.misses += 1
+            return None
+        
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def get_stale(self, key: Hashable):
+        """Return the value even if expired, as long as it is within stale_ttl"""
+        entry = self._data.get(key)
+        if entry is None or entry[0] + self.stale_ttl < time.time():
+            return None
+        return entry[1]
+    
+    def set(self, key: Hashable, value, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries when full"""
+        self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+    
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SQLiteCache:
+    """Persistent result store bounded by total stored size"""
+    
+    def __init__(self, path: str = CACHE_DB_PATH, max_bytes: int = CACHE_DB_MAX_BYTES, stale_ttl: float = 0,
+                 touch_interval: float = CACHE_DB_TOUCH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self.touch_interval = touch_interval
+        self._conn = None
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection opened on first use"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+            self.size_bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM results").fetchone()[0]
+        return self._conn
+    
+    def get(self, key: str) -> Optional[Tuple[float, List[str]]]:
+        """Return (expires_at, value) or None if missing or expired"""
+        row = self.conn.execute(
+            "SELECT value, expires_at, accessed_at FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or row[1] < now:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        # Eviction only needs a rough recency order, so most hits skip the write
+        if now - row[2] > self.touch_interval:
+            self.conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        return row[1], json.loads(row[0])
+    
+    def get_stale(self, key: str) -> Optional[List[str]]:
+        """Return the value even if expired, as long as it is within stale_ttl"""
+        row = self.conn.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] + self.stale_ttl < time.time():
+            return None
+        return json.loads(row[0])
+    
+    def set(self, key: str, value: List[str], ttl: float = CACHE_TTL) -> None:
+        """Store a value, evicting least recently used rows above max_bytes"""
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        old = self.conn.execute("SELECT LENGTH(value) FROM results WHERE key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, payload, now + ttl, now)
+        )
+        self.size_bytes += len(payload) - (old[0] if old else 0)
+        if self.size_bytes > self.max_bytes:
+            self._evict()
+        self.conn.commit()
+    
+    def _evict(self) -> None:
+        """Drop rows past their stale window, then least recently used ones down to 90% of max_bytes"""
+        self.conn.execute("DELETE FROM results WHERE expires_at < ?", (time.time() - self.stale_ttl,))
+        self.size_bytes = self.conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM results").fetchone()[0]
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT key, LENGTH(value) FROM results ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if self.size_bytes <= target:
+                break
+            self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self.size_bytes -= size
+            self.evictions += 1
+    
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class RedisCache:
+    """Shared store in Redis; entries expire through Redis key TTLs"""
+    
+    def __init__(self, url: str, prefix: str, client=None, stale_ttl: float = 0):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("RedisCache needs the 'redis' package: pip install redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.stale_ttl = stale_ttl  # keys live this much longer than their TTL
+        self.size_bytes = 0  # not tracked; Redis enforces its own memory limit
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[Tuple[float, List[str]]]:
+        """Return (expires_at, value) or None if missing or expired"""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.prefix + key)
+        pipe.pttl(self.prefix + key)
+        payload, ttl_ms = pipe.execute()
+        expires_at = time.time() + max(ttl_ms, 0) / 1000 - self.stale_ttl
+        if payload is None or expires_at < time.time():
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return expires_at, json.loads(payload)
+    
+    def get_stale(self, key: str) -> Optional[List[str]]:
+        payload = self.client.get(self.prefix + key)
+        return json.loads(payload) if payload is not None else None
+    
+    def set(self, key: str, value: List[str], ttl: float = CACHE_TTL) -> None:
+        self.client.set(
+            self.prefix + key, json.dumps(value, ensure_ascii=False), ex=max(int(ttl + self.stale_ttl), 1)
+        )
+    
+    def close(self) -> None:
+        self.client.close()
+
+class TieredCache:
+    """Memory LRU in front of an optional SQLite or Redis store
+    
+    The store is only used from one worker thread, so a slow disk or Redis
+    round trip never blocks the event loop: reads that miss memory are
+    awaited, writes are queued behind the memory update (write-behind).
+    """
+    
+    def __init__(self, memory: Optional[LRUCache] = None, disk: Optional[SQLiteCache] = None):
+        self.memory = memory if memory is not None else LRUCache()
+        self.disk = disk
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-store') if disk is not None else None
+    
+    @staticmethod
+    def make_key(endpoint: str, *parts) -> Tuple:
+        """Build a cache key such as ('quran', 'mercy', '2', '2', 5)"""
+        return (endpoint,) + tuple(str(p).strip().lower() if isinstance(p, str) else p for p in parts)
+    
+    async def _run(self, call, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call, *args)
+    
+    async def get(self, key: Tuple) -> Optional[List[str]]:
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        
+        try:
+            entry = await self._run(self.disk.get, json.dumps(key))
+        except STORE_ERRORS as e:
+            logger.error(f"Cache read error: {e}")
+            return None
+        if entry is None:
+            return None
+        
+        # Promote to memory for the rest of its lifetime
+        expires_at, value = entry
+        self.memory.set(key, value, ttl=expires_at - time.time())
+        return value
+    
+    async def get_stale(self, key: Tuple) -> Optional[List[str]]:
+        """Return a value past its TTL but within the stale window, for when it cannot be refreshed"""
+        value = self.memory.get_stale(key)
+        if value is not None or self.disk is None:
+            return value
+        
+        try:
+            return await self._run(self.disk.get_stale, json.dumps(key))
+        except STORE_ERRORS as e:
+            logger.error(f"Cache read error: {e}")
+            return None
+    
+    def set(self, key: Tuple, value: List[str]) -> None:
+        """Store in memory now and in the store once the worker gets to it"""
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self._executor.submit(self._write, json.dumps(key), value, self.memory.ttl)
+    
+    def _write(self, key: str, value: List[str], ttl: float) -> None:
+        try:
+            self.disk.set(key, value, ttl=ttl)
+        except STORE_ERRORS as e:
+            logger.error(f"Cache write error: {e}")
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters for each tier"""
+        stats = {
+            "memory_entries": len(self.memory),
+            "memory_hits": self.memory.hits,
+            "memory_misses": self.memory.misses,
+            "memory_evictions": self.memory.evictions
+        }
+        if self.disk is not None:
+            stats.update({
+                "disk_bytes": self.disk.size_bytes,
+                "disk_hits": self.disk.hits,
+                "disk_misses": self.disk.misses,
+                "disk_evictions": self.disk.evictions
+            })
+        return stats
+    
+    def close(self) -> None:
+        """Finish queued writes and close the store"""
+        if self.disk is not None:
+            self._executor.shutdown(wait=True)
+            self.disk.close()
+
+# Shared by search_apis.search_api
+search_cache = TieredCache(
+    LRUCache(stale_ttl=CACHE_STALE_TTL),
+    SQLiteCache(stale_ttl=CACHE_STALE_TTL) if CACHE_DB_PATH else None
+)
@@ -0,0 +1,83 @@
+"""
+Server-side payloads for inline keyboard buttons
+
+Telegram limits callback_data to 64 bytes, so buttons carry only a route
+prefix and a short opaque ID, e.g. 'qtrans_Xk3v9QbR2mA'. The structured
+payload behind the ID (search keyword, city name, ...) lives in a bounded
+LRU with TTL, optionally backed by SQLite so buttons keep working across
+restarts.
+
+With PERSISTENCE_BACKEND = "redis" the payloads are kept in Redis
+instead, so a button drawn by one bot process works on any other.
+Either way the store is reached from the cache's worker thread: pack()
+writes it in the background, unpack() awaits it only on a memory miss.
+
+IDs are a hash of the prefix and payload, so drawing the same keyboard
+again reuses its IDs (and refreshes their TTL) instead of adding entries.
+"""
+import json
+import base64
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from cache import LRUCache, RedisCache, SQLiteCache, TieredCache
+from config import (
+    CALLBACK_STORE_ENTRIES, CALLBACK_STORE_TTL, CALLBACK_STORE_DB_PATH, CALLBACK_STORE_DB_MAX_BYTES,
+    PERSISTENCE_BACKEND, PERSISTENCE_REDIS_URL, PERSISTENCE_REDIS_PREFIX
+)
+
+logger = logging.getLogger(__name__)
+
+class CallbackStore:
+    """Maps short callback IDs to payload dicts"""
+    
+    def __init__(self, cache: Optional[TieredCache] = None):
+        self.cache = cache or TieredCache(LRUCache(CALLBACK_STORE_ENTRIES, CALLBACK_STORE_TTL))
+        self.expired = 0
+    
+    @staticmethod
+    def make_id(prefix: str, payload: Dict) -> str:
+        """11-character URL-safe ID derived from the prefix and payload"""
+        encoded = json.dumps([prefix, payload], sort_keys=True, ensure_ascii=False).encode('utf-8')
+        digest = hashlib.blake2b(encoded, digest_size=8).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+    
+    def pack(self, prefix: str, **payload) -> str:
+        """callback_data for a payload: the route prefix followed by its ID"""
+        key = self.make_id(prefix, payload)
+        self.cache.set(('callback', key), payload)
+        return f'{prefix}{key}'
+    
+    async def unpack(self, prefix: str, callback_data: str) -> Optional[Dict]:
+        """Payload behind callback_data, or None if it expired or was never stored"""
+        payload = await self.cache.get(('callback', callback_data[len(prefix):]))
+        if payload is None:
+            self.expired += 1
+            logger.info(f"Expired callback: {callback_data}")
+        return payload
+    
+    def stats(self) -> Dict:
+        stats = self.cache.stats()
+        stats["expired"] = self.expired
+        return stats
+    
+    def close(self) -> None:
+        self.cache.close()
+
+def redis_tier(namespace: str) -> Optional[RedisCache]:
+    """The Redis store shared by every bot process, when state is shared at all"""
+    if PERSISTENCE_BACKEND == 'redis':
+        return RedisCache(PERSISTENCE_REDIS_URL, PERSISTENCE_REDIS_PREFIX + namespace)
+    return None
+
+def _shared_tier():
+    """Redis when state is shared between processes, else the optional SQLite file"""
+    if PERSISTENCE_BACKEND == 'redis':
+        return redis_tier('callback:')
+    if CALLBACK_STORE_DB_PATH:
+        return SQLiteCache(CALLBACK_STORE_DB_PATH, CALLBACK_STORE_DB_MAX_BYTES)
+    return None
+
+# Shared by every keyboard builder in handlers/
+callback_store = CallbackStore(TieredCache(LRUCache(CALLBACK_STORE_ENTRIES, CALLBACK_STORE_TTL), _shared_tier()))
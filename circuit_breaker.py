@@ -0,0 +1,99 @@
+"""
+Circuit breakers for SearchTruth.com endpoints
+
+Each endpoint (Quran search, Hadith search, dictionary, prayer time
+cities) has its own breaker. After CIRCUIT_FAILURE_THRESHOLD consecutive
+timeouts, connection errors or 5xx responses it opens: requests to that
+endpoint fail at once, or are answered from stale cache, instead of each
+waiting out REQUEST_TIMEOUT. After CIRCUIT_RESET_TIMEOUT one probe request
+is let through; its success closes the breaker, its failure opens it again.
+"""
+import time
+import logging
+from typing import Dict
+
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose breaker is open"""
+    
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is unavailable, retrying in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+    
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._open = False
+        self.opened_at = 0.0
+        self._probe_until = 0.0  # a probe not back by then is presumed lost
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self.stale_served = 0
+    
+    @property
+    def state(self) -> str:
+        if not self._open:
+            return CLOSED
+        return HALF_OPEN if time.monotonic() >= self.opened_at + self.reset_timeout else OPEN
+    
+    def retry_in(self) -> float:
+        """Seconds until the breaker lets a probe through"""
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0) if self._open else 0.0
+    
+    def allow_request(self) -> bool:
+        """Whether a request may go upstream; in half-open state only one at a time does"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        now = time.monotonic()
+        if state == HALF_OPEN and now >= self._probe_until:
+            self._probe_until = now + self.reset_timeout
+            return True
+        self.rejected += 1
+        return False
+    
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if self._open:
+            self._open = False
+            self._probe_until = 0.0
+            logger.info(f"Circuit {self.name} closed, endpoint recovered")
+    
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.failures += 1
+        if self._open or self.consecutive_failures >= self.failure_threshold:
+            if not self._open:
+                self.opened += 1
+                logger.warning(
+                    f"Circuit {self.name} opened after {self.consecutive_failures} consecutive failures"
+                )
+            self._open = True
+            self.opened_at = time.monotonic()
+            self._probe_until = 0.0
+    
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "stale_served": self.stale_served,
+            "retry_in_s": round(self.retry_in(), 1)
+        }
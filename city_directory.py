@@ -0,0 +1,96 @@
+"""
+In-memory prayer city directory for every configured country
+
+City lists are indexed for all of config.COUNTRIES at startup from the
+bundled prayer-time table, so country and city keyboards are served from
+memory and every city button can be answered with locally computed times.
+"""
+import time
+import logging
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+from config import COUNTRIES
+from offline import prayer_times
+
+logger = logging.getLogger(__name__)
+
+class CityIndex:
+    """Sorted, case-folded city names of one country"""
+    
+    __slots__ = ('names', 'keys', 'loaded_at')
+    
+    def __init__(self, names: List[str]):
+        names = sorted(set(names), key=str.casefold)
+        self.names: Tuple[str, ...] = tuple(names)
+        self.keys: Tuple[str, ...] = tuple(name.casefold() for name in names)
+        self.loaded_at = time.time()
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def page(self, offset: int, limit: int) -> List[str]:
+        return list(self.names[offset:offset + limit])
+    
+    def search(self, text: str, limit: int) -> List[str]:
+        """Names starting with text, then names containing it, alphabetically"""
+        needle = text.strip().casefold()
+        if not needle:
+            return []
+        start = bisect_left(self.keys, needle)
+        end = start
+        while end < len(self.keys) and end - start < limit and self.keys[end].startswith(needle):
+            end += 1
+        matches = list(self.names[start:end])
+        if len(matches) < limit:
+            for name, key in zip(self.names, self.keys):
+                if needle in key and not key.startswith(needle):
+                    matches.append(name)
+                    if len(matches) >= limit:
+                        break
+        return matches
+
+class CityDirectory:
+    """City indexes for all countries, built from the bundled prayer-time table
+    
+    Only cities with coordinates are listed: prayer times are computed
+    locally, so a city SearchTruth knows but the table lacks would be a
+    button that cannot be answered.
+    """
+    
+    def __init__(self, countries: List[str] = COUNTRIES):
+        self.countries = countries
+        self._indexes: Dict[str, CityIndex] = {}
+    
+    def load(self, country: str) -> CityIndex:
+        """Build a country's index from the city table"""
+        country = prayer_times.country_name(country)
+        index = CityIndex([city.name for city in prayer_times.cities_for(country)])
+        self._indexes[country] = index
+        return index
+    
+    async def get(self, country: str) -> CityIndex:
+        """Index for a country, built on first use"""
+        index = self._indexes.get(prayer_times.country_name(country))
+        if index is None:
+            index = self.load(country)
+        return index
+    
+    def load_all(self) -> None:
+        """Build every configured country's index up front"""
+        start = time.perf_counter()
+        for country in self.countries:
+            self.load(country)
+        logger.info(
+            f"City directory: {len(self._indexes)} countries, {sum(map(len, self._indexes.values()))} cities "
+            f"indexed in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+    
+    def stats(self) -> Dict:
+        return {
+            "countries": len(self._indexes),
+            "cities": sum(map(len, self._indexes.values()))
+        }
+
+# Process-wide instance filled by main.post_init
+city_directory = CityDirectory()
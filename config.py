@@ -5,16 +5,89 @@ Configuration file for SearchTruth Telegram Bot
 # Bot Configuration
 BOT_TOKEN = "8588204814:AAH61_MWfyjBgTkm1QcXobsxQgGJPI7IfOw"  # Replace with your bot token from @BotFather
 
+# Update Delivery ("polling" or "webhook"; main.py --mode overrides)
+BOT_MODE = "polling"
+WEBHOOK_URL = None  # Public HTTPS base URL Telegram posts to, e.g. "https://bot.example.com"
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_HEALTH_PATH = "/healthz"
+WEBHOOK_SECRET_TOKEN = None  # Required unless one instance registers the webhook itself (WEBHOOK_URL set)
+WEBHOOK_REPLICAS = 1  # Bot instances behind WEBHOOK_URL; more than one needs WEBHOOK_SECRET_TOKEN
+WEBHOOK_MAX_BODY_BYTES = 1024 * 1024
+WEBHOOK_SERVE_METRICS = False  # Also serve METRICS_PATH on the public webhook listener
+
+# Metrics (Prometheus text format)
+METRICS_PATH = "/metrics"  # Also served by the webhook app when WEBHOOK_SERVE_METRICS is set
+METRICS_LISTEN = "127.0.0.1"
+METRICS_PORT = 9100  # Standalone metrics listener; None disables it
+
+# Update Processing
+CONCURRENT_UPDATES = 32  # Updates handled at once; each chat's updates still run one at a time
+CONCURRENT_UPDATES_MAX_PENDING = 1024  # Updates admitted while waiting for their chat or a worker
+
+# Outbound Flood Control (Telegram: ~30 messages/s overall, ~1/s per chat, 20/min per group)
+RATE_LIMIT_GLOBAL_PER_SECOND = 30
+RATE_LIMIT_CHAT_PER_SECOND = 1
+RATE_LIMIT_CHAT_BURST = 3  # Messages a private chat may get back to back before throttling
+RATE_LIMIT_GROUP_PER_MINUTE = 20
+RATE_LIMIT_MAX_RETRIES = 3  # RetryAfter retries per request, waiting twice as long each time
+INTERIM_EDIT_DELAY = 0.3  # Seconds a "Please wait..." edit is held in case the results are faster
+
 # API Configuration
 REQUEST_TIMEOUT = 10
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
 
+# HTTP Connection Pool (shared by all handlers)
+HTTP_POOL_SIZE = 20  # Max open connections to SearchTruth.com
+HTTP_KEEPALIVE_CONNECTIONS = 10  # Idle connections kept for reuse
+HTTP_KEEPALIVE_EXPIRY = 30  # Seconds an idle connection stays open
+HTTP2_ENABLED = True  # Requires the 'h2' package (httpx[http2])
+
+# Adaptive Timeouts and Hedged Requests (per SearchTruth endpoint)
+HTTP_LATENCY_WINDOW = 200  # Recent response times kept per endpoint
+HTTP_LATENCY_MIN_SAMPLES = 20  # Until then an endpoint uses REQUEST_TIMEOUT and is never hedged
+HTTP_TIMEOUT_MULTIPLIER = 3  # Timeout is p99 times this, clamped to [HTTP_TIMEOUT_MIN, REQUEST_TIMEOUT]
+HTTP_TIMEOUT_MIN = 2
+HEDGE_BUDGET = 0.05  # Duplicate requests allowed, as a share of all requests (0 disables hedging)
+HEDGE_MIN_DELAY = 0.05  # Never hedge before this many seconds, however fast the endpoint's p95
+
+# Response Cache (parsed results only)
+CACHE_TTL = 6 * 60 * 60  # Seconds a cached search result stays fresh
+CACHE_MEMORY_ENTRIES = 1000  # In-memory LRU size
+CACHE_DB_PATH = "searchtruth_cache.sqlite3"  # Set to None to disable the on-disk tier
+CACHE_DB_MAX_BYTES = 50 * 1024 * 1024  # On-disk tier size limit
+CACHE_DB_TOUCH_INTERVAL = 10 * 60  # A disk hit only rewrites its LRU access time when it is older than this
+CACHE_STALE_TTL = 24 * 60 * 60  # Seconds past expiry a result may still be served while SearchTruth is down
+
+# Circuit Breaker (one per SearchTruth endpoint)
+CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive timeouts, connection errors or 5xx responses that open it
+CIRCUIT_RESET_TIMEOUT = 30  # Seconds an open breaker fails fast before letting one probe request through
+
+# Inline Button Payloads (callback_data carries only a short ID)
+CALLBACK_STORE_TTL = 7 * 24 * 60 * 60  # Seconds a button keeps working after its keyboard was drawn
+CALLBACK_STORE_ENTRIES = 20000  # In-memory LRU size
+CALLBACK_STORE_DB_PATH = "searchtruth_callbacks.sqlite3"  # Set to None to keep payloads in memory only
+CALLBACK_STORE_DB_MAX_BYTES = 10 * 1024 * 1024  # On-disk tier size limit
+
+# Shared State (user_data, chat_data and, with Redis, inline button payloads)
+PERSISTENCE_BACKEND = "sqlite"  # "sqlite", "redis" (several bot processes) or None for memory only
+PERSISTENCE_DB_PATH = "searchtruth_state.sqlite3"
+PERSISTENCE_REDIS_URL = "redis://localhost:6379/0"  # Requires the 'redis' package
+PERSISTENCE_REDIS_PREFIX = "searchtruth:"
+PERSISTENCE_FLUSH_INTERVAL = 5  # Seconds between batched state writes
+
 # Search Limits
 MAX_QURAN_RESULTS = 5
 MAX_HADITH_RESULTS = 5
 MAX_DICTIONARY_RESULTS = 8
 MAX_CITIES_DISPLAY = 10
 
+# Result Paging (the MAX_*_RESULTS above are the page sizes)
+RESULT_CURSOR_MAX_RESULTS = 50  # Results fetched once per search and paged through from memory
+RESULT_CURSOR_ENTRIES = 500  # Searches kept for paging
+RESULT_CURSOR_TTL = 60 * 60  # Seconds a search can be paged after it ran
+
 # Quran Chapters (simplified - you can expand this)
 QURAN_CHAPTERS = {
     1: {"name": "Al-Fatiha", "verses": 7},
@@ -85,4 +158,13 @@ COUNTRIES = [
     "Tanzania", "Thailand", "Tunisia", "Turkey", "Uganda",
     "Ukraine", "United Arab Emirates", "United Kingdom", "USA", "Uzbekistan",
     "Yemen"
-]
\ No newline at end of file
+]
+
+# Offline Data
+QURAN_INDEX_DIR = "data/quran"  # <translator>.idx files built by `python -m offline.quran_index build`
+QURAN_VERSE_COUNT = 6236
+HADITH_INDEX_DIR = "data/hadith"  # <code>.idx files built by `python -m offline.hadith_index build`
+DICTIONARY_PATH = "data/dictionary.dict"  # Built by `python -m offline.dictionary build`
+DICTIONARY_AZ_PAGE_SIZE = 20  # Headwords per A-Z index page
+OFFLINE_DATA_RECHECK_INTERVAL = 60  # Seconds between looks for a file that has not been built yet
+HIJRI_CALENDAR = "ummalqura"  # "ummalqura" (needs the hijridate package) or "arithmetic"
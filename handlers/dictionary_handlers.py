@@ -6,11 +6,26 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
-from config import MAX_DICTIONARY_RESULTS
-from search_apis import SearchTruthAPI
+from callback_store import callback_store
+from config import DICTIONARY_AZ_PAGE_SIZE, MAX_DICTIONARY_RESULTS, RESULT_CURSOR_MAX_RESULTS
+from handlers.main_menu import button_expired
+from handlers.pagination import ResultCursor, first_page
+from offline.dictionary import local_dictionary
+from rate_limiter import edit_interim
+from search_apis import search_api
 
 logger = logging.getLogger(__name__)
-search_api = SearchTruthAPI()
+
+def search_type_keyboard(word: str) -> InlineKeyboardMarkup:
+    """Exact or partial match choice for a word"""
+    keyboard = [
+        [
+            InlineKeyboardButton("Exact Match", callback_data=callback_store.pack('dicttype_', type='1', word=word)),
+            InlineKeyboardButton("Partial Match", callback_data=callback_store.pack('dicttype_', type='2', word=word))
+        ],
+        [InlineKeyboardButton("🔙 Back", callback_data='main_dict')]
+    ]
+    return InlineKeyboardMarkup(keyboard)
 
 async def dictionary_menu(query):
     """Show Dictionary menu"""
@@ -34,6 +49,20 @@ async def dictionary_search_callback(update: Update, context: ContextTypes.DEFAU
     query = update.callback_query
     await query.answer()
     
+    if query.data.startswith('dict_search_'):
+        # Quick search already has the word
+        data = await callback_store.unpack('dict_search_', query.data)
+        if data is None:
+            await button_expired(query)
+            return
+        await query.edit_message_text(
+            f"*Search for:* `{data['word']}`\n\n"
+            "Select search type:",
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=search_type_keyboard(data['word'])
+        )
+        return
+    
     await query.edit_message_text(
         "*Dictionary Search*\n\n"
         "Enter an English word to find its Arabic meaning:\n\n"
@@ -49,44 +78,37 @@ async def dictionary_search_callback(update: Update, context: ContextTypes.DEFAU
 
 async def handle_dictionary_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Process dictionary search"""
-    if context.user_data.get('state') == 'waiting_dict_search':
-        word = update.message.text.strip()
-        context.user_data['state'] = None
-        
-        if not word:
-            await update.message.reply_text("Please enter a word to search.")
-            return
-        
-        # Ask for search type
-        keyboard = [
-            [
-                InlineKeyboardButton("Exact Match", callback_data=f'dicttype_1_{word}'),
-                InlineKeyboardButton("Partial Match", callback_data=f'dicttype_2_{word}')
-            ],
-            [InlineKeyboardButton("🔙 Back", callback_data='main_dict')]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            f"*Search for:* `{word}`\n\n"
-            "Select search type:",
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
-        )
+    word = update.message.text.strip()
+    context.user_data['state'] = None
+    
+    if not word:
+        await update.message.reply_text("Please enter a word to search.")
+        return
+    
+    # Ask for search type
+    await update.message.reply_text(
+        f"*Search for:* `{word}`\n\n"
+        "Select search type:",
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=search_type_keyboard(word)
+    )
 
 async def dictionary_type_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle dictionary search type"""
     query = update.callback_query
     await query.answer()
     
-    parts = query.data.split('_')
-    search_type = parts[1]
-    word = parts[2]
+    data = await callback_store.unpack('dicttype_', query.data)
+    if data is None:
+        await button_expired(query)
+        return
+    
+    search_type, word = data['type'], data['word']
     
     search_type_text = "Exact Word" if search_type == "1" else "Sub Word"
     
-    await query.edit_message_text(
+    await edit_interim(
+        query,
         f"🔍 Searching dictionary for *{word}*...\n"
         f"Mode: {search_type_text}\n"
         "Please wait...",
@@ -94,22 +116,19 @@ async def dictionary_type_callback(update: Update, context: ContextTypes.DEFAULT
     )
     
     # Perform search
-    results = search_api.search_dictionary(word, search_type, MAX_DICTIONARY_RESULTS)
+    # Fetch every page at once; Next/Prev then read from the cursor
+    results = await search_api.search_dictionary(word, search_type, RESULT_CURSOR_MAX_RESULTS)
     
     # Format results
     if results and "Unable" not in results[0] and "No dictionary" not in results[0]:
-        response_text = f"*Dictionary Results for '{word}'*\n\n"
-        
-        for i, result in enumerate(results, 1):
-            response_text += f"*{i}.* {result}\n\n"
-        
-        response_text += "_Search again: /dictionary_"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔍 New Search", callback_data='dict_search')],
-            [InlineKeyboardButton("🔤 A-Z Index", callback_data='dict_az')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        cursor = ResultCursor(
+            header=f"*Dictionary Results for '{word}'*\n\n",
+            results=results,
+            page_size=MAX_DICTIONARY_RESULTS,
+            footer="_Search again: /dictionary_",
+            buttons=[[("🔍 New Search", 'dict_search')], [("🔤 A-Z Index", 'dict_az')]]
+        )
+        response_text, reply_markup = first_page(('dictionary', word, search_type), cursor)
         
         await query.edit_message_text(
             response_text,
@@ -130,4 +149,88 @@ async def dictionary_type_callback(update: Update, context: ContextTypes.DEFAULT
             "Search again: /dictionary",
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=reply_markup
-        )
\ No newline at end of file
+        )
+
+async def dictionary_az_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Browse the offline dictionary by first letter"""
+    query = update.callback_query
+    await query.answer()
+    
+    # dict_az shows the letters, dict_az_<letter>_<offset> one page of headwords
+    parts = query.data.split('_')
+    if len(parts) < 4:
+        await show_az_letters(query)
+        return
+    
+    letter = parts[2]
+    offset = int(parts[3]) if parts[3].isdigit() else 0
+    page = local_dictionary.headwords(letter, offset, DICTIONARY_AZ_PAGE_SIZE)
+    if page is None:
+        await show_az_letters(query)
+        return
+    
+    headwords, total = page
+    keyboard = []
+    row = []
+    for headword in headwords:
+        row.append(InlineKeyboardButton(
+            headword, callback_data=callback_store.pack('dicttype_', type='1', word=headword)))
+        if len(row) == 2:
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+    
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Prev", callback_data=f'dict_az_{letter}_{max(offset - DICTIONARY_AZ_PAGE_SIZE, 0)}'))
+    if offset + DICTIONARY_AZ_PAGE_SIZE < total:
+        navigation.append(InlineKeyboardButton(
+            "Next ➡️", callback_data=f'dict_az_{letter}_{offset + DICTIONARY_AZ_PAGE_SIZE}'))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🔤 Letters", callback_data='dict_az')])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    if total:
+        text = (f"*Dictionary: {letter.upper()}*\n\n"
+                f"Words {offset + 1}-{min(offset + DICTIONARY_AZ_PAGE_SIZE, total)} of {total}. "
+                "Tap a word to see its meaning:")
+    else:
+        text = f"*Dictionary: {letter.upper()}*\n\nNo words start with this letter."
+    
+    await query.edit_message_text(
+        text,
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=reply_markup
+    )
+
+async def show_az_letters(query):
+    """Show the A-Z letter keyboard"""
+    if local_dictionary.dictionary is None:
+        keyboard = [[InlineKeyboardButton("🔍 Search Dictionary", callback_data='dict_search')]]
+        await query.edit_message_text(
+            "*A-Z Index*\n\n"
+            "The A-Z index is not available yet. You can still search for a word.",
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return
+    
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    keyboard = [
+        [InlineKeyboardButton(letter.upper(), callback_data=f'dict_az_{letter}_0') for letter in letters[i:i + 6]]
+        for i in range(0, len(letters), 6)
+    ]
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data='main_dict')])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await query.edit_message_text(
+        "*A-Z Index*\n\n"
+        "Select a letter:",
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=reply_markup
+    )
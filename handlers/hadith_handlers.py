@@ -1,16 +1,18 @@
 """
 Hadith search handlers for SearchTruth Bot
 """
+import asyncio
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
-from config import HADITH_COLLECTIONS, MAX_HADITH_RESULTS
-from search_apis import SearchTruthAPI
+from config import HADITH_COLLECTIONS, MAX_HADITH_RESULTS, RESULT_CURSOR_MAX_RESULTS
+from handlers.pagination import ResultCursor, first_page
+from rate_limiter import reply_interim
+from search_apis import search_api
 
 logger = logging.getLogger(__name__)
-search_api = SearchTruthAPI()
 
 async def hadith_menu(query):
     """Show Hadith search menu"""
@@ -80,55 +82,58 @@ async def hadith_collection_callback(update: Update, context: ContextTypes.DEFAU
 
 async def handle_hadith_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Process Hadith search query"""
-    if context.user_data.get('state') == 'waiting_hadith_search':
-        keyword = update.message.text.strip()
-        context.user_data['state'] = None
-        
-        if not keyword:
-            await update.message.reply_text("Please enter a search keyword.")
-            return
-        
-        collection_id = context.user_data.get('hadith_collection', '1')
-        collection_name = HADITH_COLLECTIONS.get(collection_id, {}).get('name', 'Hadith')
-        
-        # Show searching message
-        msg = await update.message.reply_text(
+    keyword = update.message.text.strip()
+    context.user_data['state'] = None
+    
+    if not keyword:
+        await update.message.reply_text("Please enter a search keyword.")
+        return
+    
+    collection_id = context.user_data.get('hadith_collection', '1')
+    collection_name = HADITH_COLLECTIONS.get(collection_id, {}).get('name', 'Hadith')
+    
+    # Fetch every page at once; Next/Prev then read from the cursor
+    search = asyncio.ensure_future(search_api.search_hadith(keyword, collection_id, RESULT_CURSOR_MAX_RESULTS))
+    
+    # Show searching message only if the search is not answered right away
+    try:
+        msg = await reply_interim(
+            update.message,
+            search,
             f"🔍 Searching *{collection_name}* for `{keyword}`...\nPlease wait...",
             parse_mode=ParseMode.MARKDOWN
         )
+    except BaseException:
+        search.cancel()
+        raise
+    results = await search
+    send = msg.edit_text if msg is not None else update.message.reply_text
+    
+    # Format results
+    if results and "Unable" not in results[0] and "No hadith" not in results[0]:
+        cursor = ResultCursor(
+            header=f"*Hadith Search Results*\nCollection: {collection_name}\nKeyword: `{keyword}`\n\n",
+            results=results,
+            page_size=MAX_HADITH_RESULTS,
+            footer="_Search again: /hadith_",
+            buttons=[[("🔍 New Search", 'main_hadith')], [("📚 Other Collections", 'hadith_collections')]]
+        )
+        response_text, reply_markup = first_page(('hadith', keyword, collection_id), cursor)
         
-        # Perform search
-        results = search_api.search_hadith(keyword, collection_id, MAX_HADITH_RESULTS)
+        await send(
+            response_text,
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=reply_markup,
+            disable_web_page_preview=True
+        )
+    else:
+        keyboard = [[InlineKeyboardButton("🔍 Try Again", callback_data='hadith_search')]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
         
-        # Format results
-        if results and "Unable" not in results[0] and "No hadith" not in results[0]:
-            response_text = f"*Hadith Search Results*\nCollection: {collection_name}\nKeyword: `{keyword}`\n\n"
-            
-            for i, result in enumerate(results, 1):
-                response_text += f"*{i}.* {result}\n\n"
-            
-            response_text += "_Search again: /hadith_"
-            
-            keyboard = [
-                [InlineKeyboardButton("🔍 New Search", callback_data='main_hadith')],
-                [InlineKeyboardButton("📚 Other Collections", callback_data='hadith_collections')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await msg.edit_text(
-                response_text,
-                parse_mode=ParseMode.MARKDOWN,
-                reply_markup=reply_markup,
-                disable_web_page_preview=True
-            )
-        else:
-            keyboard = [[InlineKeyboardButton("🔍 Try Again", callback_data='hadith_search')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await msg.edit_text(
-                f"*No hadith found for '{keyword}'*\n\n"
-                "Try different keywords or try another collection.\n\n"
-                "Search again: /hadith",
-                parse_mode=ParseMode.MARKDOWN,
-                reply_markup=reply_markup
-            )
\ No newline at end of file
+        await send(
+            f"*No hadith found for '{keyword}'*\n\n"
+            "Try different keywords or try another collection.\n\n"
+            "Search again: /hadith",
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=reply_markup
+        )
\ No newline at end of file
@@ -2,16 +2,16 @@
 Main menu handlers for SearchTruth Bot
 """
 import logging
-from datetime import datetime
+from datetime import date
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
+from callback_store import callback_store
 from config import POPULAR_COUNTRIES
-from search_apis import SearchTruthAPI
+from offline import hijri
 
 logger = logging.getLogger(__name__)
-search_api = SearchTruthAPI()
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /start command"""
@@ -80,18 +80,24 @@ async def main_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     elif callback_data == 'main_help':
         await help_command(query)
 
+async def button_expired(query):
+    """Tell the user a button's stored payload is gone"""
+    keyboard = [[InlineKeyboardButton("🔙 Main Menu", callback_data='main_menu')]]
+    await query.edit_message_text(
+        "⌛ This button has expired. Please start the search again.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
 async def prayer_menu(query):
     """Show Prayer Times menu"""
     keyboard = []
     
     # Add popular countries in rows of 2
     for i in range(0, len(POPULAR_COUNTRIES), 2):
-        row = []
-        if i < len(POPULAR_COUNTRIES):
-            row.append(InlineKeyboardButton(POPULAR_COUNTRIES[i], callback_data=f'pcountry_{POPULAR_COUNTRIES[i]}'))
-        if i + 1 < len(POPULAR_COUNTRIES):
-            row.append(InlineKeyboardButton(POPULAR_COUNTRIES[i+1], callback_data=f'pcountry_{POPULAR_COUNTRIES[i+1]}'))
-        keyboard.append(row)
+        keyboard.append([
+            InlineKeyboardButton(country, callback_data=callback_store.pack('pcountry_', country=country))
+            for country in POPULAR_COUNTRIES[i:i + 2]
+        ])
     
     keyboard.append([InlineKeyboardButton("🌍 All Countries", callback_data='prayer_all_countries')])
     keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data='main_menu')])
@@ -115,22 +121,14 @@ async def prayer_country_callback(update: Update, context: ContextTypes.DEFAULT_
         await show_all_countries(query)
         return
     
-    country = query.data.replace('pcountry_', '')
-    
-    # Get prayer times/cities for this country
-    prayer_data = search_api.get_prayer_cities(country)
-    
-    if 'error' in prayer_data:
-        await query.edit_message_text(
-            f"*Error:* {prayer_data['error']}\n\n"
-            f"{prayer_data.get('suggestion', 'Please try another country.')}",
-            parse_mode=ParseMode.MARKDOWN
-        )
+    data = await callback_store.unpack('pcountry_', query.data)
+    if data is None:
+        await button_expired(query)
         return
     
-    if 'available_cities' in prayer_data:
-        from handlers.prayer_handlers import show_cities_for_country
-        await show_cities_for_country(query, prayer_data, country)
+    # Cities come from the in-memory city directory
+    from handlers.prayer_handlers import show_cities_for_country
+    await show_cities_for_country(query, data['country'])
 
 async def show_all_countries(query):
     """Show all countries for prayer times"""
@@ -153,40 +151,112 @@ async def show_all_countries(query):
         reply_markup=reply_markup
     )
 
+def hijri_keyboard(year: int, month: int) -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton("📆 This Hijri Month", callback_data=f'hijri_month_{year}_{month}')],
+        [InlineKeyboardButton("🔙 Main Menu", callback_data='main_menu')]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def hijri_date_text(day: date) -> str:
+    """Message body for the Hijri date of a Gregorian day"""
+    # Labelled with the calendar actually used, arithmetic outside the Umm al-Qura table
+    calendar = hijri.calendar_for(day)
+    calendar_name = "Umm al-Qura" if calendar.name == "ummalqura" else "tabular (arithmetic)"
+    return (
+        f"*Islamic Hijri Date*\n\n"
+        f"📅 *Hijri Date:*\n"
+        f"{hijri.format_hijri(calendar.from_gregorian(day))}\n\n"
+        f"*Gregorian Date:*\n"
+        f"{day.strftime('%A, %d %B %Y')}\n\n"
+        f"_Calendar: {calendar_name}_"
+    )
+
 async def hijri_date_command(query):
     """Show current Hijri date"""
-    def get_hijri_date() -> str:
-        """Get current Hijri date (simplified approximation)"""
-        try:
-            today = datetime.now()
-            hijri_months = [
-                "Muharram", "Safar", "Rabi' al-Awwal", "Rabi' al-Thani",
-                "Jumada al-Awwal", "Jumada al-Thani", "Rajab", "Sha'ban",
-                "Ramadan", "Shawwal", "Dhu al-Qi'dah", "Dhu al-Hijjah"
-            ]
-            
-            # Simple approximation
-            hijri_year = 1445 + (today.year - 2023)
-            hijri_month = hijri_months[today.month - 1]
-            hijri_day = today.day % 29 or 1
-            
-            return f"{hijri_day} {hijri_month} {hijri_year} AH"
-        except Exception as e:
-            logger.error(f"Hijri date error: {e}")
-            return "Unable to fetch Hijri date"
+    today = date.today()
+    year, month, _ = hijri.to_hijri(today)
     
-    hijri_date = get_hijri_date()
+    await query.edit_message_text(
+        hijri_date_text(today),
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=hijri_keyboard(year, month)
+    )
+
+async def hijri_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /hijri [YYYY-MM-DD]
     
-    keyboard = [[InlineKeyboardButton("🔙 Main Menu", callback_data='main_menu')]]
+    Without a date shows today. Years before 1600 are read as Hijri dates
+    and converted to Gregorian; later years are converted to Hijri.
+    """
+    day = date.today()
+    try:
+        if context.args:
+            year, month, day_of_month = (int(part) for part in context.args[0].split('-'))
+            if year < 1600:
+                gregorian = hijri.to_gregorian(year, month, day_of_month)
+                await update.message.reply_text(
+                    f"*{hijri.format_hijri((year, month, day_of_month))}*\n\n"
+                    f"Gregorian: {gregorian.strftime('%A, %d %B %Y')}",
+                    parse_mode=ParseMode.MARKDOWN,
+                    reply_markup=hijri_keyboard(year, month)
+                )
+                return
+            day = date(year, month, day_of_month)
+        # Dates past the arithmetic calendar's last year raise here
+        year, month, _ = hijri.to_hijri(day)
+        text = hijri_date_text(day)
+    except ValueError:
+        await update.message.reply_text(
+            f"Invalid date `{' '.join(context.args)}`.\n\n"
+            "Usage: `/hijri`, `/hijri 2024-03-11` or `/hijri 1445-09-01`",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+    
+    await update.message.reply_text(
+        text,
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=hijri_keyboard(year, month)
+    )
+
+async def hijri_month_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show a Hijri month with the Gregorian date of every day"""
+    query = update.callback_query
+    await query.answer()
+    
+    _, _, year, month = query.data.split('_')
+    year, month = int(year), int(month)
+    
+    try:
+        days = hijri.month_days(year, month)
+    except ValueError:
+        await query.edit_message_text(
+            f"{year}-{month} AH is outside the supported calendar.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Main Menu", callback_data='main_menu')]])
+        )
+        return
+    
+    today = date.today()
+    lines = []
+    for day, gregorian in days:
+        marker = " ◀️" if gregorian == today else ""
+        lines.append(f"`{day:>2}` {gregorian.strftime('%a %d %b')}{marker}")
+    
+    prev_year, prev_month = (year, month - 1) if month > 1 else (year - 1, 12)
+    next_year, next_month = (year, month + 1) if month < 12 else (year + 1, 1)
+    # No buttons past either end of the calendar
+    navigation = []
+    if hijri.covers_hijri(prev_year, prev_month):
+        navigation.append(InlineKeyboardButton("⬅️ Prev", callback_data=f'hijri_month_{prev_year}_{prev_month}'))
+    if hijri.covers_hijri(next_year, next_month):
+        navigation.append(InlineKeyboardButton("Next ➡️", callback_data=f'hijri_month_{next_year}_{next_month}'))
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("🔙 Main Menu", callback_data='main_menu')])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
-        f"*Islamic Hijri Date*\n\n"
-        f"📅 *Today's Date:*\n"
-        f"{hijri_date}\n\n"
-        f"*Gregorian Date:*\n"
-        f"{datetime.now().strftime('%d %B %Y')}\n\n"
-        f"_Source: SearchTruth.com_",
+        f"*{hijri.MONTHS[month - 1]} {year} AH*\n\n" + '\n'.join(lines),
         parse_mode=ParseMode.MARKDOWN,
         reply_markup=reply_markup
     )
@@ -264,18 +334,15 @@ async def handle_quick_search(update: Update, context: ContextTypes.DEFAULT_TYPE
     if not text or text.startswith('/'):
         return
     
-    # Check if we're in a waiting state
-    if context.user_data.get('state'):
-        return
-    
     # Show quick search options
     keyboard = [
         [
-            InlineKeyboardButton("🔍 Search Quran", callback_data=f'qtrans_2_{text}_'),
+            InlineKeyboardButton("🔍 Search Quran", callback_data=callback_store.pack(
+                'qtrans_', translator='2', keyword=text, chapter='')),
             InlineKeyboardButton("📚 Search Hadith", callback_data='hadith_search')
         ],
         [
-            InlineKeyboardButton("📖 Dictionary", callback_data=f'dict_search_{text}'),
+            InlineKeyboardButton("📖 Dictionary", callback_data=callback_store.pack('dict_search_', word=text)),
             InlineKeyboardButton("🕌 More Options", callback_data='main_menu')
         ]
     ]
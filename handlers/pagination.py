@@ -0,0 +1,92 @@
+"""
+Paged browsing of search results
+
+A search keeps its whole parsed result list in a cursor; the Next/Prev
+buttons (page_<cursor>_<page>) render other pages from that list, so
+paging costs one message edit and no SearchTruth request or re-parse.
+Cursors live in a memory LRU and expire after RESULT_CURSOR_TTL; with
+PERSISTENCE_BACKEND = "redis" they are also kept in Redis next to the
+callback payloads, so any bot process can turn the page.
+"""
+import logging
+from typing import List, NamedTuple, Tuple
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from telegram.constants import ParseMode
+
+from cache import LRUCache, TieredCache
+from callback_store import CallbackStore, redis_tier
+from config import RESULT_CURSOR_ENTRIES, RESULT_CURSOR_TTL
+from handlers.main_menu import button_expired
+
+logger = logging.getLogger(__name__)
+
+class ResultCursor(NamedTuple):
+    """Everything needed to render any page of one search"""
+    header: str
+    results: List[str]  # formatted entries, numbered when rendered
+    page_size: int
+    footer: str
+    buttons: List[List[Tuple[str, str]]]  # (label, callback_data) rows under the navigation
+
+cursor_cache = TieredCache(LRUCache(RESULT_CURSOR_ENTRIES, RESULT_CURSOR_TTL), redis_tier('page:'))
+
+def open_cursor(key: tuple, cursor: ResultCursor) -> str:
+    """Store a search's results and return its cursor ID
+    
+    The ID is derived from key, so repeating a search replaces its cursor.
+    """
+    cursor_id = CallbackStore.make_id('page_', {'key': list(key)})
+    cursor_cache.set(('page', cursor_id), cursor)
+    return cursor_id
+
+def render_page(cursor_id: str, cursor: ResultCursor, page: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """Message text and keyboard for one page"""
+    total = len(cursor.results)
+    pages = max((total + cursor.page_size - 1) // cursor.page_size, 1)
+    page = min(max(page, 0), pages - 1)
+    start = page * cursor.page_size
+    
+    text = cursor.header
+    for i, result in enumerate(cursor.results[start:start + cursor.page_size], start + 1):
+        text += f"*{i}.* {result}\n\n"
+    if pages > 1:
+        text += f"_Results {start + 1}-{min(start + cursor.page_size, total)} of {total}_\n\n"
+    text += cursor.footer
+    
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Prev", callback_data=f'page_{cursor_id}_{page - 1}'))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("Next ➡️", callback_data=f'page_{cursor_id}_{page + 1}'))
+    keyboard = [navigation] if navigation else []
+    keyboard.extend(
+        [InlineKeyboardButton(label, callback_data=data) for label, data in row]
+        for row in cursor.buttons
+    )
+    return text, InlineKeyboardMarkup(keyboard)
+
+def first_page(key: tuple, cursor: ResultCursor) -> Tuple[str, InlineKeyboardMarkup]:
+    """Open a cursor and render its first page"""
+    return render_page(open_cursor(key, cursor), cursor, 0)
+
+async def page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show another page of a cached search"""
+    query = update.callback_query
+    await query.answer()
+    
+    # Cursor IDs may contain '_', the page number never does
+    cursor_id, _, page = query.data[len('page_'):].rpartition('_')
+    cursor = await cursor_cache.get(('page', cursor_id))
+    if cursor is None or not page.isdigit():
+        await button_expired(query)
+        return
+    
+    # Read back from Redis, a cursor is the JSON list of its fields
+    text, reply_markup = render_page(cursor_id, ResultCursor(*cursor), int(page))
+    await query.edit_message_text(
+        text,
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=reply_markup,
+        disable_web_page_preview=True
+    )
@@ -5,32 +5,171 @@ import logging
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 
+from callback_store import callback_store
+from city_directory import city_directory
 from config import MAX_CITIES_DISPLAY
+from handlers.main_menu import button_expired
+from offline import prayer_times
 
 logger = logging.getLogger(__name__)
 
-async def show_cities_for_country(query, prayer_data, country):
-    """Show cities for a selected country"""
-    cities = prayer_data['available_cities']
+def cities_button(label, country, offset=0):
+    return InlineKeyboardButton(label, callback_data=callback_store.pack('pcities_', country=country, offset=offset))
+
+def city_search_button(label, country):
+    return InlineKeyboardButton(label, callback_data=callback_store.pack('pcsearch_', country=country))
+
+def city_buttons(country, cities):
+    """City buttons in rows of 2"""
+    buttons = [
+        InlineKeyboardButton(city, callback_data=callback_store.pack('pcity_', country=country, city=city))
+        for city in cities
+    ]
+    return [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+
+async def show_cities_for_country(query, country, offset=0):
+    """Show one page of the cities of a country"""
+    index = await city_directory.get(country)
+    cities = index.page(offset, MAX_CITIES_DISPLAY)
     
-    keyboard = []
-    for i in range(0, min(len(cities), MAX_CITIES_DISPLAY), 2):
-        row = []
-        if i < len(cities):
-            row.append(InlineKeyboardButton(cities[i], callback_data=f'pcity_{country}_{cities[i]}'))
-        if i + 1 < len(cities):
-            row.append(InlineKeyboardButton(cities[i+1], callback_data=f'pcity_{country}_{cities[i+1]}'))
-        keyboard.append(row)
+    keyboard = city_buttons(country, cities)
     
+    navigation = []
+    if offset > 0:
+        navigation.append(cities_button("⬅️ Prev", country, max(offset - MAX_CITIES_DISPLAY, 0)))
+    if offset + MAX_CITIES_DISPLAY < len(index):
+        navigation.append(cities_button("Next ➡️", country, offset + MAX_CITIES_DISPLAY))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([city_search_button("🔍 Find a City", country)])
     keyboard.append([InlineKeyboardButton("🔙 Back to Countries", callback_data='main_prayer')])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
+    if not len(index):
+        text = f"*Prayer Times - {country}*\n\nNo cities are available for this country right now."
+    else:
+        text = (f"*Prayer Times - {country}*\n\n"
+                f"Found {len(index)} cities.\n"
+                f"Showing {offset + 1}-{min(offset + MAX_CITIES_DISPLAY, len(index))}. Select a city:")
+    
+    await query.edit_message_text(
+        text,
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=reply_markup
+    )
+
+async def prayer_cities_callback(update, context):
+    """Page through the cities of a country"""
+    query = update.callback_query
+    await query.answer()
+    
+    data = await callback_store.unpack('pcities_', query.data)
+    if data is None:
+        await button_expired(query)
+        return
+    await show_cities_for_country(query, data['country'], data['offset'])
+
+async def city_search_callback(update, context):
+    """Ask for part of a city name"""
+    query = update.callback_query
+    await query.answer()
+    
+    data = await callback_store.unpack('pcsearch_', query.data)
+    if data is None:
+        await button_expired(query)
+        return
+    
+    country = data['country']
+    context.user_data['city_country'] = country
+    context.user_data['state'] = 'waiting_city_search'
+    
+    await query.edit_message_text(
+        f"🔍 *Find a City - {country}*\n\n"
+        "Type the first letters or part of the city name:",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+async def handle_city_search(update, context):
+    """Process a city name search"""
+    text = update.message.text.strip()
+    context.user_data['state'] = None
+    country = context.user_data.get('city_country', '')
+    
+    index = await city_directory.get(country)
+    cities = index.search(text, MAX_CITIES_DISPLAY)
+    
+    keyboard = city_buttons(country, cities)
+    keyboard.append([city_search_button("🔍 Search Again", country)])
+    keyboard.append([cities_button(f"🔙 {country}", country)])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    if cities:
+        message = f"*Cities in {country} matching* `{text}`:"
+    else:
+        message = f"*No cities in {country} match* `{text}`."
+    
+    await update.message.reply_text(
+        message,
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=reply_markup
+    )
+
+async def prayer_city_callback(update, context):
+    """Show today's prayer times for a city
+    
+    The button payload holds country and city, plus method and asr when
+    the user picks another calculation method.
+    """
+    query = update.callback_query
+    await query.answer()
+    
+    data = await callback_store.unpack('pcity_', query.data)
+    if data is None:
+        await button_expired(query)
+        return
+    
+    country, city_name = data['country'], data['city']
+    city = prayer_times.find_city(country, city_name)
+    if city is None:
+        keyboard = [[InlineKeyboardButton("🔙 Back to Countries", callback_data='main_prayer')]]
+        await query.edit_message_text(
+            f"*Prayer Times - {city_name}*\n\n"
+            "Prayer times for this city are not available offline yet.\n"
+            "Please check SearchTruth.com or pick another city.",
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return
+    
+    method, asr = prayer_times.default_settings(country)
+    if data.get('method') in prayer_times.METHODS and data.get('asr') in prayer_times.ASR_METHODS:
+        method, asr = data['method'], data['asr']
+    
+    day = prayer_times.today(city)
+    times = prayer_times.day_times(city, day, method, asr)
+    
+    response_text = f"🕌 *Prayer Times - {city.name}, {city.country}*\n"
+    response_text += f"📅 {day.strftime('%A, %d %B %Y')}\n\n"
+    for prayer in prayer_times.PRAYERS:
+        response_text += f"*{prayer}:* `{prayer_times.format_time(times[prayer])}`\n"
+    response_text += f"\n_Method: {prayer_times.METHODS[method]['name']}, Asr: {asr}_"
+    
+    def settings_button(label, new_method, new_asr):
+        return InlineKeyboardButton(label, callback_data=callback_store.pack(
+            'pcity_', country=country, city=city_name, method=new_method, asr=new_asr))
+    
+    method_buttons = [settings_button(name, name, asr) for name in prayer_times.METHODS if name != method]
+    other_asr = "Hanafi" if asr == "Standard" else "Standard"
+    keyboard = [method_buttons[i:i + 2] for i in range(0, len(method_buttons), 2)]
+    keyboard.append([settings_button(f"Asr: {other_asr}", method, other_asr)])
+    keyboard.append([cities_button(f"🔙 {country}", country)])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
     await query.edit_message_text(
-        f"*Prayer Times - {country}*\n\n"
-        f"Found {prayer_data['total_cities']} cities.\n"
-        "Select a city:\n\n"
-        f"_Showing first {MAX_CITIES_DISPLAY} cities. For more cities, visit SearchTruth.com_",
+        response_text,
         parse_mode=ParseMode.MARKDOWN,
         reply_markup=reply_markup
     )
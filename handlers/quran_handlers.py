@@ -6,11 +6,37 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
-from config import QURAN_CHAPTERS, TRANSLATIONS, MAX_QURAN_RESULTS
-from search_apis import SearchTruthAPI
+from callback_store import callback_store
+from config import QURAN_CHAPTERS, TRANSLATIONS, MAX_QURAN_RESULTS, RESULT_CURSOR_MAX_RESULTS
+from handlers.main_menu import button_expired
+from handlers.pagination import ResultCursor, first_page
+from rate_limiter import edit_interim
+from search_apis import search_api
 
 logger = logging.getLogger(__name__)
-search_api = SearchTruthAPI()
+
+def translation_button(label: str, translator: str, keyword: str, chapter: str) -> InlineKeyboardButton:
+    """Button running the search with a translation ('more' and 'back' switch menus)"""
+    return InlineKeyboardButton(
+        label, callback_data=callback_store.pack('qtrans_', translator=translator, keyword=keyword, chapter=chapter))
+
+def translation_keyboard(keyword: str, chapter: str) -> InlineKeyboardMarkup:
+    """Main translation choices for a search"""
+    keyboard = [
+        [
+            translation_button("🇬🇧 Yusuf Ali", '2', keyword, chapter),
+            translation_button("🇸🇦 Arabic", '1', keyword, chapter)
+        ],
+        [
+            translation_button("🇵🇰 Urdu", '17', keyword, chapter),
+            translation_button("🇫🇷 French", '8', keyword, chapter)
+        ],
+        [
+            translation_button("🇪🇸 Spanish", '9', keyword, chapter),
+            translation_button("More...", 'more', keyword, chapter)
+        ]
+    ]
+    return InlineKeyboardMarkup(keyboard)
 
 async def quran_menu(query):
     """Show Quran search menu"""
@@ -50,76 +76,62 @@ async def quran_search_callback(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def handle_quran_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Process Quran search query"""
-    if context.user_data.get('state') == 'waiting_quran_search':
-        search_text = update.message.text.strip()
-        context.user_data['state'] = None
-        
-        if not search_text:
-            await update.message.reply_text("Please enter a search keyword.")
-            return
-        
-        # Parse search text
-        parts = search_text.split()
-        keyword = parts[0]
-        chapter = ""
-        
-        if len(parts) > 1:
-            # Check if second part is a chapter number
-            if parts[1].isdigit():
-                chapter = parts[1]
-            elif ':' in parts[1]:
-                # Format like "1:1"
-                chapter = parts[1].split(':')[0]
-        
-        # Ask for translation
-        keyboard = [
-            [
-                InlineKeyboardButton("🇬🇧 Yusuf Ali", callback_data=f'qtrans_2_{keyword}_{chapter}'),
-                InlineKeyboardButton("🇸🇦 Arabic", callback_data=f'qtrans_1_{keyword}_{chapter}')
-            ],
-            [
-                InlineKeyboardButton("🇵🇰 Urdu", callback_data=f'qtrans_17_{keyword}_{chapter}'),
-                InlineKeyboardButton("🇫🇷 French", callback_data=f'qtrans_8_{keyword}_{chapter}')
-            ],
-            [
-                InlineKeyboardButton("🇪🇸 Spanish", callback_data=f'qtrans_9_{keyword}_{chapter}'),
-                InlineKeyboardButton("More...", callback_data=f'qtrans_more_{keyword}_{chapter}')
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        chapter_text = f" in chapter {chapter}" if chapter else ""
-        await update.message.reply_text(
-            f"🔍 *Searching for:* `{keyword}`{chapter_text}\n\n"
-            "Select translation:",
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
-        )
+    search_text = update.message.text.strip()
+    context.user_data['state'] = None
+    
+    if not search_text:
+        await update.message.reply_text("Please enter a search keyword.")
+        return
+    
+    # Parse search text
+    parts = search_text.split()
+    keyword = parts[0]
+    chapter = ""
+    
+    if len(parts) > 1:
+        # Check if second part is a chapter number
+        if parts[1].isdigit():
+            chapter = parts[1]
+        elif ':' in parts[1]:
+            # Format like "1:1"
+            chapter = parts[1].split(':')[0]
+    
+    # Ask for translation
+    reply_markup = translation_keyboard(keyword, chapter)
+    
+    chapter_text = f" in chapter {chapter}" if chapter else ""
+    await update.message.reply_text(
+        f"🔍 *Searching for:* `{keyword}`{chapter_text}\n\n"
+        "Select translation:",
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=reply_markup
+    )
 
 async def quran_translation_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle Quran translation selection and perform search"""
     query = update.callback_query
     await query.answer()
     
-    parts = query.data.split('_')
+    data = await callback_store.unpack('qtrans_', query.data)
+    if data is None:
+        await button_expired(query)
+        return
+    
+    translator, keyword, chapter = data['translator'], data['keyword'], data['chapter']
     
-    if parts[1] == 'more':
+    if translator == 'more':
         # Show more translations
-        keyword = parts[2]
-        chapter = parts[3] if len(parts) > 3 else ""
-        
         keyboard = [
             [
-                InlineKeyboardButton("Shakir (EN)", callback_data=f'qtrans_3_{keyword}_{chapter}'),
-                InlineKeyboardButton("Pickthal (EN)", callback_data=f'qtrans_4_{keyword}_{chapter}')
+                translation_button("Shakir (EN)", '3', keyword, chapter),
+                translation_button("Pickthal (EN)", '4', keyword, chapter)
             ],
             [
-                InlineKeyboardButton("Transliteration", callback_data=f'qtrans_6_{keyword}_{chapter}'),
-                InlineKeyboardButton("German", callback_data=f'qtrans_12_{keyword}_{chapter}')
+                translation_button("Transliteration", '6', keyword, chapter),
+                translation_button("German", '12', keyword, chapter)
             ],
             [
-                InlineKeyboardButton("🔙 Back", callback_data=f'qtrans_back_{keyword}_{chapter}')
+                translation_button("🔙 Back", 'back', keyword, chapter)
             ]
         ]
         
@@ -131,45 +143,21 @@ async def quran_translation_callback(update: Update, context: ContextTypes.DEFAU
         )
         return
     
-    if parts[1] == 'back':
+    if translator == 'back':
         # Go back to main translation menu
-        keyword = parts[2]
-        chapter = parts[3] if len(parts) > 3 else ""
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("🇬🇧 Yusuf Ali", callback_data=f'qtrans_2_{keyword}_{chapter}'),
-                InlineKeyboardButton("🇸🇦 Arabic", callback_data=f'qtrans_1_{keyword}_{chapter}')
-            ],
-            [
-                InlineKeyboardButton("🇵🇰 Urdu", callback_data=f'qtrans_17_{keyword}_{chapter}'),
-                InlineKeyboardButton("🇫🇷 French", callback_data=f'qtrans_8_{keyword}_{chapter}')
-            ],
-            [
-                InlineKeyboardButton("🇪🇸 Spanish", callback_data=f'qtrans_9_{keyword}_{chapter}'),
-                InlineKeyboardButton("More...", callback_data=f'qtrans_more_{keyword}_{chapter}')
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         chapter_text = f" in chapter {chapter}" if chapter else ""
         await query.edit_message_text(
             f"🔍 *Searching for:* `{keyword}`{chapter_text}\n\n"
             "Select translation:",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
+            reply_markup=translation_keyboard(keyword, chapter)
         )
         return
     
-    # Normal translation selection
-    translator = parts[1]
-    keyword = parts[2]
-    chapter = parts[3] if len(parts) > 3 else ""
-    
     # Show searching message
     translation_name = TRANSLATIONS.get(translator, {}).get('name', 'Unknown')
-    await query.edit_message_text(
+    await edit_interim(
+        query,
         f"🔍 Searching Quran for *{keyword}*...\n"
         f"Translation: {translation_name}\n"
         "Please wait...",
@@ -177,7 +165,8 @@ async def quran_translation_callback(update: Update, context: ContextTypes.DEFAU
     )
     
     # Perform search
-    results = search_api.search_quran(keyword, chapter, translator, MAX_QURAN_RESULTS)
+    # Fetch every page at once; Next/Prev then read from the cursor
+    results = await search_api.search_quran(keyword, chapter, translator, RESULT_CURSOR_MAX_RESULTS)
     
     # Format results
     if chapter and chapter.isdigit() and int(chapter) in QURAN_CHAPTERS:
@@ -186,23 +175,15 @@ async def quran_translation_callback(update: Update, context: ContextTypes.DEFAU
     else:
         header = f"*Results for '{keyword}'*\n"
     
-    response_text = f"{header}Translation: {translation_name}\n\n"
-    
     if results and "Unable" not in results[0] and "No Quran" not in results[0]:
-        for i, result in enumerate(results, 1):
-            clean_result = result.replace('[', '*[').replace(']', ']*')
-            response_text += f"*{i}.* {clean_result}\n\n"
-        
-        if len(results) == MAX_QURAN_RESULTS:
-            response_text += f"_Showing {MAX_QURAN_RESULTS} results_\n\n"
-        
-        response_text += "✨ *Search again:* /search"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔍 New Search", callback_data='main_quran')],
-            [InlineKeyboardButton("📚 Browse Chapters", callback_data='quran_chapters')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        cursor = ResultCursor(
+            header=f"{header}Translation: {translation_name}\n\n",
+            results=[result.replace('[', '*[').replace(']', ']*') for result in results],
+            page_size=MAX_QURAN_RESULTS,
+            footer="✨ *Search again:* /search",
+            buttons=[[("🔍 New Search", 'main_quran')], [("📚 Browse Chapters", 'quran_chapters')]]
+        )
+        response_text, reply_markup = first_page(('quran', keyword, chapter, translator), cursor)
         
         await query.edit_message_text(
             response_text,
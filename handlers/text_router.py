@@ -0,0 +1,41 @@
+"""
+Routing of plain text messages by conversation state
+
+context.user_data['state'] names what the bot is waiting for. TEXT_STATES
+maps each state to the one handler that consumes the next text message;
+without a known state the message is a quick search. Every text message
+goes through route_text, a single MessageHandler, instead of one handler
+per state in separate groups each re-checking the state.
+"""
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from handlers.dictionary_handlers import handle_dictionary_search
+from handlers.hadith_handlers import handle_hadith_search
+from handlers.main_menu import handle_quick_search
+from handlers.prayer_handlers import handle_city_search
+from handlers.quran_handlers import handle_quran_search
+from metrics import instrument
+
+logger = logging.getLogger(__name__)
+
+# Wrapped so each state's handler gets its own latency histogram
+TEXT_STATES = {
+    'waiting_quran_search': instrument(handle_quran_search),
+    'waiting_hadith_search': instrument(handle_hadith_search),
+    'waiting_dict_search': instrument(handle_dictionary_search),
+    'waiting_city_search': instrument(handle_city_search),
+}
+quick_search = instrument(handle_quick_search)
+
+async def route_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send a text message to the handler for the user's current state"""
+    state = context.user_data.get('state')
+    handler = TEXT_STATES.get(state)
+    if handler is None:
+        if state is not None:
+            logger.warning(f"Unknown conversation state {state!r}, treating message as a quick search")
+            context.user_data['state'] = None
+        handler = quick_search
+    await handler(update, context)
@@ -0,0 +1,265 @@
+"""
+Shared HTTP client for all SearchTruth.com requests
+
+Each endpoint (URL path) gets its own timeout derived from its recent
+latency percentiles. A request still running after the endpoint's p95 is
+hedged: a duplicate is sent, the first response wins and the other
+request is cancelled. Hedges are paid for from a budget of HEDGE_BUDGET
+extra requests per request, so upstream load grows by at most that share.
+
+Responses arrive gzip-compressed, or brotli-compressed when the 'brotli'
+package is installed (httpx[brotli]); httpx advertises and decodes both.
+"""
+import time
+import asyncio
+import logging
+import httpx
+from collections import deque
+from typing import Dict, Optional, Set
+
+from config import (
+    REQUEST_TIMEOUT, USER_AGENT, HTTP_POOL_SIZE,
+    HTTP_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY, HTTP2_ENABLED,
+    HTTP_LATENCY_WINDOW, HTTP_LATENCY_MIN_SAMPLES, HTTP_TIMEOUT_MULTIPLIER, HTTP_TIMEOUT_MIN,
+    HEDGE_BUDGET, HEDGE_MIN_DELAY
+)
+
+logger = logging.getLogger(__name__)
+
+HEDGE_BURST = 10  # Unspent hedges that may accumulate for a burst of slow requests
+
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+class _HandshakeTrace:
+    """httpcore trace hook recording TCP connect and TLS time of one request"""
+    
+    def __init__(self):
+        self.new_connection = False
+        self.handshake_seconds = 0.0
+        self._started = {}
+    
+    async def __call__(self, event_name: str, info: Dict) -> None:
+        # Events look like "connection.connect_tcp.started" / ".complete"
+        if not event_name.startswith('connection.'):
+            return
+        step, _, phase = event_name[len('connection.'):].rpartition('.')
+        if step not in ('connect_tcp', 'start_tls'):
+            return
+        if phase == 'started':
+            self.new_connection = True
+            self._started[step] = time.perf_counter()
+        elif phase == 'complete' and step in self._started:
+            self.handshake_seconds += time.perf_counter() - self._started.pop(step)
+
+class LatencyTracker:
+    """Recent response times of one endpoint and the timeout and hedge delay derived from them"""
+    
+    def __init__(self, max_timeout: float = REQUEST_TIMEOUT, window: int = HTTP_LATENCY_WINDOW,
+                 min_samples: int = HTTP_LATENCY_MIN_SAMPLES):
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._sorted = None  # sorted copy of _samples, rebuilt after a new sample
+        self.requests = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+    
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._sorted = None
+    
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th latency quantile in seconds, or None until min_samples responses were seen"""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        return self._sorted[min(int(len(self._sorted) * p), len(self._sorted) - 1)]
+    
+    def timeout(self) -> float:
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return self.max_timeout
+        return min(max(p99 * HTTP_TIMEOUT_MULTIPLIER, HTTP_TIMEOUT_MIN), self.max_timeout)
+    
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a request is hedged, None while there is too little data"""
+        p95 = self.percentile(0.95)
+        return None if p95 is None else max(p95, HEDGE_MIN_DELAY)
+    
+    def stats(self) -> Dict:
+        def ms(p: float) -> Optional[float]:
+            value = self.percentile(p)
+            return None if value is None else round(value * 1000, 1)
+        
+        return {
+            "requests": self.requests,
+            "p50_ms": ms(0.5),
+            "p95_ms": ms(0.95),
+            "p99_ms": ms(0.99),
+            "timeout_s": round(self.timeout(), 2),
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
+
+class HTTPClient:
+    """Process-wide pooled HTTP client with keep-alive and optional HTTP/2
+    
+    One instance is shared by every handler module so that connections to
+    www.searchtruth.com are reused instead of paying a new TCP and TLS
+    handshake per search.
+    """
+    
+    def __init__(self, timeout=REQUEST_TIMEOUT, user_agent=USER_AGENT,
+                 pool_size=HTTP_POOL_SIZE, keepalive_connections=HTTP_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, http2=HTTP2_ENABLED,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, hedge_budget: float = HEDGE_BUDGET):
+        self.timeout = timeout
+        self.headers = {'User-Agent': user_agent}
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        if http2 and not H2_AVAILABLE:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        self.http2 = http2 and H2_AVAILABLE
+        self.transport = transport
+        self._client = None
+        self.hedge_budget = hedge_budget
+        self._hedge_tokens = 0.0  # earned hedge_budget per request, one spent per hedge
+        self.latency: Dict[str, LatencyTracker] = {}
+        self.stats = {
+            "requests": 0,
+            "new_connections": 0,
+            "reused_connections": 0,
+            "handshake_seconds": 0.0,
+            "bytes_downloaded": 0,  # on the wire, compressed
+            "bytes_decoded": 0,
+            "not_modified": 0
+        }
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Underlying httpx client, created lazily inside the running event loop"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self.transport
+            )
+        return self._client
+    
+    def _tracker(self, url: str) -> LatencyTracker:
+        endpoint = httpx.URL(url).path
+        tracker = self.latency.get(endpoint)
+        if tracker is None:
+            tracker = self.latency[endpoint] = LatencyTracker(self.timeout)
+        return tracker
+    
+    async def get(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None) -> httpx.Response:
+        """GET a URL through the shared connection pool, hedging it if it runs past the endpoint's p95"""
+        tracker = self._tracker(url)
+        tracker.requests += 1
+        self._hedge_tokens = min(self._hedge_tokens + self.hedge_budget, HEDGE_BURST)
+        timeout = tracker.timeout()
+        delay = tracker.hedge_delay()
+        if delay is None or self.hedge_budget <= 0:
+            return await self._attempt(url, params, headers, timeout, tracker)
+        
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(self._attempt(url, params, headers, timeout, tracker))
+        attempts = {primary}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done or self._hedge_tokens < 1:
+                return await primary
+            
+            self._hedge_tokens -= 1
+            tracker.hedges += 1
+            attempts.add(asyncio.ensure_future(self._attempt(url, params, headers, timeout, tracker)))
+            winner = await self._first_response(set(attempts))
+            if winner is not primary:
+                # The cancelled primary took at least this long; keep it in the tail
+                tracker.record(time.perf_counter() - started)
+                tracker.hedge_wins += 1
+            return winner.result()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+    
+    @staticmethod
+    async def _first_response(attempts: Set[asyncio.Task]) -> asyncio.Task:
+        """The first attempt to succeed; raises the first error if all of them fail"""
+        error = None
+        while attempts:
+            done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [attempt for attempt in done if attempt.exception() is None]
+            if succeeded:
+                return succeeded[0]
+            error = error or next(iter(done)).exception()
+        raise error
+    
+    async def _attempt(self, url: str, params: Optional[Dict], headers: Optional[Dict], timeout: float,
+                       tracker: LatencyTracker) -> httpx.Response:
+        trace = _HandshakeTrace()
+        started = time.perf_counter()
+        try:
+            response = await self.client.get(
+                url, params=params, headers=headers, timeout=timeout, extensions={"trace": trace}
+            )
+        except httpx.TimeoutException:
+            tracker.timeouts += 1
+            raise
+        finally:
+            self._record(trace)
+        tracker.record(time.perf_counter() - started)
+        self.stats["bytes_downloaded"] += response.num_bytes_downloaded
+        self.stats["bytes_decoded"] += len(response.content)
+        if response.status_code == 304:
+            self.stats["not_modified"] += 1
+        
+        logger.debug(
+            f"GET {url} {'new connection' if trace.new_connection else 'reused connection'}, "
+            f"handshake {trace.handshake_seconds * 1000:.1f} ms"
+        )
+        return response
+    
+    def _record(self, trace: _HandshakeTrace) -> None:
+        self.stats["requests"] += 1
+        if trace.new_connection:
+            self.stats["new_connections"] += 1
+            self.stats["handshake_seconds"] += trace.handshake_seconds
+        else:
+            self.stats["reused_connections"] += 1
+    
+    def latency_stats(self) -> Dict[str, Dict]:
+        """Latency percentiles, timeout and hedging counters per endpoint"""
+        return {endpoint: tracker.stats() for endpoint, tracker in self.latency.items()}
+    
+    def handshake_savings(self) -> Dict:
+        """Estimate the handshake time saved by connection reuse"""
+        new = self.stats["new_connections"]
+        avg_handshake = self.stats["handshake_seconds"] / new if new else 0.0
+        return {
+            "avg_handshake_ms": avg_handshake * 1000,
+            "reuse_ratio": self.stats["reused_connections"] / self.stats["requests"] if self.stats["requests"] else 0.0,
+            "saved_ms": avg_handshake * self.stats["reused_connections"] * 1000
+        }
+    
+    async def aclose(self) -> None:
+        """Close all pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+# Shared by every handler module through search_apis.search_api
+http_client = HTTPClient()
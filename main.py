@@ -1,27 +1,44 @@
 """
 Main entry point for SearchTruth Telegram Bot
 """
+import argparse
 import logging
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from typing import Optional
+from telegram import Update
+from telegram.request import BaseRequest
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters
 
-from config import BOT_TOKEN
+from config import BOT_TOKEN, BOT_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_URL
+from cache import search_cache
+from callback_store import callback_store
+from city_directory import city_directory
+from http_client import http_client
+from parsers import EXTRACTORS
+from metrics import MetricFamily, instrument, metrics_server, registry
+from persistence import WRITE_THROUGH_GROUP, create_persistence
+from rate_limiter import FloodControlRateLimiter
+from search_apis import search_api
+from update_processor import PerChatUpdateProcessor
 from handlers.main_menu import (
     start_command, main_menu_callback, help_command,
-    prayer_country_callback, handle_quick_search
+    prayer_country_callback, hijri_command, hijri_month_callback
 )
 from handlers.quran_handlers import (
-    quran_search_callback, quran_translation_callback,
-    handle_quran_search
+    quran_search_callback, quran_translation_callback
 )
 from handlers.hadith_handlers import (
-    hadith_search_callback, hadith_collection_callback,
-    handle_hadith_search
+    hadith_search_callback, hadith_collection_callback
 )
 from handlers.dictionary_handlers import (
     dictionary_search_callback, dictionary_type_callback,
-    handle_dictionary_search
+    dictionary_az_callback
 )
-from handlers.prayer_handlers import prayer_command
+from handlers.pagination import cursor_cache, page_callback
+from handlers.prayer_handlers import (
+    prayer_command, prayer_city_callback, prayer_cities_callback,
+    city_search_callback
+)
+from handlers.text_router import route_text
 
 # Configure logging
 logging.basicConfig(
@@ -39,20 +56,58 @@ async def error_handler(update, context):
             "❌ Sorry, something went wrong. Please try again or use /start to restart."
         )
 
-def main():
-    """Start the bot"""
-    print("=" * 50)
-    print("🕌 SearchTruth Telegram Bot - Starting...")
-    print("=" * 50)
-    
-    if BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
-        print("❌ ERROR: Please update BOT_TOKEN in config.py")
-        print("Get your bot token from @BotFather on Telegram")
-        print("=" * 50)
-        return
+async def post_init(application):
+    """Index the prayer cities and serve metrics"""
+    city_directory.load_all()
+    await metrics_server.start()
+
+async def post_shutdown(application):
+    """Release pooled SearchTruth connections"""
+    await metrics_server.stop()
+    logger.info(f"City directory: {city_directory.stats()}")
+    savings = http_client.handshake_savings()
+    logger.info(
+        f"HTTP pool: {http_client.stats['requests']} requests, "
+        f"{savings['reuse_ratio']:.0%} reused connections, "
+        f"~{savings['saved_ms']:.0f} ms of handshakes saved"
+    )
+    logger.info(
+        f"HTTP transfer: {http_client.stats['bytes_downloaded']} bytes downloaded for "
+        f"{http_client.stats['bytes_decoded']} decoded, "
+        f"{http_client.stats['not_modified']} not modified ({search_api.revalidated} cached parses reused)"
+    )
+    logger.info(f"Upstream latency: {http_client.latency_stats()}")
+    logger.info(f"Search cache: {search_cache.stats()}")
+    logger.info(f"Search coalescing: {search_api.flights.stats()}")
+    logger.info(f"Parser strategies: {dict((page, extractor.stats()) for page, extractor in EXTRACTORS.items())}")
+    logger.info(f"SearchTruth circuits: {search_api.breaker_stats()}")
+    logger.info(f"Callback store: {callback_store.stats()}")
+    logger.info(f"Result cursors: {cursor_cache.stats()}")
+    await http_client.aclose()
+    search_cache.close()
+    callback_store.close()
+    cursor_cache.close()
+
+def build_application(request: Optional[BaseRequest] = None) -> Application:
+    """Create the Application with every handler registered
     
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    request replaces the connection to the Bot API; benchmarks/load_test.py
+    passes a local stand-in.
+    """
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor())
+        .rate_limiter(FloodControlRateLimiter())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if request is not None:
+        builder.request(request).get_updates_request(request)
+    persistence = create_persistence()
+    if persistence is not None:
+        builder.persistence(persistence)
+    application = builder.build()
     
     # ========== COMMAND HANDLERS ==========
     application.add_handler(CommandHandler("start", start_command))
@@ -61,6 +116,7 @@ def main():
     application.add_handler(CommandHandler("hadith", lambda u, c: hadith_search_callback(u, c)))
     application.add_handler(CommandHandler("dictionary", lambda u, c: dictionary_search_callback(u, c)))
     application.add_handler(CommandHandler("prayer", prayer_command))
+    application.add_handler(CommandHandler("hijri", hijri_command))
     
     # ========== CALLBACK QUERY HANDLERS ==========
     # Main menu
@@ -77,11 +133,21 @@ def main():
     # Prayer
     application.add_handler(CallbackQueryHandler(prayer_country_callback, pattern=r'^pcountry_'))
     application.add_handler(CallbackQueryHandler(prayer_country_callback, pattern=r'^prayer_all_countries$'))
+    application.add_handler(CallbackQueryHandler(prayer_city_callback, pattern=r'^pcity_'))
+    application.add_handler(CallbackQueryHandler(prayer_cities_callback, pattern=r'^pcities_'))
+    application.add_handler(CallbackQueryHandler(city_search_callback, pattern=r'^pcsearch_'))
+    
+    # Hijri calendar
+    application.add_handler(CallbackQueryHandler(hijri_month_callback, pattern=r'^hijri_month_'))
     
     # Dictionary
     application.add_handler(CallbackQueryHandler(dictionary_search_callback, pattern=r'^dict_search$'))
     application.add_handler(CallbackQueryHandler(dictionary_search_callback, pattern=r'^dict_search_'))
     application.add_handler(CallbackQueryHandler(dictionary_type_callback, pattern=r'^dicttype_'))
+    application.add_handler(CallbackQueryHandler(dictionary_az_callback, pattern=r'^dict_az'))
+    
+    # Result pages
+    application.add_handler(CallbackQueryHandler(page_callback, pattern=r'^page_'))
     
     # Other menu callbacks
     application.add_handler(CallbackQueryHandler(main_menu_callback, pattern=r'^quran_'))
@@ -89,17 +155,132 @@ def main():
     application.add_handler(CallbackQueryHandler(main_menu_callback, pattern=r'^dict_'))
     
     # ========== MESSAGE HANDLERS ==========
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_quick_search))
+    # One handler for all text; the conversation state picks the function
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, route_text))
     
-    # State-specific handlers (with higher priority)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_quran_search), group=1)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_hadith_search), group=2)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_dictionary_search), group=3)
+    # ========== SHARED STATE ==========
+    # Other replicas must see this update's state before the next flush interval
+    if persistence is not None and persistence.backend.shared:
+        application.add_handler(TypeHandler(Update, persistence.write_through), group=WRITE_THROUGH_GROUP)
     
     # ========== ERROR HANDLER ==========
     application.add_error_handler(error_handler)
     
+    instrument_handlers(application)
+    registry.set_collector('application', lambda: collect_metrics(application))
+    
+    return application
+
+def instrument_handlers(application: Application) -> None:
+    """Record latency, errors and in-flight updates of every registered handler"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            name = handler.callback.__name__
+            if name == '<lambda>' and isinstance(handler, CommandHandler):
+                name = '/' + '/'.join(sorted(handler.commands))
+            handler.callback = instrument(handler.callback, name)
+
+def collect_metrics(application: Application):
+    """Metrics read from the stats the bot's components already keep, at scrape time"""
+    caches = {"search": search_cache.stats(), "callback": callback_store.stats(), "cursor": cursor_cache.stats()}
+    for suffix, kind in (("hits", "hits"), ("misses", "misses")):
+        yield MetricFamily(f"searchtruth_cache_{suffix}_total", "counter", f"Cache lookup {kind} by cache and tier", [
+            ({"cache": cache, "tier": tier}, stats[f"{tier}_{kind}"])
+            for cache, stats in caches.items() for tier in ("memory", "disk") if f"{tier}_{kind}" in stats
+        ])
+    yield MetricFamily("searchtruth_cache_hit_ratio", "gauge", "Share of lookups answered by any cache tier", [
+        ({"cache": cache}, (stats["memory_hits"] + stats.get("disk_hits", 0)) /
+         max(stats["memory_hits"] + stats["memory_misses"], 1))
+        for cache, stats in caches.items()
+    ])
+    yield MetricFamily("searchtruth_cache_entries", "gauge", "Entries in the in-memory tier", [
+        ({"cache": cache}, stats["memory_entries"]) for cache, stats in caches.items()
+    ])
+    
+    circuits = search_api.breaker_stats()
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    yield MetricFamily("searchtruth_circuit_state", "gauge", "Circuit breaker state: 0 closed, 1 half-open, 2 open", [
+        ({"endpoint": endpoint}, states[stats["state"]]) for endpoint, stats in circuits.items()
+    ])
+    for field, help in (("rejected", "Requests not sent because the circuit was open"),
+                        ("stale_served", "Searches answered from stale cache")):
+        yield MetricFamily(f"searchtruth_circuit_{field}_total", "counter", help, [
+            ({"endpoint": endpoint}, stats[field]) for endpoint, stats in circuits.items()
+        ])
+    
+    latency = http_client.latency_stats()
+    yield MetricFamily("searchtruth_upstream_timeout_seconds", "gauge", "Current adaptive timeout per endpoint", [
+        ({"path": path}, stats["timeout_s"]) for path, stats in latency.items()
+    ])
+    yield MetricFamily("searchtruth_upstream_hedges_total", "counter", "Hedged duplicate requests sent", [
+        ({"path": path}, stats["hedges"]) for path, stats in latency.items()
+    ])
+    yield MetricFamily("searchtruth_http_bytes_total", "counter", "Response bytes from SearchTruth", [
+        ({"encoding": "wire"}, http_client.stats["bytes_downloaded"]),
+        ({"encoding": "decoded"}, http_client.stats["bytes_decoded"])
+    ])
+    yield MetricFamily("searchtruth_http_not_modified_total", "counter", "304 answers to conditional GETs", [
+        ({}, http_client.stats["not_modified"])
+    ])
+    yield MetricFamily("searchtruth_search_coalesced_total", "counter", "Searches that joined an identical one in flight", [
+        ({}, search_api.flights.stats()["coalesced"])
+    ])
+    yield MetricFamily("searchtruth_parser_strategy_total", "counter", "Parsed pages by the strategy that found the results", [
+        ({"page": page, "strategy": strategy}, count)
+        for page, extractor in EXTRACTORS.items() for strategy, count in extractor.stats().items()
+    ])
+    
+    processor = application.update_processor
+    if hasattr(processor, 'stats'):
+        stats = processor.stats()
+        yield MetricFamily("searchtruth_updates_in_flight", "gauge", "Updates waiting for their chat or a worker, and running", [
+            ({"stage": "waiting"}, stats["waiting"]), ({"stage": "running"}, stats["running"])
+        ])
+        yield MetricFamily("searchtruth_updates_processed_total", "counter", "Updates fully handled", [
+            ({}, stats["processed"])
+        ])
+    
+    limiter = application.bot.rate_limiter
+    if hasattr(limiter, 'stats'):
+        stats = limiter.stats()
+        yield MetricFamily("searchtruth_bot_api_requests_total", "counter", "Outbound Bot API requests by outcome", [
+            ({"outcome": outcome}, stats[field])
+            for outcome, field in (("sent", "sent"), ("merged", "merged_edits"), ("delayed", "delayed"), ("retried", "retries"))
+        ])
+
+def main(argv=None):
+    """Start the bot"""
+    parser = argparse.ArgumentParser(description="SearchTruth Telegram Bot")
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default=BOT_MODE)
+    parser.add_argument('--listen', default=WEBHOOK_LISTEN, help="webhook listen address")
+    parser.add_argument('--port', type=int, default=WEBHOOK_PORT, help="webhook listen port")
+    parser.add_argument('--webhook-url', default=WEBHOOK_URL, help="public base URL Telegram posts updates to")
+    args = parser.parse_args(argv)
+    
+    print("=" * 50)
+    print("🕌 SearchTruth Telegram Bot - Starting...")
+    print("=" * 50)
+    
+    if BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
+        print("❌ ERROR: Please update BOT_TOKEN in config.py")
+        print("Get your bot token from @BotFather on Telegram")
+        print("=" * 50)
+        return
+    
+    application = build_application()
+    
     # ========== START BOT ==========
+    if args.mode == 'webhook':
+        from webhook import run_webhook
+        print(f"✅ Bot is serving webhooks on {args.listen}:{args.port}")
+        print("Press Ctrl+C to stop")
+        print("=" * 50)
+        try:
+            run_webhook(application, args.listen, args.port, args.webhook_url)
+        except RuntimeError as e:
+            raise SystemExit(f"❌ ERROR: {e}")
+        return
+    
     print("✅ Bot is running...")
     print("Press Ctrl+C to stop")
     print("=" * 50)
@@ -107,4 +288,4 @@ def main():
     application.run_polling()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
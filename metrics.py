@@ -0,0 +1,286 @@
+"""
+Prometheus-style metrics
+
+A small in-process registry of counters, gauges and histograms rendered
+in the Prometheus text exposition format. Hot paths only do a dict lookup
+and a few additions per observation: instrument() resolves a handler's
+label children once, when the handler is wrapped. Figures the bot already
+keeps (cache, circuit breaker, rate limiter, ... stats) are read only
+when /metrics is scraped, through collectors.
+
+MetricsServer serves METRICS_PATH on METRICS_LISTEN:METRICS_PORT (loopback
+by default) in both modes; the public webhook listener serves it too only
+with WEBHOOK_SERVE_METRICS.
+"""
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from config import METRICS_LISTEN, METRICS_PORT, METRICS_PATH
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers cache hits (sub-millisecond) up to REQUEST_TIMEOUT
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class MetricFamily(NamedTuple):
+    """One metric as produced by a collector at scrape time"""
+    name: str
+    type: str  # 'counter' or 'gauge'
+    help: str
+    samples: List[Tuple[Dict[str, str], float]]  # (labels, value)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class CounterChild:
+    __slots__ = ('value',)
+    
+    def __init__(self):
+        self.value = 0
+    
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+class GaugeChild:
+    __slots__ = ('value',)
+    
+    def __init__(self):
+        self.value = 0
+    
+    def set(self, value: float) -> None:
+        self.value = value
+    
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+    
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+class HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+    
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metric:
+    """A named metric with one child per combination of label values"""
+    
+    type = ''
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def labels(self, *values: str):
+        """The child for these label values, created on first use"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+    
+    def _label_dict(self, values: Tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_labels(self._label_dict(values))} {_number(child.value)}")
+        return lines
+
+class Counter(Metric):
+    type = 'counter'
+    
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+class Gauge(Metric):
+    type = 'gauge'
+    
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+class Histogram(Metric):
+    type = 'histogram'
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+    
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.bounds)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, child in list(self._children.items()):
+            labels = self._label_dict(values)
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), child.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(labels)} {child.count}")
+        return lines
+
+class Registry:
+    """Every metric and collector of the process, rendered together"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[MetricFamily]]] = {}
+    
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+    
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+    
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+    
+    def set_collector(self, name: str, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        """Call collector on every scrape for metrics computed from existing stats
+        
+        A collector set again under the same name replaces the old one, so
+        rebuilding the Application never renders a metric family twice.
+        """
+        self._collectors[name] = collector
+    
+    def remove_collector(self, name: str) -> None:
+        self._collectors.pop(name, None)
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for name, collector in self._collectors.items():
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector {name} failed: {e}")
+                continue
+            for family in families:
+                lines.append(f"# HELP {family.name} {family.help}")
+                lines.append(f"# TYPE {family.name} {family.type}")
+                lines.extend(f"{family.name}{_labels(labels)} {_number(value)}" for labels, value in family.samples)
+        return '\n'.join(lines) + '\n'
+
+def instrument(callback: Callable, name: Optional[str] = None) -> Callable:
+    """Wrap an async update handler to record its latency, errors and in-flight count"""
+    name = name or callback.__name__
+    latency = handler_seconds.labels(name)
+    in_flight = handlers_in_flight.labels(name)
+    
+    @functools.wraps(callback)
+    async def instrumented(update, context):
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception as e:
+            handler_errors.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+            in_flight.dec()
+    
+    return instrumented
+
+class MetricsServer:
+    """Minimal HTTP listener answering GET METRICS_PATH with the registry"""
+    
+    def __init__(self, port: Optional[int] = METRICS_PORT, listen: str = METRICS_LISTEN, path: str = METRICS_PATH):
+        self.port = port
+        self.listen = listen
+        self.path = path
+        self._server = None
+    
+    async def start(self) -> None:
+        if self.port is None or self._server is not None:
+            return
+        try:
+            self._server = await asyncio.start_server(self._serve, self.listen, self.port)
+        except OSError as e:
+            logger.error(f"Metrics server could not listen on {self.listen}:{self.port}: {e}")
+            return
+        logger.info(f"Metrics served on http://{self.listen}:{self.port}{self.path}")
+    
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+    
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass  # headers are not needed
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] in ('GET', 'HEAD') and parts[1].split('?')[0] == self.path:
+                status, content_type, body = '200 OK', CONTENT_TYPE, registry.render().encode()
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', b'not found\n'
+            head = (f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode()
+            writer.write(head if parts and parts[0] == 'HEAD' else head + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+# Process-wide registry and the metrics recorded on hot paths
+registry = Registry()
+handler_seconds = registry.histogram(
+    'searchtruth_handler_seconds', 'Time spent in each update handler', ['handler'])
+handler_errors = registry.counter(
+    'searchtruth_handler_errors_total', 'Exceptions raised by update handlers, by type', ['handler', 'type'])
+handlers_in_flight = registry.gauge(
+    'searchtruth_handlers_in_flight', 'Updates each handler is working on right now', ['handler'])
+upstream_fetch_seconds = registry.histogram(
+    'searchtruth_upstream_fetch_seconds', 'Time to download a SearchTruth page', ['endpoint'])
+upstream_parse_seconds = registry.histogram(
+    'searchtruth_upstream_parse_seconds', 'Time to parse a downloaded SearchTruth page', ['endpoint'])
+upstream_in_flight = registry.gauge(
+    'searchtruth_upstream_requests_in_flight', 'SearchTruth fetches and parses in progress', ['endpoint'])
+upstream_errors = registry.counter(
+    'searchtruth_upstream_errors_total', 'Failed SearchTruth fetches, by exception type', ['endpoint', 'type'])
+metrics_server = MetricsServer()
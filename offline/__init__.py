@@ -0,0 +1,3 @@
+"""
+Offline data stores and engines for SearchTruth Telegram Bot
+"""
@@ -0,0 +1,354 @@
+"""
+Offline English-Arabic dictionary backed by a packed trie
+
+The dictionary is built from a local tab-separated file with one
+"headword<TAB>meaning" line per sense (a headword may repeat):
+
+    python -m offline.dictionary build english-arabic.tsv
+
+File layout (little-endian, every section 4-byte aligned):
+
+    header       magic, version, node_count, key_count, suffix_count, section offsets
+    labels       u8[node_count]          byte on the edge into each node
+    children     u32[node_count + 1]     children of node i are nodes children[i]..children[i + 1]
+    key_lo       u32[node_count]         first key id below the node
+    key_hi       u32[node_count]         one past the last key id below the node
+    key_offs     u32[key_count + 1]      offsets into key_blob
+    key_blob     UTF-8 normalized headwords, sorted by their encoded bytes
+    value_offs   u32[key_count + 1]      offsets into value_blob
+    value_blob   UTF-8 result lines per key, newline separated
+    suffixes     u32[suffix_count]       (key id << 8 | byte offset), sorted by suffix
+
+Nodes are stored breadth first and keys in byte order, so the keys under
+any trie node are one contiguous id range: an exact lookup walks
+len(word) nodes, and a prefix lookup walks the prefix and then reads a
+slice of that range. Substring lookups binary search the suffix array.
+"""
+import os
+import sys
+import mmap
+import time
+import array
+import struct
+import logging
+import argparse
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from config import DICTIONARY_PATH, OFFLINE_DATA_RECHECK_INTERVAL
+from offline.text_index import normalize
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'STDT'
+VERSION = 1
+_HEADER = struct.Struct('<4sIIII10I')
+MAX_KEY_BYTES = 255  # suffix entries keep the byte offset in 8 bits
+
+def _u32_array(values: Iterable[int]) -> bytes:
+    data = array.array('I', values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+def _pad(data: bytes) -> bytes:
+    return data + b'\0' * (-len(data) % 4)
+
+def read_tsv(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (headword, meaning) from a 'headword<TAB>meaning' file"""
+    with open(path, encoding='utf-8-sig') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                headword, meaning = line.split('\t', 1)
+            except ValueError:
+                raise ValueError(f"{path}:{line_no}: expected 'headword<TAB>meaning'")
+            yield headword.strip(), meaning.strip()
+
+class DictionaryWriter:
+    """Collects entries and writes a dictionary file"""
+    
+    def __init__(self):
+        self._entries: Dict[bytes, List[str]] = {}
+    
+    def add(self, headword: str, meaning: str) -> None:
+        key = normalize(headword).strip().encode('utf-8')
+        if not key or len(key) > MAX_KEY_BYTES:
+            logger.warning(f"Skipping headword {headword!r}")
+            return
+        self._entries.setdefault(key, []).append(f"{headword} | {meaning}")
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def write(self, path: str) -> None:
+        keys = sorted(self._entries)
+        
+        # Breadth-first trie over the sorted keys: node i covers keys[key_lo[i]:key_hi[i]],
+        # all of which share its depth-byte prefix
+        labels = bytearray([0])
+        children = []
+        key_lo = [0]
+        key_hi = [len(keys)]
+        depths = [0]
+        node = 0
+        while node < len(key_lo):
+            children.append(len(key_lo))
+            lo, hi, depth = key_lo[node], key_hi[node], depths[node]
+            if lo < hi and len(keys[lo]) == depth:
+                lo += 1
+            while lo < hi:
+                label = keys[lo][depth]
+                end = lo + 1
+                while end < hi and keys[end][depth] == label:
+                    end += 1
+                labels.append(label)
+                key_lo.append(lo)
+                key_hi.append(end)
+                depths.append(depth + 1)
+                lo = end
+            node += 1
+        children.append(len(key_lo))
+        
+        key_offs = [0]
+        for key in keys:
+            key_offs.append(key_offs[-1] + len(key))
+        values = ['\n'.join(self._entries[key]).encode('utf-8') for key in keys]
+        value_offs = [0]
+        for value in values:
+            value_offs.append(value_offs[-1] + len(value))
+        
+        # Suffixes start on character boundaries only (not on UTF-8 continuation bytes)
+        suffixes = [(key_id << 8) | offset
+                    for key_id, key in enumerate(keys)
+                    for offset in range(len(key)) if key[offset] & 0xC0 != 0x80]
+        suffixes.sort(key=lambda entry: keys[entry >> 8][entry & 0xFF:])
+        
+        sections = [
+            _pad(bytes(labels)),
+            _u32_array(children),
+            _u32_array(key_lo),
+            _u32_array(key_hi),
+            _u32_array(key_offs),
+            _pad(b''.join(keys)),
+            _u32_array(value_offs),
+            _pad(b''.join(values)),
+            _u32_array(suffixes)
+        ]
+        offsets = []
+        position = _HEADER.size
+        for section in sections:
+            offsets.append(position)
+            position += len(section)
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(key_lo), len(keys), len(suffixes), *offsets, position))
+            for section in sections:
+                f.write(section)
+        os.replace(tmp_path, path)
+
+class Dictionary:
+    """Read-only, memory-mapped view of a dictionary file"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        magic, version, self.node_count, self.key_count, self.suffix_count, *offsets = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} dictionary, rebuild it")
+        
+        labels, children, key_lo, key_hi, key_offs, key_blob, value_offs, value_blob, suffixes, _ = offsets
+        self._labels = memoryview(self._mmap)[labels:labels + self.node_count]
+        self._views.append(self._labels)
+        self._children = self._u32(children, self.node_count + 1)
+        self._key_lo = self._u32(key_lo, self.node_count)
+        self._key_hi = self._u32(key_hi, self.node_count)
+        self._key_offs = self._u32(key_offs, self.key_count + 1)
+        self._key_blob = key_blob
+        self._value_offs = self._u32(value_offs, self.key_count + 1)
+        self._value_blob = value_blob
+        self._suffixes = self._u32(suffixes, self.suffix_count)
+    
+    def _u32(self, offset: int, count: int) -> Sequence[int]:
+        if sys.byteorder != 'little':
+            data = array.array('I', self._mmap[offset:offset + 4 * count])
+            data.byteswap()
+            return data
+        view = memoryview(self._mmap)[offset:offset + 4 * count]
+        self._views.append(view)
+        self._views.append(view.cast('I'))
+        return self._views[-1]
+    
+    def key(self, key_id: int) -> str:
+        return self._key_bytes(key_id).decode('utf-8')
+    
+    def _key_bytes(self, key_id: int, start: int = 0) -> bytes:
+        return self._mmap[self._key_blob + self._key_offs[key_id] + start:self._key_blob + self._key_offs[key_id + 1]]
+    
+    def values(self, key_id: int) -> List[str]:
+        start = self._value_blob + self._value_offs[key_id]
+        end = self._value_blob + self._value_offs[key_id + 1]
+        return self._mmap[start:end].decode('utf-8').split('\n')
+    
+    def _walk(self, key: bytes) -> int:
+        """Trie node reached by following key from the root, or -1"""
+        node = 0
+        for label in key:
+            lo, hi = self._children[node], self._children[node + 1]
+            node = bisect_left(self._labels, label, lo, hi)
+            if node == hi or self._labels[node] != label:
+                return -1
+        return node
+    
+    def exact(self, word: str) -> Optional[int]:
+        """Key id of the word, in O(len(word))"""
+        key = normalize(word).strip().encode('utf-8')
+        node = self._walk(key)
+        if node < 0:
+            return None
+        key_id = self._key_lo[node]
+        if key_id < self._key_hi[node] and self._key_offs[key_id + 1] - self._key_offs[key_id] == len(key):
+            return key_id
+        return None
+    
+    def prefix(self, prefix: str) -> range:
+        """Ids of all keys starting with prefix, in alphabetical order"""
+        node = self._walk(normalize(prefix).strip().encode('utf-8'))
+        if node < 0:
+            return range(0)
+        return range(self._key_lo[node], self._key_hi[node])
+    
+    def substring(self, text: str, limit: int, max_scan: int = 1000) -> List[int]:
+        """The first limit ids, alphabetically, of keys containing text
+        
+        At most max_scan suffix entries are read, so very short queries stay
+        cheap at the cost of possibly missing some matches.
+        """
+        needle = normalize(text).strip().encode('utf-8')
+        if not needle:
+            return []
+        lo, hi = 0, self.suffix_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._suffixes[mid]
+            if self._key_bytes(entry >> 8, entry & 0xFF) < needle:
+                lo = mid + 1
+            else:
+                hi = mid
+        
+        found = set()
+        for position in range(lo, min(lo + max_scan, self.suffix_count)):
+            entry = self._suffixes[position]
+            if not self._key_bytes(entry >> 8, entry & 0xFF).startswith(needle):
+                break
+            found.add(entry >> 8)
+        # Suffix order is not key order: sort every match before taking the first limit
+        return sorted(found)[:limit]
+    
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+class LocalDictionary:
+    """Dictionary opened at first use; every lookup returns None until one is built
+    
+    While there is no dictionary file, its path is looked at again at most
+    every recheck_interval seconds, so one built later is picked up
+    without a restart.
+    """
+    
+    def __init__(self, path: str = DICTIONARY_PATH, recheck_interval: float = OFFLINE_DATA_RECHECK_INTERVAL):
+        self.path = path
+        self.recheck_interval = recheck_interval
+        self._dictionary = None
+        self._checked_at = float('-inf')
+    
+    @property
+    def dictionary(self) -> Optional[Dictionary]:
+        if self._dictionary is None and time.monotonic() - self._checked_at >= self.recheck_interval:
+            self._checked_at = time.monotonic()
+            try:
+                if os.path.exists(self.path):
+                    self._dictionary = Dictionary(self.path)
+                    logger.info(f"Opened dictionary {self.path}")
+            except (OSError, ValueError) as e:
+                logger.error(f"Cannot open dictionary {self.path}: {e}")
+        return self._dictionary
+    
+    def search(self, word: str, word_option: str = "1", max_results: int = 8) -> Optional[List[str]]:
+        """Result lines for an exact (1) or sub-word (2) search"""
+        dictionary = self.dictionary
+        if dictionary is None:
+            return None
+        
+        if word_option == "1":
+            key_id = dictionary.exact(word)
+            return dictionary.values(key_id)[:max_results] if key_id is not None else []
+        
+        results = []
+        for key_id in dictionary.substring(word, max_results):
+            results.extend(dictionary.values(key_id))
+        return [result[:400] for result in results[:max_results]]
+    
+    def headwords(self, prefix: str, offset: int = 0, limit: int = 20) -> Optional[Tuple[List[str], int]]:
+        """One page of headwords starting with prefix, and how many there are"""
+        dictionary = self.dictionary
+        if dictionary is None:
+            return None
+        key_ids = dictionary.prefix(prefix)
+        return [dictionary.key(key_id) for key_id in key_ids[offset:offset + limit]], len(key_ids)
+
+# Shared by search_apis.search_api and the A-Z index
+local_dictionary = LocalDictionary()
+
+def build(source: str, path: str = DICTIONARY_PATH) -> str:
+    writer = DictionaryWriter()
+    for headword, meaning in read_tsv(source):
+        writer.add(headword, meaning)
+    writer.write(path)
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m offline.dictionary', description="Offline dictionary")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    build_parser = commands.add_parser('build', help="build the dictionary from a 'headword<TAB>meaning' file")
+    build_parser.add_argument('source')
+    build_parser.add_argument('--out', default=DICTIONARY_PATH)
+    
+    lookup_parser = commands.add_parser('lookup', help="query a built dictionary")
+    lookup_parser.add_argument('word')
+    lookup_parser.add_argument('--option', choices=['1', '2'], default='1', help="1 = exact word, 2 = sub word")
+    lookup_parser.add_argument('--max-results', type=int, default=8)
+    lookup_parser.add_argument('--path', default=DICTIONARY_PATH)
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    
+    if args.command == 'build':
+        start = time.perf_counter()
+        path = build(args.source, args.out)
+        print(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KB) in {time.perf_counter() - start:.2f}s")
+        return
+    
+    local = LocalDictionary(args.path)
+    if local.dictionary is None:
+        sys.exit(f"No dictionary at {args.path}")
+    start = time.perf_counter()
+    results = local.search(args.word, args.option, args.max_results)
+    elapsed = (time.perf_counter() - start) * 1e6
+    for result in results:
+        print(result)
+    print(f"({len(results)} results in {elapsed:.0f} µs)")
+
+if __name__ == '__main__':
+    main()
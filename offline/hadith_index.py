@@ -0,0 +1,130 @@
+"""
+Offline Hadith search over prebuilt per-collection positional indexes
+
+Each collection in config.HADITH_COLLECTIONS can have a
+data/hadith/<code>.idx index built from a local text file with one
+"book|hadith|text" line per hadith:
+
+    python -m offline.hadith_index build bukhari.txt --collection 1
+
+Queries support several words, "exact phrases" and OR (see
+offline.text_index). When an index exists, SearchTruthAPI.search_hadith
+answers from it, including pages beyond the first MAX_HADITH_RESULTS
+hits; otherwise it falls back to scraping SearchTruth.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from typing import Iterator, List, Optional, Tuple
+
+from config import HADITH_COLLECTIONS, HADITH_INDEX_DIR
+from offline.text_index import IndexDirectory, IndexWriter, TextIndex
+
+logger = logging.getLogger(__name__)
+
+def hadith_ref(book: int, number: int) -> int:
+    """Pack a hadith reference so refs sort in collection order"""
+    return (book << 16) | number
+
+def read_hadith(path: str) -> Iterator[Tuple[int, int, str]]:
+    """Yield (book, hadith, text) from a 'book|hadith|text' file"""
+    with open(path, encoding='utf-8-sig') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                book, number, text = line.split('|', 2)
+                yield int(book), int(number), text.strip()
+            except ValueError:
+                raise ValueError(f"{path}:{line_no}: expected 'book|hadith|text'")
+
+class HadithIndex:
+    """Keyword, phrase and OR search over one collection"""
+    
+    def __init__(self, index: TextIndex):
+        self.index = index
+    
+    def search(self, keyword: str, max_results: int = 5, offset: int = 0) -> List[str]:
+        """One page of hadith matching the query, in collection order"""
+        results = []
+        for doc_id in self.index.search(keyword, limit=max_results, offset=offset):
+            ref = self.index.ref(doc_id)
+            results.append(f"[Book {ref >> 16}, Hadith {ref & 0xFFFF}] {self.index.text(doc_id)}"[:600])
+        return results
+
+class HadithLibrary(IndexDirectory):
+    """Lazily opened indexes for every configured collection"""
+    
+    def __init__(self, directory: str = HADITH_INDEX_DIR):
+        super().__init__(directory)
+    
+    def path(self, collection: str) -> str:
+        code = HADITH_COLLECTIONS.get(collection, {}).get('code', collection)
+        return super().path(code)
+    
+    def get(self, collection: str) -> Optional[HadithIndex]:
+        """Index for a collection ID, or None if it has not been built"""
+        index = super().get(collection)
+        return HadithIndex(index) if index else None
+    
+    def search(self, keyword: str, collection: str, max_results: int, offset: int = 0) -> Optional[List[str]]:
+        """Local results, or None when no index exists for the collection"""
+        index = self.get(collection)
+        if index is None:
+            return None
+        return index.search(keyword, max_results, offset)
+
+def build(source: str, collection: str, directory: str = HADITH_INDEX_DIR) -> str:
+    """Build the index for one collection and return its path"""
+    hadiths = sorted(read_hadith(source))
+    writer = IndexWriter()
+    for book, number, text in hadiths:
+        writer.add(hadith_ref(book, number), text)
+    
+    path = HadithLibrary(directory).path(collection)
+    writer.write(path)
+    return path
+
+# Shared by search_apis.search_api
+hadith_library = HadithLibrary()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m offline.hadith_index', description="Offline Hadith indexes")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    build_parser = commands.add_parser('build', help="build an index from a 'book|hadith|text' file")
+    build_parser.add_argument('source')
+    build_parser.add_argument('--collection', required=True, choices=sorted(HADITH_COLLECTIONS, key=int))
+    build_parser.add_argument('--out', default=HADITH_INDEX_DIR)
+    
+    search_parser = commands.add_parser('search', help="query a built index")
+    search_parser.add_argument('keyword')
+    search_parser.add_argument('--collection', default='1')
+    search_parser.add_argument('--max-results', type=int, default=5)
+    search_parser.add_argument('--offset', type=int, default=0)
+    search_parser.add_argument('--dir', default=HADITH_INDEX_DIR)
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    
+    if args.command == 'build':
+        start = time.perf_counter()
+        path = build(args.source, args.collection, args.out)
+        print(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KB) in {time.perf_counter() - start:.2f}s")
+        return
+    
+    library = HadithLibrary(args.dir)
+    start = time.perf_counter()
+    results = library.search(args.keyword, args.collection, args.max_results, args.offset)
+    elapsed = (time.perf_counter() - start) * 1e6
+    if results is None:
+        sys.exit(f"No index for collection {args.collection} in {args.dir}")
+    for result in results:
+        print(result)
+    print(f"({len(results)} results in {elapsed:.0f} µs)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Hijri calendar conversion backed by month-start tables
+
+Each calendar is an array holding the Gregorian day ordinal on which every
+Hijri month starts, so Hijri -> Gregorian is a single index and
+Gregorian -> Hijri is an index estimated from the mean lunation, corrected
+by at most a step or two. Walking a range of days needs no lookups at all
+beyond the first.
+
+Two calendars are available:
+
+    arithmetic   the tabular (civil) calendar with the common 30-year
+                 leap cycle, for any year from 1 to 2000 AH
+    ummalqura    the official Saudi Umm al-Qura calendar, 1343-1500 AH
+                 (1924-2077), from the optional 'hijridate' package
+
+Dates outside the Umm al-Qura table fall back to the arithmetic calendar.
+
+    python -m offline.hijri 2024-03-11
+    python -m offline.hijri 1445-09-01 --to-gregorian
+"""
+import sys
+import array
+import argparse
+from datetime import date, timedelta
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from config import HIJRI_CALENDAR
+
+try:
+    from hijridate import ummalqura as _ummalqura
+    UMM_AL_QURA_AVAILABLE = True
+except ImportError:
+    UMM_AL_QURA_AVAILABLE = False
+
+MONTHS = [
+    "Muharram", "Safar", "Rabi' al-Awwal", "Rabi' al-Thani",
+    "Jumada al-Awwal", "Jumada al-Thani", "Rajab", "Sha'ban",
+    "Ramadan", "Shawwal", "Dhu al-Qi'dah", "Dhu al-Hijjah"
+]
+
+MEAN_MONTH = 29.530588853  # days in a mean synodic month
+
+# Gregorian ordinal of 1 Muharram 1 AH (16 July 622 Julian) in the civil epoch
+ARITHMETIC_EPOCH = 227015
+ARITHMETIC_YEARS = 2000
+
+# hijridate stores month starts as Reduced Julian Days (JDN - 2400000)
+_RJD_TO_ORDINAL = 2400000 - 1721425
+
+HijriDate = Tuple[int, int, int]
+
+class HijriCalendar:
+    """Conversion over a table of month-start ordinals
+    
+    month_starts[i] is the Gregorian ordinal of the first day of the i-th
+    month counted from 1 Muharram first_year; one extra entry closes the
+    last month.
+    """
+    
+    def __init__(self, name: str, first_year: int, month_starts: Sequence[int]):
+        self.name = name
+        self.first_year = first_year
+        self.month_starts = array.array('l', month_starts)
+        self.last_year = first_year + (len(self.month_starts) - 1) // 12 - 1
+    
+    def _index(self, year: int, month: int) -> int:
+        return (year - self.first_year) * 12 + month - 1
+    
+    def covers_hijri(self, year: int, month: int) -> bool:
+        return self.first_year <= year <= self.last_year and 1 <= month <= 12
+    
+    def covers(self, day: date) -> bool:
+        return self.month_starts[0] <= day.toordinal() < self.month_starts[-1]
+    
+    def month_length(self, year: int, month: int) -> int:
+        index = self._index(year, month)
+        return self.month_starts[index + 1] - self.month_starts[index]
+    
+    def to_gregorian(self, year: int, month: int, day: int) -> date:
+        if not self.covers_hijri(year, month):
+            raise ValueError(f"{year}-{month} AH is outside the {self.name} calendar")
+        if not 1 <= day <= self.month_length(year, month):
+            raise ValueError(f"{MONTHS[month - 1]} {year} AH has {self.month_length(year, month)} days")
+        return date.fromordinal(self.month_starts[self._index(year, month)] + day - 1)
+    
+    def _month_of(self, ordinal: int) -> int:
+        """Index of the month containing a Gregorian ordinal"""
+        starts = self.month_starts
+        index = min(max(int((ordinal - starts[0]) / MEAN_MONTH), 0), len(starts) - 2)
+        while starts[index] > ordinal:
+            index -= 1
+        while starts[index + 1] <= ordinal:
+            index += 1
+        return index
+    
+    def from_gregorian(self, day: date) -> HijriDate:
+        if not self.covers(day):
+            raise ValueError(f"{day} is outside the {self.name} calendar")
+        ordinal = day.toordinal()
+        index = self._month_of(ordinal)
+        return self.first_year + index // 12, index % 12 + 1, ordinal - self.month_starts[index] + 1
+    
+    def range(self, start: date, end: date) -> Iterator[Tuple[date, HijriDate]]:
+        """(Gregorian, Hijri) for every day in [start, end)"""
+        if start >= end:
+            return
+        if not (self.covers(start) and self.covers(end - timedelta(days=1))):
+            raise ValueError(f"{start} - {end} is outside the {self.name} calendar")
+        ordinal = start.toordinal()
+        index = self._month_of(ordinal)
+        next_start = self.month_starts[index + 1]
+        for ordinal in range(ordinal, end.toordinal()):
+            if ordinal == next_start:
+                index += 1
+                next_start = self.month_starts[index + 1]
+            yield date.fromordinal(ordinal), (self.first_year + index // 12, index % 12 + 1,
+                                              ordinal - self.month_starts[index] + 1)
+    
+    def month_days(self, year: int, month: int) -> List[Tuple[int, date]]:
+        """(Hijri day, Gregorian date) for every day of a Hijri month"""
+        first = self.to_gregorian(year, month, 1)
+        return [(day, first + timedelta(days=day - 1)) for day in range(1, self.month_length(year, month) + 1)]
+
+def _arithmetic_calendar() -> HijriCalendar:
+    """Tabular calendar; leap years (355 days) are 2, 5, 7, 10, 13, 16, 18, 21, 24, 26 and 29 of each 30"""
+    starts = []
+    for year in range(1, ARITHMETIC_YEARS + 1):
+        year_start = ARITHMETIC_EPOCH + 354 * (year - 1) + (3 + 11 * year) // 30
+        for month in range(12):
+            starts.append(year_start + (59 * month + 1) // 2)  # months alternate 30 and 29 days
+    starts.append(ARITHMETIC_EPOCH + 354 * ARITHMETIC_YEARS + (3 + 11 * (ARITHMETIC_YEARS + 1)) // 30)
+    return HijriCalendar("arithmetic", 1, starts)
+
+def _umm_al_qura_calendar() -> Optional[HijriCalendar]:
+    if not UMM_AL_QURA_AVAILABLE:
+        return None
+    first_year = _ummalqura.HIJRI_RANGE[0][0]
+    return HijriCalendar("ummalqura", first_year, [rjd + _RJD_TO_ORDINAL for rjd in _ummalqura.MONTH_STARTS])
+
+ARITHMETIC = _arithmetic_calendar()
+UMM_AL_QURA = _umm_al_qura_calendar()
+
+def get_calendar(name: str = HIJRI_CALENDAR) -> HijriCalendar:
+    """Calendar by name; Umm al-Qura falls back to arithmetic when hijridate is missing"""
+    if name == "ummalqura" and UMM_AL_QURA is not None:
+        return UMM_AL_QURA
+    return ARITHMETIC
+
+def calendar_for(day: date, calendar: str = HIJRI_CALENDAR) -> HijriCalendar:
+    """The calendar to_hijri uses for a Gregorian date: the table, or arithmetic outside its range"""
+    table = get_calendar(calendar)
+    return table if table.covers(day) else ARITHMETIC
+
+def to_hijri(day: date, calendar: str = HIJRI_CALENDAR) -> HijriDate:
+    """Hijri date for a Gregorian date, using arithmetic outside the table's range"""
+    return calendar_for(day, calendar).from_gregorian(day)
+
+def to_gregorian(year: int, month: int, day: int, calendar: str = HIJRI_CALENDAR) -> date:
+    """Gregorian date for a Hijri date, using arithmetic outside the table's range"""
+    table = get_calendar(calendar)
+    return (table if table.covers_hijri(year, month) else ARITHMETIC).to_gregorian(year, month, day)
+
+def hijri_range(start: date, end: date, calendar: str = HIJRI_CALENDAR) -> List[Tuple[date, HijriDate]]:
+    """(Gregorian, Hijri) for every day in [start, end)"""
+    table = get_calendar(calendar)
+    if not (table.covers(start) and table.covers(end - timedelta(days=1))):
+        table = ARITHMETIC
+    return list(table.range(start, end))
+
+def month_days(year: int, month: int, calendar: str = HIJRI_CALENDAR) -> List[Tuple[int, date]]:
+    """(Hijri day, Gregorian date) for every day of a Hijri month"""
+    table = get_calendar(calendar)
+    return (table if table.covers_hijri(year, month) else ARITHMETIC).month_days(year, month)
+
+def covers_hijri(year: int, month: int, calendar: str = HIJRI_CALENDAR) -> bool:
+    """Whether a Hijri month can be converted, by the table or the arithmetic fallback"""
+    return get_calendar(calendar).covers_hijri(year, month) or ARITHMETIC.covers_hijri(year, month)
+
+def format_hijri(hijri: HijriDate) -> str:
+    year, month, day = hijri
+    return f"{day} {MONTHS[month - 1]} {year} AH"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m offline.hijri', description="Hijri date conversion")
+    parser.add_argument('date', nargs='?', help="YYYY-MM-DD, default today")
+    parser.add_argument('--to-gregorian', action='store_true', help="date is a Hijri date")
+    parser.add_argument('--calendar', choices=['ummalqura', 'arithmetic'], default=HIJRI_CALENDAR)
+    args = parser.parse_args(argv)
+    
+    try:
+        if args.to_gregorian:
+            year, month, day = (int(part) for part in args.date.split('-'))
+            print(to_gregorian(year, month, day, args.calendar).strftime('%d %B %Y'))
+        else:
+            day = date.fromisoformat(args.date) if args.date else date.today()
+            print(format_hijri(to_hijri(day, args.calendar)))
+    except ValueError as e:
+        sys.exit(str(e))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Astronomical prayer-time calculator with a bundled city table
+
+Times follow the usual hour-angle formulas (as popularised by
+PrayTimes.org): the sun's declination and the equation of time give solar
+noon, and each prayer is the moment the sun reaches its method's angle
+below the horizon. Sun positions are computed once per day boundary and
+interpolated for each prayer, so a month costs about 31 sun positions.
+
+Coordinates and IANA time zones for cities in config.COUNTRIES live in
+offline/data/cities.tsv.
+
+    python -m offline.prayer_times Pakistan Lahore --method Karachi --asr Hanafi --month
+"""
+import os
+import sys
+import math
+import time
+import logging
+import argparse
+import calendar
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+CITY_TABLE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'cities.tsv')
+
+# Fajr/Isha twilight angles in degrees below the horizon; Umm al-Qura sets
+# Isha a fixed time after Maghrib instead
+METHODS = {
+    "MWL": {"name": "Muslim World League", "fajr": 18.0, "isha": 17.0},
+    "ISNA": {"name": "Islamic Society of North America", "fajr": 15.0, "isha": 15.0},
+    "Makkah": {"name": "Umm al-Qura, Makkah", "fajr": 18.5, "isha_minutes": 90},
+    "Karachi": {"name": "University of Islamic Sciences, Karachi", "fajr": 18.0, "isha": 18.0},
+    "Egypt": {"name": "Egyptian General Authority of Survey", "fajr": 19.5, "isha": 17.5}
+}
+
+# Shadow length factor at Asr: Shafi'i, Maliki and Hanbali vs. Hanafi
+ASR_METHODS = {
+    "Standard": 1,
+    "Hanafi": 2
+}
+
+# Methods and Asr settings customary in each country; others get MWL/Standard
+COUNTRY_DEFAULTS = {
+    "USA": ("ISNA", "Standard"),
+    "Canada": ("ISNA", "Standard"),
+    "Saudi Arabia": ("Makkah", "Standard"),
+    "Yemen": ("Makkah", "Standard"),
+    "Bahrain": ("Makkah", "Standard"),
+    "Kuwait": ("Makkah", "Standard"),
+    "Qatar": ("Makkah", "Standard"),
+    "Oman": ("Makkah", "Standard"),
+    "United Arab Emirates": ("Makkah", "Standard"),
+    "Pakistan": ("Karachi", "Hanafi"),
+    "India": ("Karachi", "Hanafi"),
+    "Bangladesh": ("Karachi", "Hanafi"),
+    "Afghanistan": ("Karachi", "Hanafi"),
+    "Egypt": ("Egypt", "Standard"),
+    "Sudan": ("Egypt", "Standard"),
+    "Libya": ("Egypt", "Standard"),
+    "Syria": ("Egypt", "Standard"),
+    "Lebanon": ("Egypt", "Standard"),
+    "Iraq": ("Egypt", "Standard"),
+    "Malaysia": ("Egypt", "Standard"),
+    "Turkey": ("MWL", "Hanafi")
+}
+
+# Short names used by config.POPULAR_COUNTRIES
+COUNTRY_ALIASES = {
+    "UK": "United Kingdom",
+    "UAE": "United Arab Emirates"
+}
+
+PRAYERS = ["Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha"]
+
+class City(NamedTuple):
+    country: str
+    name: str
+    latitude: float
+    longitude: float
+    timezone: str
+
+# ========== CITY TABLE ==========
+
+@lru_cache(maxsize=None)
+def load_cities(path: str = CITY_TABLE_PATH) -> Dict[str, List[City]]:
+    """Cities per country from the bundled table"""
+    cities: Dict[str, List[City]] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            country, name, latitude, longitude, timezone = line.rstrip('\n').split('\t')
+            cities.setdefault(country, []).append(City(country, name, float(latitude), float(longitude), timezone))
+    return cities
+
+def country_name(country: str) -> str:
+    return COUNTRY_ALIASES.get(country, country)
+
+def cities_for(country: str) -> List[City]:
+    return load_cities().get(country_name(country), [])
+
+def find_city(country: str, name: str) -> Optional[City]:
+    for city in cities_for(country):
+        if city.name == name:
+            return city
+    return None
+
+def default_settings(country: str) -> Tuple[str, str]:
+    """(method, asr) customary in a country"""
+    return COUNTRY_DEFAULTS.get(country_name(country), ("MWL", "Standard"))
+
+# ========== ASTRONOMY ==========
+
+def _julian_day(day: date) -> float:
+    """Julian day at 0h UTC"""
+    return day.toordinal() + 1721424.5
+
+def _sun_position(jd: float) -> Tuple[float, float]:
+    """Declination (radians) and equation of time (hours) for a Julian day"""
+    d = jd - 2451545.0
+    g = math.radians((357.529 + 0.98560028 * d) % 360)
+    q = (280.459 + 0.98564736 * d) % 360
+    ecliptic_longitude = math.radians(q + 1.915 * math.sin(g) + 0.020 * math.sin(2 * g))
+    obliquity = math.radians(23.439 - 0.00000036 * d)
+    
+    declination = math.asin(math.sin(obliquity) * math.sin(ecliptic_longitude))
+    right_ascension = math.degrees(math.atan2(math.cos(obliquity) * math.sin(ecliptic_longitude),
+                                              math.cos(ecliptic_longitude))) / 15
+    equation = (q / 15 - right_ascension % 24 + 12) % 24 - 12
+    return declination, equation
+
+class _Day:
+    """Sun positions across one day, interpolated for the solar hour of each prayer"""
+    
+    __slots__ = ('declination', 'declination_rate', 'equation', 'equation_rate')
+    
+    def __init__(self, start: Tuple[float, float], end: Tuple[float, float]):
+        self.declination, self.equation = start
+        self.declination_rate = (end[0] - start[0]) / 24
+        self.equation_rate = (end[1] - start[1]) / 24
+    
+    def at(self, hour: float) -> Tuple[float, float]:
+        return self.declination + self.declination_rate * hour, self.equation + self.equation_rate * hour
+
+class _Observer:
+    """Latitude terms shared by every day computed for one city"""
+    
+    __slots__ = ('latitude', 'sin_latitude', 'cos_latitude')
+    
+    def __init__(self, latitude: float):
+        self.latitude = math.radians(latitude)
+        self.sin_latitude = math.sin(self.latitude)
+        self.cos_latitude = math.cos(self.latitude)
+    
+    def hour_angle(self, altitude: float, declination: float) -> float:
+        """Hours between solar noon and the sun reaching altitude (radians), or NaN if it never does"""
+        cos_angle = (math.sin(altitude) - math.sin(declination) * self.sin_latitude) / \
+            (math.cos(declination) * self.cos_latitude)
+        if not -1 <= cos_angle <= 1:
+            return math.nan
+        return math.degrees(math.acos(cos_angle)) / 15
+    
+    def before_noon(self, sun: _Day, altitude: float, hour: float) -> float:
+        declination, equation = sun.at(hour)
+        return 12 - equation - self.hour_angle(altitude, declination)
+    
+    def after_noon(self, sun: _Day, altitude: float, hour: float) -> float:
+        declination, equation = sun.at(hour)
+        return 12 - equation + self.hour_angle(altitude, declination)
+
+_HORIZON = math.radians(-0.833)
+
+def _solar_times(sun: _Day, observer: _Observer, method: Dict, asr_factor: int) -> Dict[str, float]:
+    """Prayer times in local solar hours"""
+    asr_declination = sun.at(13)[0]
+    asr_altitude = math.atan(1 / (asr_factor + math.tan(abs(observer.latitude - asr_declination))))
+    times = {
+        "Fajr": observer.before_noon(sun, method["fajr_altitude"], 5),
+        "Sunrise": observer.before_noon(sun, _HORIZON, 6),
+        "Dhuhr": 12 - sun.at(12)[1],
+        "Asr": observer.after_noon(sun, asr_altitude, 13),
+        "Maghrib": observer.after_noon(sun, _HORIZON, 18)
+    }
+    if "isha_minutes" in method:
+        times["Isha"] = times["Maghrib"] + method["isha_minutes"] / 60
+    else:
+        times["Isha"] = observer.after_noon(sun, method["isha_altitude"], 18)
+    
+    # Where twilight never ends (high latitudes in summer) Fajr and Isha are
+    # limited to an angle-proportional share of the night
+    night = 24 - (times["Maghrib"] - times["Sunrise"])
+    if not math.isnan(night):
+        fajr_limit = method["fajr"] / 60 * night
+        if math.isnan(times["Fajr"]) or times["Sunrise"] - times["Fajr"] > fajr_limit:
+            times["Fajr"] = times["Sunrise"] - fajr_limit
+        if "isha" in method:
+            isha_limit = method["isha"] / 60 * night
+            if math.isnan(times["Isha"]) or times["Isha"] - times["Maghrib"] > isha_limit:
+                times["Isha"] = times["Maghrib"] + isha_limit
+    return times
+
+def _utc_offset(zone: ZoneInfo, day: date) -> float:
+    """Hours ahead of UTC at local noon"""
+    return zone.utcoffset(datetime(day.year, day.month, day.day, 12)).total_seconds() / 3600
+
+def _times_between(city: City, first: date, days: int, method: str, asr: str) -> List[Tuple[date, Dict[str, float]]]:
+    params = dict(METHODS[method], fajr_altitude=math.radians(-METHODS[method]["fajr"]))
+    if "isha" in params:
+        params["isha_altitude"] = math.radians(-params["isha"])
+    asr_factor = ASR_METHODS[asr]
+    observer = _Observer(city.latitude)
+    zone = ZoneInfo(city.timezone)
+    
+    # Julian days at local solar midnight, so interpolation hours are solar hours
+    shift = city.longitude / 360
+    jd = _julian_day(first) - shift
+    start = _sun_position(jd)
+    
+    results = []
+    for n in range(days):
+        day = first + timedelta(days=n)
+        end = _sun_position(jd + n + 1)
+        solar = _solar_times(_Day(start, end), observer, params, asr_factor)
+        start = end
+        
+        adjust = _utc_offset(zone, day) - city.longitude / 15
+        results.append((day, {prayer: hour + adjust for prayer, hour in solar.items()}))
+    return results
+
+# ========== PUBLIC API ==========
+
+def day_times(city: City, day: date, method: str = "MWL", asr: str = "Standard") -> Dict[str, float]:
+    """Local prayer times for one day, as hours after midnight (NaN if undefined)"""
+    return _times_between(city, day, 1, method, asr)[0][1]
+
+def month_times(city: City, year: int, month: int, method: str = "MWL",
+                asr: str = "Standard") -> List[Tuple[date, Dict[str, float]]]:
+    """Local prayer times for every day of a month"""
+    return _times_between(city, date(year, month, 1), calendar.monthrange(year, month)[1], method, asr)
+
+def today(city: City) -> date:
+    return datetime.now(ZoneInfo(city.timezone)).date()
+
+def format_time(hours: float) -> str:
+    """HH:MM, rounded to the nearest minute"""
+    if math.isnan(hours):
+        return "--:--"
+    minutes = int(hours * 60 + 0.5) % (24 * 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m offline.prayer_times', description="Prayer times")
+    parser.add_argument('country')
+    parser.add_argument('city')
+    parser.add_argument('--date', help="YYYY-MM-DD, default today in the city")
+    parser.add_argument('--method', choices=list(METHODS))
+    parser.add_argument('--asr', choices=list(ASR_METHODS))
+    parser.add_argument('--month', action='store_true', help="print the whole month")
+    args = parser.parse_args(argv)
+    
+    city = find_city(args.country, args.city)
+    if city is None:
+        sys.exit(f"Unknown city {args.city!r} in {args.country!r}")
+    method, asr = default_settings(city.country)
+    method = args.method or method
+    asr = args.asr or asr
+    day = date.fromisoformat(args.date) if args.date else today(city)
+    
+    start = time.perf_counter()
+    rows = month_times(city, day.year, day.month, method, asr) if args.month else [(day, day_times(city, day, method, asr))]
+    elapsed = (time.perf_counter() - start) * 1e6
+    
+    print(f"{city.name}, {city.country} - {METHODS[method]['name']}, Asr {asr}")
+    print(f"{'Date':<12}" + ''.join(f"{prayer:>9}" for prayer in PRAYERS))
+    for row_day, times in rows:
+        print(f"{row_day.isoformat():<12}" + ''.join(f"{format_time(times[prayer]):>9}" for prayer in PRAYERS))
+    print(f"({len(rows)} days in {elapsed:.0f} µs)")
+
+if __name__ == '__main__':
+    main()
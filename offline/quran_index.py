@@ -0,0 +1,132 @@
+"""
+Offline Quran search over prebuilt per-translation indexes
+
+Each translation in config.TRANSLATIONS can have a data/quran/<id>.idx
+index built from a local text file in Tanzil's "sura|aya|text" format:
+
+    python -m offline.quran_index build quran-yusufali.txt --translator 2
+
+When an index exists, SearchTruthAPI.search_quran answers from it without
+touching the network; otherwise it falls back to scraping SearchTruth.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from typing import Iterator, List, Optional, Tuple
+
+from config import QURAN_INDEX_DIR, QURAN_VERSE_COUNT, TRANSLATIONS
+from offline.text_index import IndexDirectory, IndexWriter, TextIndex
+
+logger = logging.getLogger(__name__)
+
+def verse_ref(sura: int, aya: int) -> int:
+    """Pack a verse reference so refs sort in Quran order"""
+    return (sura << 16) | aya
+
+def read_tanzil(path: str) -> Iterator[Tuple[int, int, str]]:
+    """Yield (sura, aya, text) from a Tanzil-style text file"""
+    with open(path, encoding='utf-8-sig') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                sura, aya, text = line.split('|', 2)
+                yield int(sura), int(aya), text.strip()
+            except ValueError:
+                raise ValueError(f"{path}:{line_no}: expected 'sura|aya|text'")
+
+class QuranIndex:
+    """Keyword search over one translation"""
+    
+    def __init__(self, index: TextIndex):
+        self.index = index
+    
+    def search(self, keyword: str, chapter: str = "", max_results: int = 5) -> List[str]:
+        """Verses matching the keyword query (see offline.text_index), in Quran order"""
+        if chapter and chapter.isdigit():
+            verses = self.index.range(verse_ref(int(chapter), 0), verse_ref(int(chapter) + 1, 0))
+            doc_ids = self.index.search(keyword, verses.start, verses.stop, limit=max_results)
+        else:
+            doc_ids = self.index.search(keyword, limit=max_results)
+        
+        results = []
+        for doc_id in doc_ids:
+            ref = self.index.ref(doc_id)
+            results.append(f"[{ref >> 16}:{ref & 0xFFFF}] {self.index.text(doc_id)}"[:500])
+        return results
+
+class QuranLibrary(IndexDirectory):
+    """Lazily opened indexes for every configured translation"""
+    
+    def __init__(self, directory: str = QURAN_INDEX_DIR):
+        super().__init__(directory)
+    
+    def get(self, translator: str) -> Optional[QuranIndex]:
+        """Index for a translator ID, or None if it has not been built"""
+        index = super().get(translator)
+        return QuranIndex(index) if index else None
+    
+    def search(self, keyword: str, chapter: str, translator: str, max_results: int) -> Optional[List[str]]:
+        """Local results, or None when no index exists for the translation"""
+        index = self.get(translator)
+        if index is None:
+            return None
+        return index.search(keyword, chapter, max_results)
+
+def build(source: str, translator: str, directory: str = QURAN_INDEX_DIR) -> str:
+    """Build the index for one translation and return its path"""
+    verses = sorted(read_tanzil(source))
+    writer = IndexWriter()
+    for sura, aya, text in verses:
+        writer.add(verse_ref(sura, aya), text)
+    
+    if len(writer) != QURAN_VERSE_COUNT:
+        logger.warning(f"{source} has {len(writer)} verses, expected {QURAN_VERSE_COUNT}")
+    
+    path = QuranLibrary(directory).path(translator)
+    writer.write(path)
+    return path
+
+# Shared by search_apis.search_api
+quran_library = QuranLibrary()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m offline.quran_index', description="Offline Quran indexes")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    build_parser = commands.add_parser('build', help="build an index from a Tanzil 'sura|aya|text' file")
+    build_parser.add_argument('source')
+    build_parser.add_argument('--translator', required=True, choices=sorted(TRANSLATIONS, key=int))
+    build_parser.add_argument('--out', default=QURAN_INDEX_DIR)
+    
+    search_parser = commands.add_parser('search', help="query a built index")
+    search_parser.add_argument('keyword')
+    search_parser.add_argument('--translator', default='2')
+    search_parser.add_argument('--chapter', default='')
+    search_parser.add_argument('--max-results', type=int, default=5)
+    search_parser.add_argument('--dir', default=QURAN_INDEX_DIR)
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    
+    if args.command == 'build':
+        start = time.perf_counter()
+        path = build(args.source, args.translator, args.out)
+        print(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KB) in {time.perf_counter() - start:.2f}s")
+        return
+    
+    library = QuranLibrary(args.dir)
+    start = time.perf_counter()
+    results = library.search(args.keyword, args.chapter, args.translator, args.max_results)
+    elapsed = (time.perf_counter() - start) * 1e6
+    if results is None:
+        sys.exit(f"No index for translator {args.translator} in {args.dir}")
+    for result in results:
+        print(result)
+    print(f"({len(results)} results in {elapsed:.0f} µs)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+"""
+Compact on-disk inverted index shared by the offline search engines
+
+Index file layout (little-endian, every section 4-byte aligned):
+
+    header       magic, version, doc_count, term_count, section offsets
+    refs         u32[doc_count]        caller-defined document reference
+    text_offs    u32[doc_count + 1]    offsets into text_blob
+    text_blob    UTF-8 document texts
+    term_offs    u32[term_count + 1]   offsets into term_blob
+    term_blob    UTF-8 terms, sorted by their encoded bytes
+    post_offs    u32[term_count + 1]   offsets into postings (in entries)
+    postings     u32[]                 ascending document ids per term
+    pos_offs     u32[postings + 1]     offsets into positions (in entries)
+    positions    u32[]                 ascending word positions per posting
+
+Besides single words, every pair of adjacent words is indexed as a term
+(see pair_term) so phrase queries do not have to scan position lists.
+
+Files are memory-mapped and searched in place, so opening an index costs
+nothing and a term lookup is a binary search over the term table.
+
+Query syntax understood by TextIndex.search:
+
+    patience prayer          both words (each also matches as a word prefix)
+    "night prayer"           the exact phrase
+    fasting OR charity       either side; OR (or |) binds loosest
+"""
+import os
+import re
+import sys
+import mmap
+import time
+import array
+import heapq
+import struct
+import logging
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# A run of ascending document ids: (sequence, start, end)
+Slice = Tuple[Sequence[int], int, int]
+
+from config import OFFLINE_DATA_RECHECK_INTERVAL
+
+MAGIC = b'STIX'
+VERSION = 2
+_HEADER = struct.Struct('<4sIII9I')
+
+# Above this many expanded terms, a prefix's documents are merged into one sorted array
+UNION_MIN_TERMS = 16
+# Prefix expansions kept per index, so a repeated prefix costs one dict lookup
+EXPANSION_CACHE_ENTRIES = 128
+
+logger = logging.getLogger(__name__)
+
+# Arabic diacritics and tatweel are dropped so vowelled and plain text match
+_ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_TOKEN = re.compile(r'\w+')
+_QUERY_TOKEN = re.compile(r'"([^"]*)"?|(\S+)')
+_OR = {'OR', '|'}
+
+def normalize(text: str) -> str:
+    """Case-fold and strip marks that should not affect matching"""
+    text = unicodedata.normalize('NFKC', text)
+    return _ARABIC_MARKS.sub('', text).casefold()
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(normalize(text))
+
+def pair_term(first: str, second: str) -> str:
+    """Term under which two adjacent words are indexed, at the first word's position
+    
+    The leading control character keeps pairs out of word prefix matches.
+    """
+    return f"\x01{first} {second}"
+
+def parse_query(query: str) -> List[List[Tuple[List[str], bool]]]:
+    """Split a query into OR groups of AND clauses
+    
+    Each clause is (words, exact). Quoted text and hyphenated words become
+    exact phrases; a bare word is matched as a prefix.
+    """
+    groups = [[]]
+    for match in _QUERY_TOKEN.finditer(query):
+        phrase, word = match.groups()
+        if word in _OR:
+            groups.append([])
+            continue
+        words = tokenize(phrase if phrase is not None else word)
+        if words:
+            groups[-1].append((words, phrase is not None or len(words) > 1))
+    return [group for group in groups if group]
+
+def _u32_array(values: Iterable[int]) -> bytes:
+    data = array.array('I', values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+def _pad(data: bytes) -> bytes:
+    return data + b'\0' * (-len(data) % 4)
+
+class IndexWriter:
+    """Collects documents and writes an index file"""
+    
+    def __init__(self):
+        self._refs = []
+        self._texts = []
+        self._postings: Dict[str, List[int]] = {}
+        self._positions: Dict[str, List[List[int]]] = {}
+    
+    def add(self, ref: int, text: str) -> None:
+        """Add a document; documents are numbered in the order they are added"""
+        doc_id = len(self._refs)
+        self._refs.append(ref)
+        self._texts.append(text)
+        positions: Dict[str, List[int]] = {}
+        words = tokenize(text)
+        for position, term in enumerate(words):
+            positions.setdefault(term, []).append(position)
+        for position in range(len(words) - 1):
+            positions.setdefault(pair_term(words[position], words[position + 1]), []).append(position)
+        for term, term_positions in positions.items():
+            self._postings.setdefault(term, []).append(doc_id)
+            self._positions.setdefault(term, []).append(term_positions)
+    
+    def __len__(self) -> int:
+        return len(self._refs)
+    
+    def write(self, path: str) -> None:
+        texts = [t.encode('utf-8') for t in self._texts]
+        text_offs = [0]
+        for t in texts:
+            text_offs.append(text_offs[-1] + len(t))
+        
+        terms = sorted(self._postings, key=lambda t: t.encode('utf-8'))
+        encoded_terms = [t.encode('utf-8') for t in terms]
+        term_offs = [0]
+        for t in encoded_terms:
+            term_offs.append(term_offs[-1] + len(t))
+        post_offs = [0]
+        postings = []
+        pos_offs = [0]
+        positions = []
+        for term in terms:
+            postings.extend(self._postings[term])
+            post_offs.append(len(postings))
+            for term_positions in self._positions[term]:
+                positions.extend(term_positions)
+                pos_offs.append(len(positions))
+        
+        sections = [
+            _u32_array(self._refs),
+            _u32_array(text_offs),
+            _pad(b''.join(texts)),
+            _u32_array(term_offs),
+            _pad(b''.join(encoded_terms)),
+            _u32_array(post_offs),
+            _u32_array(postings),
+            _u32_array(pos_offs),
+            _u32_array(positions)
+        ]
+        offsets = []
+        position = _HEADER.size
+        for section in sections:
+            offsets.append(position)
+            position += len(section)
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(self._refs), len(terms), *offsets))
+            for section in sections:
+                f.write(section)
+        os.replace(tmp_path, path)
+
+class TextIndex:
+    """Read-only, memory-mapped view of an index file"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        magic, version, self.doc_count, self.term_count, *offsets = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} text index, rebuild it")
+        
+        refs, text_offs, text_blob, term_offs, term_blob, post_offs, postings, pos_offs, positions = offsets
+        self._refs = self._u32(refs, self.doc_count)
+        self._text_offs = self._u32(text_offs, self.doc_count + 1)
+        self._text_blob = text_blob
+        self._term_offs = self._u32(term_offs, self.term_count + 1)
+        self._term_blob = term_blob
+        self._post_offs = self._u32(post_offs, self.term_count + 1)
+        self._postings = self._u32(postings, self._post_offs[self.term_count])
+        self._pos_offs = self._u32(pos_offs, len(self._postings) + 1)
+        self._positions = self._u32(positions, self._pos_offs[len(self._postings)])
+        self._expansions: 'OrderedDict[bytes, List[Slice]]' = OrderedDict()
+    
+    def _u32(self, offset: int, count: int) -> Sequence[int]:
+        if sys.byteorder != 'little':
+            data = array.array('I', self._mmap[offset:offset + 4 * count])
+            data.byteswap()
+            return data
+        view = memoryview(self._mmap)[offset:offset + 4 * count]
+        self._views.append(view)
+        self._views.append(view.cast('I'))
+        return self._views[-1]
+    
+    def ref(self, doc_id: int) -> int:
+        return self._refs[doc_id]
+    
+    @property
+    def refs(self) -> Sequence[int]:
+        return self._refs
+    
+    def text(self, doc_id: int) -> str:
+        start = self._text_blob + self._text_offs[doc_id]
+        end = self._text_blob + self._text_offs[doc_id + 1]
+        return self._mmap[start:end].decode('utf-8')
+    
+    def _term(self, index: int) -> bytes:
+        return self._mmap[self._term_blob + self._term_offs[index]:self._term_blob + self._term_offs[index + 1]]
+    
+    def _find(self, term: bytes) -> int:
+        """Index of the first term >= term"""
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def _term_ranges(self, term: str, prefix: bool) -> List[Slice]:
+        """Posting slices of the term, or of every term starting with it, longest first
+        
+        Prefix expansions are cached; one that matched more than
+        UNION_MIN_TERMS terms is stored as a single merged slice, so it is
+        scanned and tested like one word.
+        """
+        encoded = normalize(term).encode('utf-8')
+        if prefix:
+            cached = self._expansions.get(encoded)
+            if cached is not None:
+                self._expansions.move_to_end(encoded)
+                return cached
+        
+        index = self._find(encoded)
+        ranges = []
+        for i in range(index, self.term_count if prefix else min(index + 1, self.term_count)):
+            found = self._term(i)
+            if not (found.startswith(encoded) if prefix else found == encoded):
+                break
+            ranges.append((self._postings, self._post_offs[i], self._post_offs[i + 1]))
+        if not prefix:
+            return ranges
+        
+        if len(ranges) > UNION_MIN_TERMS:
+            merged = array.array('I', sorted(set().union(*(postings[start:end] for postings, start, end in ranges))))
+            ranges = [(merged, 0, len(merged))]
+        # Common words first: a document is most likely found in their slices
+        ranges.sort(key=lambda bounds: bounds[1] - bounds[2])
+        self._expansions[encoded] = ranges
+        if len(self._expansions) > EXPANSION_CACHE_ENTRIES:
+            self._expansions.popitem(last=False)
+        return ranges
+    
+    def _posting(self, ranges: List[Slice], doc_id: int) -> int:
+        """Index of doc_id in the first slice holding it (its posting entry, for term slices), or -1"""
+        for postings, start, end in ranges:
+            i = bisect_left(postings, doc_id, start, end)
+            if i < end and postings[i] == doc_id:
+                return i
+        return -1
+    
+    def _docs(self, ranges: List[Slice], lo: int) -> Iterator[int]:
+        """Ascending, distinct document ids >= lo across posting slices"""
+        slices = [postings[bisect_left(postings, lo, start, end):end] for postings, start, end in ranges]
+        if len(slices) == 1:
+            yield from slices[0]
+            return
+        last = -1
+        for doc_id in heapq.merge(*slices):
+            if doc_id != last:
+                yield doc_id
+                last = doc_id
+    
+    def _contains(self, ranges: List[Slice]) -> Callable[[int], bool]:
+        """Membership test for documents in the slices"""
+        return lambda doc_id: self._posting(ranges, doc_id) >= 0
+    
+    def _word_positions(self, posting: int) -> Sequence[int]:
+        return self._positions[self._pos_offs[posting]:self._pos_offs[posting + 1]]
+    
+    def _has_phrase(self, pairs: List[List[Slice]], doc_id: int) -> bool:
+        """Whether the word pairs occur consecutively in the document"""
+        starts = None
+        for offset, ranges in enumerate(pairs):
+            posting = self._posting(ranges, doc_id)
+            if posting < 0:
+                return False
+            word_starts = {position - offset for position in self._word_positions(posting)}
+            starts = word_starts if starts is None else starts & word_starts
+            if not starts:
+                return False
+        return True
+    
+    def _group(self, clauses: List[Tuple[List[str], bool]], lo: int, hi: Optional[int],
+               prefix: bool) -> Iterator[int]:
+        """Ascending ids of documents matching every clause of an AND group"""
+        words = []
+        phrases = []
+        for clause, exact in clauses:
+            if len(clause) == 1:
+                words.append(self._term_ranges(clause[0], prefix and not exact))
+                continue
+            # A phrase is a chain of indexed word pairs, so a two-word
+            # phrase is a single posting lookup
+            pairs = [self._term_ranges(pair_term(a, b), prefix=False) for a, b in zip(clause, clause[1:])]
+            if len(pairs) == 1:
+                words.append(pairs[0])
+            else:
+                phrases.append(pairs)
+        every_range = words + [ranges for phrase in phrases for ranges in phrase]
+        if not all(every_range):
+            return
+        
+        # The rarest word drives the scan; the others are checked by binary search
+        every_range.sort(key=lambda ranges: sum(end - start for _, start, end in ranges))
+        driver, others = every_range[0], [self._contains(ranges) for ranges in every_range[1:]]
+        for doc_id in self._docs(driver, lo):
+            if hi is not None and doc_id >= hi:
+                return
+            if all(contains(doc_id) for contains in others) and \
+                    all(self._has_phrase(phrase, doc_id) for phrase in phrases):
+                yield doc_id
+    
+    def matches(self, query: str, lo: int = 0, hi: Optional[int] = None, prefix: bool = True) -> Iterator[int]:
+        """Lazily yield ascending ids in [lo, hi) of documents matching the query
+        
+        With prefix=True a single word also matches longer words starting
+        with it; words inside a quoted phrase always match exactly.
+        """
+        groups = [self._group(clauses, lo, hi, prefix) for clauses in parse_query(query)]
+        if len(groups) == 1:
+            yield from groups[0]
+            return
+        last = -1
+        for doc_id in heapq.merge(*groups):
+            if doc_id != last:
+                yield doc_id
+                last = doc_id
+    
+    def search(self, query: str, lo: int = 0, hi: Optional[int] = None, limit: Optional[int] = None,
+               offset: int = 0, prefix: bool = True) -> List[int]:
+        """One page of matches; the cost grows with offset + limit, not with the posting lists"""
+        stop = offset + limit if limit is not None else None
+        return list(islice(self.matches(query, lo, hi, prefix), offset, stop))
+    
+    def range(self, lo_ref: int, hi_ref: int) -> range:
+        """Ids of documents whose ref lies in [lo_ref, hi_ref); refs must be ascending"""
+        return range(bisect_left(self._refs, lo_ref), bisect_left(self._refs, hi_ref))
+    
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+def open_index(path: str) -> Optional[TextIndex]:
+    """Open an index file, or None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    return TextIndex(path)
+
+class IndexDirectory:
+    """Lazily opened indexes stored as <directory>/<name>.idx
+    
+    A missing index is looked for again at most every recheck_interval
+    seconds, so one built while the bot runs is picked up.
+    """
+    
+    def __init__(self, directory: str, recheck_interval: float = OFFLINE_DATA_RECHECK_INTERVAL):
+        self.directory = directory
+        self.recheck_interval = recheck_interval
+        self._indexes: Dict[str, TextIndex] = {}
+        self._missing: Dict[str, float] = {}  # name -> when it was last found missing
+    
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.idx")
+    
+    def get(self, name: str) -> Optional[TextIndex]:
+        """Index for a name, or None if it has not been built"""
+        index = self._indexes.get(name)
+        if index is None and time.monotonic() - self._missing.get(name, float('-inf')) >= self.recheck_interval:
+            try:
+                index = open_index(self.path(name))
+            except (OSError, ValueError) as e:
+                logger.error(f"Cannot open index {self.path(name)}: {e}")
+            if index is None:
+                self._missing[name] = time.monotonic()
+            else:
+                self._indexes[name] = index
+        return index
@@ -0,0 +1,365 @@
+"""
+HTML parsers for SearchTruth.com result pages
+
+Pages are parsed with lxml and queried with XPath, so only the matched
+result containers are turned into Python strings. Text extraction mirrors
+BeautifulSoup's get_text() so results are unchanged from the html.parser
+implementation.
+"""
+import re
+import html
+import lxml.html
+from lxml import etree
+from bs4.dammit import UnicodeDammit
+from typing import Dict, List, Optional, Tuple
+
+# Tags whose own strings BeautifulSoup leaves out of get_text()
+_SKIPPED_STRING_TAGS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+_PRESERVE_WHITESPACE_TAGS = frozenset(('pre', 'textarea'))
+_ASCII_SPACES = {ord(c): None for c in ' \n\t\x0c\r'}
+
+_CLASS_SEPARATORS = re.compile('[ \t\n\r\x0c]+')
+
+class Strategy:
+    """One way of recognising result containers on a page
+    
+    A container is described by a tag name (or '*') and a single attribute
+    test: 'contains', 'equals', 'exists' or 'class'. The remaining options
+    say how a matching element's text is accepted and trimmed.
+    """
+    
+    def __init__(self, name: str, tag: str, attr: str, test: str, value: Optional[str] = None,
+                 min_length: int = 20, max_length: int = 500, separator: str = ' ',
+                 require_keyword: bool = True, clean: bool = True, limit_candidates: bool = True):
+        self.name = name
+        self.tag = tag
+        self.attr = attr
+        self.test = test
+        self.value = value
+        self.min_length = min_length
+        self.max_length = max_length
+        self.separator = separator
+        self.require_keyword = require_keyword
+        self.clean = clean
+        # Only the first max_results candidates are considered, like elements[:max_results]
+        self.limit_candidates = limit_candidates
+    
+    def matches(self, element: etree._Element) -> bool:
+        """Attribute test; the tag is matched by the extractor's dispatch table"""
+        attr = element.get(self.attr)
+        if attr is None:
+            return False
+        if self.test == 'contains':
+            return self.value in attr
+        if self.test == 'equals':
+            return attr == self.value
+        if self.test == 'class':
+            return self.value in _CLASS_SEPARATORS.split(attr)
+        return True
+    
+    def extract(self, element: etree._Element, keyword_lower: str) -> Optional[str]:
+        """Return the element's result text, or None if it is not acceptable"""
+        text = element_text(element, separator=self.separator, strip=True)
+        if not text or len(text) <= self.min_length:
+            return None
+        if self.require_keyword and keyword_lower not in text.lower():
+            return None
+        if self.clean:
+            text = clean_text(text)
+        return text[:self.max_length]
+
+class ResultExtractor:
+    """Single-pass, streaming result extractor over prioritised strategies
+    
+    The page is fed to an lxml pull parser in chunks. Every element is
+    classified against all strategies when it starts, using a per-tag
+    dispatch table built up front, and its text is taken when it ends.
+    Parsing stops as soon as the highest-priority strategy with results is
+    settled, so on a typical result page the rest of the document is never
+    parsed. The outcome is the same as trying the strategies one after
+    another over the whole page. Which strategy produced the results is
+    counted in `wins` and exported as a metric; the list order stays the
+    priority, since every strategy is checked in the same single pass.
+    """
+    
+    CHUNK_SIZE = 4096
+    
+    def __init__(self, strategies: List[Strategy]):
+        self.strategies = strategies
+        any_tag = [i for i, s in enumerate(strategies) if s.tag == '*']
+        self._default = tuple((i, strategies[i]) for i in any_tag)
+        self._by_tag = {}
+        for tag in {s.tag for s in strategies if s.tag != '*'}:
+            indexes = sorted(any_tag + [i for i, s in enumerate(strategies) if s.tag == tag])
+            self._by_tag[tag] = tuple((i, strategies[i]) for i in indexes)
+        # Without tag-agnostic strategies lxml can drop other events in C
+        self._event_tags = None if any_tag else list(self._by_tag)
+        self.wins = {s.name: 0 for s in strategies}
+        self.misses = 0
+    
+    def extract(self, markup: str, keyword: str, max_results: int) -> Tuple[List[str], Optional[etree._Element]]:
+        """Return (results, None), or ([], document root) when no strategy matched
+        
+        The root is only built when needed, for full-text fallbacks.
+        """
+        state = _ExtractionState(self.strategies, keyword, max_results)
+        parser = etree.HTMLPullParser(events=('start', 'end'), tag=self._event_tags)
+        
+        for offset in range(0, len(markup), self.CHUNK_SIZE):
+            parser.feed(markup[offset:offset + self.CHUNK_SIZE])
+            if self._process(parser.read_events(), state):
+                return self._win(state)
+        
+        try:
+            root = parser.close()
+        except etree.LxmlError:
+            root = None
+        self._process(parser.read_events(), state)
+        
+        # End of document: every strategy is settled
+        state.settled = [True] * len(self.strategies)
+        if state.winner() is not None:
+            return self._win(state)
+        self.misses += 1
+        return [], root
+    
+    def _process(self, events, state: '_ExtractionState') -> bool:
+        """Classify parser events; True once the winning strategy is known"""
+        by_tag = self._by_tag
+        default = self._default
+        pending = state.pending
+        
+        for event, element in events:
+            if event == 'start':
+                for i, strategy in by_tag.get(element.tag, default):
+                    if not state.settled[i] and strategy.matches(element):
+                        state.add_candidate(i, element)
+            elif element in pending:
+                for i, slot in pending.pop(element):
+                    state.resolve(i, slot, element)
+                if state.winner() is not None:
+                    return True
+        return False
+    
+    def _win(self, state: '_ExtractionState') -> Tuple[List[str], None]:
+        index = state.winner()
+        self.wins[self.strategies[index].name] += 1
+        return state.results(index), None
+    
+    def stats(self) -> Dict:
+        """How often each strategy supplied the results, and how often none did"""
+        return dict(self.wins, none=self.misses)
+
+class _ExtractionState:
+    """Candidates and results of each strategy during one extraction
+    
+    Candidates are kept in document (start) order. A slot holds None until
+    the element ends, then its text or False if it was rejected.
+    """
+    
+    def __init__(self, strategies: List[Strategy], keyword: str, max_results: int):
+        count = len(strategies)
+        self.strategies = strategies
+        self.keyword_lower = keyword.lower()
+        self.max_results = max_results
+        self.slots = [[] for _ in range(count)]
+        self.resolved = [0] * count  # Length of the fully resolved slot prefix
+        self.accepted = [0] * count  # Accepted results within that prefix
+        self.settled = [max_results <= 0] * count
+        self.pending = {}  # element -> [(strategy index, slot)]
+    
+    def add_candidate(self, index: int, element: etree._Element) -> None:
+        slots = self.slots[index]
+        if self.strategies[index].limit_candidates and len(slots) >= self.max_results:
+            return
+        self.pending.setdefault(element, []).append((index, len(slots)))
+        slots.append(None)
+    
+    def resolve(self, index: int, slot: int, element: etree._Element) -> None:
+        strategy = self.strategies[index]
+        text = strategy.extract(element, self.keyword_lower)
+        slots = self.slots[index]
+        slots[slot] = False if text is None else text
+        
+        while self.resolved[index] < len(slots) and slots[self.resolved[index]] is not None:
+            if slots[self.resolved[index]]:
+                self.accepted[index] += 1
+            self.resolved[index] += 1
+        
+        if self.accepted[index] >= self.max_results or (
+                strategy.limit_candidates and self.resolved[index] >= self.max_results):
+            self.settled[index] = True
+    
+    def winner(self) -> Optional[int]:
+        """First strategy with results, once every strategy before it came up empty"""
+        for i, done in enumerate(self.settled):
+            if not done:
+                return None
+            if any(self.slots[i]):
+                return i
+        return None
+    
+    def results(self, index: int) -> List[str]:
+        return [text for text in self.slots[index] if text][:self.max_results]
+
+QURAN_EXTRACTOR = ResultExtractor([
+    Strategy('margin_div', 'div', 'style', 'contains', 'margin', min_length=20, max_length=500),
+    Strategy('full_width_table', 'table', 'width', 'equals', '100%', min_length=20, max_length=500),
+    Strategy('search_result', '*', 'class', 'class', 'search_result', min_length=20, max_length=500),
+    Strategy('verse_div', '*', 'class', 'class', 'verse_div', min_length=20, max_length=500)
+])
+
+HADITH_EXTRACTOR = ResultExtractor([
+    Strategy('margin_div', 'div', 'style', 'contains', 'margin', min_length=30, max_length=600),
+    Strategy('borderless_table', 'table', 'border', 'equals', '0', min_length=30, max_length=600),
+    Strategy('hadith_result', '*', 'class', 'class', 'hadith_result', min_length=30, max_length=600),
+    Strategy('bgcolor_row', 'tr', 'bgcolor', 'exists', min_length=30, max_length=600)
+])
+
+DICTIONARY_EXTRACTOR = ResultExtractor([
+    Strategy('bgcolor_row', 'tr', 'bgcolor', 'exists', min_length=10, max_length=400,
+             separator=' | ', require_keyword=False),
+    Strategy('full_width_table', 'table', 'width', 'equals', '100%', min_length=20, max_length=400,
+             separator=' | ', clean=False, limit_candidates=False)
+])
+
+# By page, for the parser metrics and the shutdown log
+EXTRACTORS = {'quran': QURAN_EXTRACTOR, 'hadith': HADITH_EXTRACTOR, 'dictionary': DICTIONARY_EXTRACTOR}
+
+CITY_LINK_XPATH = '//a[contains(@href, "prayertimes") and contains(@href, "city=")]'
+
+def decode_document(content: bytes) -> Optional[str]:
+    """Decode a page the way BeautifulSoup does, or None if it is blank"""
+    markup = UnicodeDammit(content, is_html=True).unicode_markup
+    if not markup or not markup.strip():
+        return None
+    return markup
+
+def parse_document(content: bytes) -> Optional[etree._Element]:
+    """Decode a page and build the full lxml tree"""
+    markup = decode_document(content)
+    if markup is None:
+        return None
+    try:
+        return lxml.html.document_fromstring(markup)
+    except etree.ParserError:
+        return None
+
+def _strings(root: etree._Element):
+    """Yield the text nodes under root in document order, as get_text() sees them"""
+    stack = [(root, False)]
+    while stack:
+        node, after = stack.pop()
+        if after:
+            # Tail text belongs to the parent element
+            parent = node.getparent()
+            if node.tail and (parent is None or parent.tag not in _SKIPPED_STRING_TAGS):
+                yield node.tail, parent
+            continue
+        
+        if node is not root:
+            stack.append((node, True))
+        if not isinstance(node.tag, str):
+            # Comments and processing instructions
+            continue
+        if node.text and node.tag not in _SKIPPED_STRING_TAGS:
+            yield node.text, node
+        for child in reversed(node):
+            stack.append((child, False))
+
+def _in_preserved(element: Optional[etree._Element]) -> bool:
+    while element is not None:
+        if element.tag in _PRESERVE_WHITESPACE_TAGS:
+            return True
+        element = element.getparent()
+    return False
+
+def element_text(element: etree._Element, separator: str = '', strip: bool = False) -> str:
+    """Equivalent of BeautifulSoup's Tag.get_text(separator, strip)"""
+    parts = []
+    for text, container in _strings(element):
+        if strip:
+            text = text.strip()
+            if not text:
+                continue
+        elif not text.translate(_ASCII_SPACES) and not _in_preserved(container):
+            # BeautifulSoup collapses whitespace-only strings while parsing
+            text = '\n' if '\n' in text else ' '
+        parts.append(text)
+    return separator.join(parts)
+
+def clean_text(text: str) -> str:
+    """Clean and format text"""
+    text = re.sub(r'\s+', ' ', text)
+    text = html.unescape(text)
+    return text.strip()
+
+def parse_quran(content: bytes, keyword: str, max_results: int) -> List[str]:
+    """Extract Quran verses from a search.php page"""
+    markup = decode_document(content)
+    if markup is None:
+        return []
+    results, root = QURAN_EXTRACTOR.extract(markup, keyword, max_results)
+    
+    if not results and root is not None:
+        # Fallback: search in all text
+        all_text = element_text(root)
+        lines = [line.strip() for line in all_text.split('\n') if line.strip()]
+        
+        keyword_lower = keyword.lower()
+        for line in lines:
+            if keyword_lower in line.lower() and len(line) > 30:
+                clean_line = clean_text(line)
+                if clean_line not in results:
+                    results.append(clean_line[:500])
+                    if len(results) >= max_results:
+                        break
+    
+    return results
+
+def parse_hadith(content: bytes, keyword: str, max_results: int) -> List[str]:
+    """Extract hadith texts from a searchHadith.php page"""
+    markup = decode_document(content)
+    if markup is None:
+        return []
+    results, root = HADITH_EXTRACTOR.extract(markup, keyword, max_results)
+    
+    if not results and root is not None:
+        # Alternative extraction
+        all_text = element_text(root)
+        paragraphs = [p.strip() for p in all_text.split('\n\n') if p.strip()]
+        
+        keyword_lower = keyword.lower()
+        for para in paragraphs:
+            if keyword_lower in para.lower() and len(para) > 50:
+                clean_para = clean_text(para)
+                results.append(clean_para[:600])
+                if len(results) >= max_results:
+                    break
+    
+    return results
+
+def parse_dictionary(content: bytes, word: str, max_results: int) -> List[str]:
+    """Extract dictionary entries from a dictionary page
+    
+    Entry rows are preferred; whole tables mentioning the word are the fallback.
+    """
+    markup = decode_document(content)
+    if markup is None:
+        return []
+    results, _ = DICTIONARY_EXTRACTOR.extract(markup, word, max_results)
+    return results
+
+def parse_cities(content: bytes) -> List[str]:
+    """Extract unique city names, in page order, from a prayertimes/city.php page"""
+    root = parse_document(content)
+    if root is None:
+        return []
+    cities = {}
+    
+    for link in root.xpath(CITY_LINK_XPATH):
+        city_name = element_text(link, strip=True)
+        if city_name:
+            cities.setdefault(city_name, None)
+    
+    return list(cities)
@@ -0,0 +1,361 @@
+"""
+Persistent, shareable user and chat state
+
+StatePersistence plugs into the Application as its BasePersistence, so
+context.user_data (conversation state, chosen collection, ...) and
+context.chat_data survive restarts. It stores everything through a small
+key-value backend:
+
+    SQLiteStateBackend   one local file; for a single bot process
+    RedisStateBackend    any Redis-protocol server; lets several bot
+                         processes behind a webhook load balancer share
+                         state (needs the 'redis' package)
+
+Writes are buffered (write-behind): the Application hands over changed
+users and chats every PERSISTENCE_FLUSH_INTERVAL seconds and the whole
+batch is written in one transaction or pipeline. Data equal to what this
+process last read or wrote is skipped.
+
+With a shared backend that interval would let replicas miss each other's
+writes, so each update re-reads its user's and chat's data before the
+handlers run (one HGET each) and write_through stores them as soon as
+the handlers are done. A replica's interval flush then finds its copy
+unchanged and does not overwrite newer data from another replica.
+"""
+import json
+import asyncio
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import BasePersistence, CallbackContext, PersistenceInput
+
+from config import (
+    PERSISTENCE_BACKEND, PERSISTENCE_DB_PATH, PERSISTENCE_REDIS_URL, PERSISTENCE_REDIS_PREFIX,
+    PERSISTENCE_FLUSH_INTERVAL
+)
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Handler group of write_through, after every group the bot's handlers use
+WRITE_THROUGH_GROUP = 1000
+
+class StateBackend:
+    """Namespaced JSON key-value store with buffered writes"""
+    
+    # Whether other processes may write to the same store
+    shared = False
+    
+    def __init__(self):
+        self._pending: Dict[Tuple[str, str], Optional[str]] = {}  # (namespace, key) -> JSON, None deletes
+        self.flushes = 0
+        self.writes = 0
+    
+    def put(self, namespace: str, key: str, value: Any) -> None:
+        self._pending[(namespace, key)] = json.dumps(value, ensure_ascii=False)
+    
+    def delete(self, namespace: str, key: str) -> None:
+        self._pending[(namespace, key)] = None
+    
+    def is_pending(self, namespace: str, key: str) -> bool:
+        return (namespace, key) in self._pending
+    
+    def _take_pending(self) -> Dict[Tuple[str, str], Optional[str]]:
+        pending, self._pending = self._pending, {}
+        self.flushes += 1
+        self.writes += len(pending)
+        return pending
+    
+    def _restore_pending(self, pending: Dict[Tuple[str, str], Optional[str]]) -> None:
+        """Put back a batch that failed to write, keeping any newer values"""
+        for entry, value in pending.items():
+            self._pending.setdefault(entry, value)
+    
+    async def load(self, namespace: str) -> Dict[str, Any]:
+        raise NotImplementedError
+    
+    async def get(self, namespace: str, key: str) -> Any:
+        raise NotImplementedError
+    
+    async def flush(self) -> None:
+        raise NotImplementedError
+    
+    async def close(self) -> None:
+        await self.flush()
+
+class SQLiteStateBackend(StateBackend):
+    """State in a local SQLite file
+    
+    Every query runs on one worker thread, so reads and batch writes stay
+    off the event loop and never overlap.
+    """
+    
+    def __init__(self, path: str = PERSISTENCE_DB_PATH):
+        super().__init__()
+        self.path = path
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='state-store')
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection opened on first use"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+        return self._conn
+    
+    async def _run(self, call, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call, *args)
+    
+    def _load(self, namespace: str) -> Dict[str, Any]:
+        rows = self.conn.execute("SELECT key, value FROM state WHERE namespace = ?", (namespace,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+    
+    def _get(self, namespace: str, key: str) -> Any:
+        row = self.conn.execute("SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def _write(self, pending: Dict[Tuple[str, str], Optional[str]]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                [(namespace, key, value) for (namespace, key), value in pending.items() if value is not None]
+            )
+            self.conn.executemany(
+                "DELETE FROM state WHERE namespace = ? AND key = ?",
+                [(namespace, key) for (namespace, key), value in pending.items() if value is None]
+            )
+    
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    async def load(self, namespace: str) -> Dict[str, Any]:
+        return await self._run(self._load, namespace)
+    
+    async def get(self, namespace: str, key: str) -> Any:
+        return await self._run(self._get, namespace, key)
+    
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending = self._take_pending()
+        try:
+            await self._run(self._write, pending)
+        except sqlite3.Error:
+            self._restore_pending(pending)
+            raise
+    
+    async def close(self) -> None:
+        await self.flush()
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+class RedisStateBackend(StateBackend):
+    """State in one Redis hash per namespace, shared by every bot process"""
+    
+    shared = True
+    
+    def __init__(self, url: str = PERSISTENCE_REDIS_URL, prefix: str = PERSISTENCE_REDIS_PREFIX, client=None):
+        super().__init__()
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("The Redis state backend needs the 'redis' package: pip install redis")
+            client = aioredis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+    
+    def _hash(self, namespace: str) -> str:
+        return f"{self.prefix}{namespace}"
+    
+    async def load(self, namespace: str) -> Dict[str, Any]:
+        entries = await self.client.hgetall(self._hash(namespace))
+        return {key.decode(): json.loads(value) for key, value in entries.items()}
+    
+    async def get(self, namespace: str, key: str) -> Any:
+        value = await self.client.hget(self._hash(namespace), key)
+        return json.loads(value) if value is not None else None
+    
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending = self._take_pending()
+        pipe = self.client.pipeline(transaction=False)
+        for (namespace, key), value in pending.items():
+            if value is None:
+                pipe.hdel(self._hash(namespace), key)
+            else:
+                pipe.hset(self._hash(namespace), key, value)
+        try:
+            await pipe.execute()
+        except Exception:
+            self._restore_pending(pending)
+            raise
+    
+    async def close(self) -> None:
+        await self.flush()
+        await self.client.aclose()
+
+class StatePersistence(BasePersistence):
+    """BasePersistence storing user, chat and bot data in a StateBackend"""
+    
+    def __init__(self, backend: StateBackend, update_interval: float = PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.backend = backend
+        self._flush_task: Optional[asyncio.Task] = None
+        self._stored: Dict[Tuple[str, str], str] = {}  # (namespace, key) -> JSON last read or written
+    
+    def _flush_soon(self) -> None:
+        """Write the current batch once every buffered update of this round is in"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+    
+    async def _flush(self) -> None:
+        try:
+            await asyncio.sleep(0)
+            await self.backend.flush()
+        except Exception as e:
+            logger.error(f"State flush failed: {e}")
+        finally:
+            self._flush_task = None
+    
+    def _remember(self, namespace: str, key: Any, data: Any) -> bool:
+        """Record data as the stored copy; False if it already was"""
+        entry = (namespace, str(key))
+        stored = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        if self._stored.get(entry) == stored:
+            return False
+        self._stored[entry] = stored
+        return True
+    
+    def _put(self, namespace: str, key: Any, data: Any) -> None:
+        if self._remember(namespace, key, data):
+            self.backend.put(namespace, str(key), data)
+            self._flush_soon()
+    
+    def _drop(self, namespace: str, key: Any) -> None:
+        self._stored.pop((namespace, str(key)), None)
+        self.backend.delete(namespace, str(key))
+        self._flush_soon()
+    
+    async def _load_ids(self, namespace: str) -> Dict[int, Dict]:
+        loaded = {int(key): value for key, value in (await self.backend.load(namespace)).items()}
+        for key, value in loaded.items():
+            self._remember(namespace, key, value)
+        return loaded
+    
+    async def _refresh(self, namespace: str, key: Any, data: Dict) -> None:
+        """Replace data with the stored copy when another process may have changed it"""
+        if not self.backend.shared or self.backend.is_pending(namespace, str(key)):
+            return
+        stored = await self.backend.get(namespace, str(key))
+        if stored is None:
+            return
+        self._remember(namespace, key, stored)
+        if stored != data:
+            data.clear()
+            data.update(stored)
+    
+    async def write_through(self, update: object, context: CallbackContext) -> None:
+        """Store this update's user and chat data now, not on the next interval
+        
+        Registered as a TypeHandler in WRITE_THROUGH_GROUP when the backend
+        is shared.
+        """
+        if not isinstance(update, Update):
+            return
+        if update.effective_user is not None and context.user_data is not None:
+            self._put('user', update.effective_user.id, context.user_data)
+        if update.effective_chat is not None and context.chat_data is not None:
+            self._put('chat', update.effective_chat.id, context.chat_data)
+        try:
+            await self.backend.flush()
+        except Exception as e:
+            logger.error(f"State write-through failed, retrying on the next flush: {e}")
+    
+    async def get_user_data(self) -> Dict[int, Dict]:
+        return await self._load_ids('user')
+    
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return await self._load_ids('chat')
+    
+    async def get_bot_data(self) -> Dict:
+        data = await self.backend.get('bot', 'data') or {}
+        self._remember('bot', 'data', data)
+        return data
+    
+    async def get_callback_data(self) -> None:
+        return None
+    
+    async def get_conversations(self, name: str) -> Dict:
+        stored = await self.backend.load(f'conversation:{name}')
+        return {tuple(json.loads(key)): state for key, state in stored.items()}
+    
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        if new_state is None:
+            self.backend.delete(f'conversation:{name}', json.dumps(key))
+        else:
+            self.backend.put(f'conversation:{name}', json.dumps(key), new_state)
+        self._flush_soon()
+    
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        self._put('user', user_id, data)
+    
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        self._put('chat', chat_id, data)
+    
+    async def update_bot_data(self, data: Dict) -> None:
+        self._put('bot', 'data', data)
+    
+    async def update_callback_data(self, data) -> None:
+        pass
+    
+    async def drop_user_data(self, user_id: int) -> None:
+        self._drop('user', user_id)
+    
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._drop('chat', chat_id)
+    
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        await self._refresh('user', user_id, user_data)
+    
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        await self._refresh('chat', chat_id, chat_data)
+    
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+    
+    async def flush(self) -> None:
+        """Write everything still buffered; called by the Application on shutdown"""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.backend.close()
+        logger.info(f"State persistence: {self.backend.writes} writes in {self.backend.flushes} batches")
+
+def create_persistence(backend: Optional[str] = PERSISTENCE_BACKEND) -> Optional[StatePersistence]:
+    """Persistence for the configured backend, or None to keep state in memory only"""
+    if backend == 'sqlite':
+        return StatePersistence(SQLiteStateBackend())
+    if backend == 'redis':
+        return StatePersistence(RedisStateBackend())
+    if backend:
+        raise ValueError(f"Unknown PERSISTENCE_BACKEND {backend!r}")
+    return None
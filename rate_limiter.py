@@ -0,0 +1,227 @@
+"""
+Outbound flood control for Bot API requests
+
+FloodControlRateLimiter is installed as the bot's rate limiter, so every
+send and edit passes through it:
+
+* token buckets keep each chat (RATE_LIMIT_CHAT_PER_SECOND, groups
+  RATE_LIMIT_GROUP_PER_MINUTE) and the whole bot
+  (RATE_LIMIT_GLOBAL_PER_SECOND) under Telegram's limits; requests wait
+  for their slot instead of failing
+* an edit of a message that still waits for its slot is dropped once a
+  newer edit of the same message arrives
+* progress edits ("Please wait...") sent with edit_interim are held for
+  INTERIM_EDIT_DELAY; when the results edit follows within that time the
+  progress edit is never sent. reply_interim does the same for handlers
+  answering a text message, where there is no message to edit yet
+* RetryAfter pauses the chat and the bot for the time Telegram asks,
+  doubling on repeats, before the request is retried
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Coroutine, Dict, Hashable, Optional
+
+from telegram import Message
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import (
+    RATE_LIMIT_GLOBAL_PER_SECOND, RATE_LIMIT_CHAT_PER_SECOND, RATE_LIMIT_CHAT_BURST,
+    RATE_LIMIT_GROUP_PER_MINUTE, RATE_LIMIT_MAX_RETRIES, INTERIM_EDIT_DELAY
+)
+
+logger = logging.getLogger(__name__)
+
+# rate_limit_args marking an edit that a later edit of the same message may replace
+INTERIM = 'interim'
+
+MERGEABLE_ENDPOINTS = {'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup'}
+
+class TokenBucket:
+    """Reservation-based token bucket: each request books the next free slot"""
+    
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'paused_until', 'lock')
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()  # keeps one chat's requests in order on the wire
+    
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(-self.tokens / self.rate, self.paused_until - now, 0.0)
+    
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+    
+    def idle(self) -> bool:
+        return not self.lock.locked() and self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+class FloodControlRateLimiter(BaseRateLimiter):
+    """Per-chat and global throttling with edit merging and RetryAfter handling"""
+    
+    def __init__(self, global_rate: float = RATE_LIMIT_GLOBAL_PER_SECOND,
+                 chat_rate: float = RATE_LIMIT_CHAT_PER_SECOND, chat_burst: float = RATE_LIMIT_CHAT_BURST,
+                 group_per_minute: float = RATE_LIMIT_GROUP_PER_MINUTE, max_retries: int = RATE_LIMIT_MAX_RETRIES,
+                 interim_delay: float = INTERIM_EDIT_DELAY):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_per_minute / 60
+        self.max_retries = max_retries
+        self.interim_delay = interim_delay
+        self._chats: Dict[Hashable, TokenBucket] = {}
+        self._latest_edit: Dict[tuple, object] = {}  # message -> token of its newest pending edit
+        self._tasks = set()
+        self.sent = 0
+        self.merged = 0
+        self.delayed = 0
+        self.retries = 0
+        self.max_delay = 0.0
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self.sent:
+            logger.info(f"Outbound rate limiting: {self.stats()}")
+    
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._chats = {key: value for key, value in self._chats.items() if not value.idle()}
+            is_group = isinstance(chat_id, str) or chat_id < 0  # groups, channels and @usernames
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, 1 if is_group else self.chat_burst)
+        return bucket
+    
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[str],
+    ):
+        chat_id = data.get('chat_id')
+        key = None
+        if endpoint in MERGEABLE_ENDPOINTS and chat_id is not None and data.get('message_id') is not None:
+            key = (endpoint, chat_id, data['message_id'])
+        
+        if key is None:
+            return await self._send(callback, args, kwargs, chat_id)
+        
+        token = object()
+        self._latest_edit[key] = token
+        if rate_limit_args == INTERIM:
+            # Return at once so the handler can go on fetching the results
+            task = asyncio.get_running_loop().create_task(self._interim(key, token, callback, args, kwargs, chat_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return True
+        return await self._edit(key, token, callback, args, kwargs, chat_id)
+    
+    async def _interim(self, key: tuple, token: object, callback, args, kwargs, chat_id) -> None:
+        try:
+            await asyncio.sleep(self.interim_delay)
+            await self._edit(key, token, callback, args, kwargs, chat_id)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Progress edit in chat {chat_id} failed: {e}")
+    
+    async def _edit(self, key: tuple, token: object, callback, args, kwargs, chat_id):
+        """Send an edit unless a newer edit of the same message replaced it while waiting"""
+        try:
+            if self._latest_edit.get(key) is not token:
+                self.merged += 1
+                return True
+            return await self._send(callback, args, kwargs, chat_id,
+                                    superseded=lambda: self._latest_edit.get(key) is not token)
+        finally:
+            if self._latest_edit.get(key) is token:
+                del self._latest_edit[key]
+    
+    async def _send(self, callback, args, kwargs, chat_id, superseded: Callable[[], bool] = lambda: False):
+        bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+        for attempt in range(self.max_retries + 1):
+            delay = bucket.reserve() if bucket is not None else 0.0
+            if delay:
+                await asyncio.sleep(delay)
+            delay_global = self.global_bucket.reserve()
+            if delay_global:
+                await asyncio.sleep(delay_global)
+            if delay or delay_global:
+                self.delayed += 1
+                self.max_delay = max(self.max_delay, delay + delay_global)
+            
+            if bucket is None:
+                try:
+                    self.sent += 1
+                    return await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    error = e
+            else:
+                async with bucket.lock:
+                    if superseded():
+                        self.merged += 1
+                        return True
+                    try:
+                        self.sent += 1
+                        return await callback(*args, **kwargs)
+                    except RetryAfter as e:
+                        error = e
+            
+            if attempt == self.max_retries:
+                break
+            backoff = float(error.retry_after) * 2 ** attempt
+            self.retries += 1
+            logger.warning(f"Flood control in chat {chat_id}: retrying in {backoff:.1f}s")
+            self.global_bucket.pause(backoff)
+            if bucket is not None:
+                bucket.pause(backoff)
+        raise error
+    
+    def stats(self) -> Dict:
+        return {
+            "sent": self.sent,
+            "merged_edits": self.merged,
+            "delayed": self.delayed,
+            "retries": self.retries,
+            "max_delay_s": round(self.max_delay, 2),
+            "chats": len(self._chats)
+        }
+
+async def edit_interim(query, text: str, **kwargs) -> None:
+    """Show a progress message that the results edit may replace before it is sent"""
+    bot = query.get_bot()
+    if getattr(bot, 'rate_limiter', None) is None or query.message is None:
+        await query.edit_message_text(text, **kwargs)
+        return
+    await bot.edit_message_text(
+        text, chat_id=query.message.chat_id, message_id=query.message.message_id,
+        rate_limit_args=INTERIM, **kwargs
+    )
+
+async def reply_interim(message: Message, work: asyncio.Future, text: str, **kwargs) -> Optional[Message]:
+    """Reply with a progress message only if work is still running after INTERIM_EDIT_DELAY
+    
+    Returns the progress message for the results to edit, or None when
+    they are ready and should simply be sent as the reply.
+    """
+    done, _ = await asyncio.wait({work}, timeout=INTERIM_EDIT_DELAY)
+    if done:
+        return None
+    return await message.reply_text(text, **kwargs)
@@ -1,27 +1,195 @@
 """
 Search APIs for interacting with SearchTruth.com
 """
-import re
-import html
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
+import time
+import asyncio
+import httpx
+from typing import Callable, List, Dict, Optional
 import logging
 
+import parsers
+from cache import TieredCache, search_cache
+from circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError
+from http_client import HTTPClient, http_client
+from metrics import upstream_errors, upstream_fetch_seconds, upstream_in_flight, upstream_parse_seconds
+from offline.dictionary import LocalDictionary, local_dictionary
+from offline.hadith_index import HadithLibrary, hadith_library
+from offline.quran_index import QuranLibrary, quran_library
+from singleflight import SingleFlight
+
 logger = logging.getLogger(__name__)
 
 class SearchTruthAPI:
-    """API wrapper for SearchTruth.com functionality"""
+    """Async API wrapper for SearchTruth.com functionality
+    
+    All public methods are coroutines: the HTTP round trip is awaited on the
+    event loop and the HTML parsing runs in the default executor, so a slow
+    SearchTruth page only delays the caller waiting on it.
+    
+    Each endpoint has a circuit breaker; while it is open, searches are
+    answered from stale cache (or fail at once) and refreshed in the
+    background by the breaker's probe request.
+    
+    Pages are refreshed with conditional GETs: the ETag and Last-Modified
+    of each fetched page are cached next to its results, and on a 304 the
+    cached results are reused without downloading or parsing the page.
+    """
+    
+    def __init__(self, timeout=10, user_agent=None, client: Optional[HTTPClient] = None,
+                 cache: Optional[TieredCache] = None, quran_library: Optional[QuranLibrary] = None,
+                 hadith_library: Optional[HadithLibrary] = None, dictionary: Optional[LocalDictionary] = None):
+        self.client = client or HTTPClient(
+            timeout=timeout,
+            user_agent=user_agent or "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        )
+        self.cache = cache
+        self.quran_library = quran_library
+        self.hadith_library = hadith_library
+        self.dictionary = dictionary
+        self.flights = SingleFlight()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._refreshes = set()
+        self.revalidated = 0
+    
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client"""
+        await self.client.aclose()
+    
+    async def _fetch(self, url: str, params: Optional[Dict] = None,
+                     validators: Optional[List[str]] = None) -> httpx.Response:
+        """GET a page, conditionally when the [ETag, Last-Modified] of a cached copy are given"""
+        headers = {}
+        if validators:
+            etag, last_modified = validators
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        response = await self.client.get(url, params=params, headers=headers or None)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+    
+    async def _parse(self, parser: Callable, *args):
+        """Run a blocking HTML parser off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, parser, *args)
+    
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """The circuit breaker guarding one endpoint ('quran', 'hadith', ...)"""
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+    
+    def breaker_stats(self) -> Dict[str, Dict]:
+        return {endpoint: breaker.stats() for endpoint, breaker in self.breakers.items()}
+    
+    @staticmethod
+    def _is_outage(error: Exception) -> bool:
+        """Timeouts, connection errors and 5xx responses count against a breaker; 4xx do not"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+    
+    async def _stale(self, key: tuple, breaker: CircuitBreaker) -> Optional[List[str]]:
+        stale = await self.cache.get_stale(key) if self.cache is not None else None
+        if stale is not None:
+            breaker.stale_served += 1
+        return stale
     
-    def __init__(self, timeout=10, user_agent=None):
-        self.timeout = timeout
-        self.headers = {
-            'User-Agent': user_agent or "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
+    def _refresh_in_background(self, key: tuple, fetch_and_parse: Callable) -> None:
+        async def refresh() -> None:
+            try:
+                await self.flights.do(key, fetch_and_parse)
+            except Exception as e:
+                logger.warning(f"Background refresh of {key[0]} failed: {e}")
+        
+        task = asyncio.ensure_future(refresh())
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
     
-    def search_quran(self, keyword: str, chapter: str = "", translator: str = "2", max_results: int = 5) -> List[str]:
-        """Search Quran verses using SearchTruth.com"""
+    async def _cached(self, key: tuple, url: str, params: Optional[Dict], parser: Callable, *args) -> List[str]:
+        """Fetch and parse a page unless its parsed results are already cached
+        
+        Concurrent identical searches share a single fetch and parse. When
+        the endpoint is down, an expired cached result is returned instead.
+        """
+        if self.cache is not None:
+            results = await self.cache.get(key)
+            if results is not None:
+                return results
+        
+        breaker = self.breaker(key[0])
+        validators_key = ('validators',) + key
+        
+        endpoint = key[0]
+        in_flight = upstream_in_flight.labels(endpoint)
+        
+        async def fetch_and_parse() -> List[str]:
+            validators = previous = None
+            if self.cache is not None:
+                validators = await self.cache.get_stale(validators_key)
+                previous = await self.cache.get_stale(key) if validators else None
+            in_flight.inc()
+            try:
+                started = time.perf_counter()
+                try:
+                    response = await self._fetch(url, params, validators if previous is not None else None)
+                except Exception as e:
+                    upstream_errors.labels(endpoint, type(e).__name__).inc()
+                    if self._is_outage(e):
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                    raise
+                breaker.record_success()
+                upstream_fetch_seconds.labels(endpoint).observe(time.perf_counter() - started)
+                
+                if response.status_code == 304 and previous is not None:
+                    self.revalidated += 1
+                    results = previous
+                else:
+                    started = time.perf_counter()
+                    results = await self._parse(parser, response.content, *args)
+                    upstream_parse_seconds.labels(endpoint).observe(time.perf_counter() - started)
+            finally:
+                in_flight.dec()
+            if self.cache is not None:
+                self.cache.set(key, results)
+                fresh = [response.headers.get('ETag', ''), response.headers.get('Last-Modified', '')]
+                if any(fresh) or validators:
+                    self.cache.set(validators_key, [new or old for new, old in zip(fresh, validators or fresh)])
+            return results
+        
+        if breaker.state != CLOSED:
+            stale = await self._stale(key, breaker)
+            if not breaker.allow_request():
+                if stale is not None:
+                    return stale
+                raise CircuitOpenError(breaker.name, breaker.retry_in())
+            if stale is not None:
+                # Answer now; this search's refresh doubles as the breaker's probe
+                self._refresh_in_background(key, fetch_and_parse)
+                return stale
+        
+        try:
+            return await self.flights.do(key, fetch_and_parse)
+        except httpx.HTTPError as e:
+            stale = await self._stale(key, breaker) if self._is_outage(e) else None
+            if stale is None:
+                raise
+            logger.warning(f"Serving stale {key[0]} results: {e}")
+            return stale
+    
+    async def search_quran(self, keyword: str, chapter: str = "", translator: str = "2", max_results: int = 5) -> List[str]:
+        """Search Quran verses, locally when an index exists for the translation, else on SearchTruth.com"""
         try:
+            if self.quran_library is not None:
+                results = self.quran_library.search(keyword, chapter, translator, max_results)
+                if results is not None:
+                    return results if results else [f"No Quran verses found containing '{keyword}'"]
+            
             url = "https://www.searchtruth.com/search.php"
             params = {
                 'keyword': keyword,
@@ -29,100 +197,39 @@ class SearchTruthAPI:
                 'translator': translator
             }
             
-            response = requests.get(url, params=params, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            results = []
-            
-            # Extract results using multiple strategies
-            result_selectors = [
-                'div[style*="margin"]',
-                'table[width="100%"]',
-                '.search_result',
-                '.verse_div'
-            ]
-            
-            for selector in result_selectors:
-                elements = soup.select(selector)
-                if elements:
-                    for element in elements[:max_results]:
-                        text = element.get_text(strip=True, separator=' ')
-                        if text and len(text) > 20 and keyword.lower() in text.lower():
-                            text = self._clean_text(text)
-                            results.append(text[:500])
-                    if results:
-                        break
-            
-            if not results:
-                # Fallback: search in all text
-                all_text = soup.get_text()
-                lines = [line.strip() for line in all_text.split('\n') if line.strip()]
-                
-                keyword_lower = keyword.lower()
-                for line in lines:
-                    if keyword_lower in line.lower() and len(line) > 30:
-                        clean_line = self._clean_text(line)
-                        if clean_line not in results:
-                            results.append(clean_line[:500])
-                            if len(results) >= max_results:
-                                break
+            key = TieredCache.make_key('quran', keyword, chapter, translator, max_results)
+            results = await self._cached(key, url, params, parsers.parse_quran, keyword, max_results)
             
             return results if results else [f"No Quran verses found containing '{keyword}'"]
             
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, CircuitOpenError) as e:
             logger.error(f"Quran search request error: {e}")
             return ["Unable to search Quran at the moment. Please try again later."]
         except Exception as e:
             logger.error(f"Quran search error: {e}")
             return ["Error processing Quran search. Please try again."]
     
-    def search_hadith(self, keyword: str, collection: str = "1", max_results: int = 5) -> List[str]:
-        """Search Hadith using SearchTruth.com"""
+    async def search_hadith(self, keyword: str, collection: str = "1", max_results: int = 5,
+                            offset: int = 0) -> List[str]:
+        """Search Hadith, locally when an index exists for the collection, else on SearchTruth.com
+        
+        offset skips that many hits, so callers can page through results.
+        """
         try:
+            if self.hadith_library is not None:
+                results = self.hadith_library.search(keyword, collection, max_results, offset)
+                if results is not None:
+                    return results if results else [f"No hadith found containing '{keyword}'"]
+            
             url = "https://www.searchtruth.com/searchHadith.php"
             params = {
                 'keyword': keyword,
                 'translator': collection
             }
             
-            response = requests.get(url, params=params, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            results = []
-            
-            # Try different selectors for hadith results
-            selectors = [
-                'div[style*="margin"]',
-                'table[border="0"]',
-                '.hadith_result',
-                'tr[bgcolor]'
-            ]
-            
-            for selector in selectors:
-                elements = soup.select(selector)
-                if elements:
-                    for element in elements[:max_results]:
-                        text = element.get_text(strip=True, separator=' ')
-                        if text and len(text) > 30 and keyword.lower() in text.lower():
-                            text = self._clean_text(text)
-                            results.append(text[:600])
-                    if results:
-                        break
-            
-            if not results:
-                # Alternative extraction
-                all_text = soup.get_text()
-                paragraphs = [p.strip() for p in all_text.split('\n\n') if p.strip()]
-                
-                keyword_lower = keyword.lower()
-                for para in paragraphs:
-                    if keyword_lower in para.lower() and len(para) > 50:
-                        clean_para = self._clean_text(para)
-                        results.append(clean_para[:600])
-                        if len(results) >= max_results:
-                            break
+            key = TieredCache.make_key('hadith', keyword, collection, offset + max_results)
+            results = await self._cached(key, url, params, parsers.parse_hadith, keyword, offset + max_results)
+            results = results[offset:]
             
             return results if results else [f"No hadith found containing '{keyword}'"]
             
@@ -130,39 +237,22 @@ class SearchTruthAPI:
             logger.error(f"Hadith search error: {e}")
             return ["Unable to search Hadith at the moment. Please try again later."]
     
-    def search_dictionary(self, word: str, word_option: str = "1", max_results: int = 8) -> List[str]:
-        """Search English-Arabic dictionary"""
+    async def search_dictionary(self, word: str, word_option: str = "1", max_results: int = 8) -> List[str]:
+        """Search the English-Arabic dictionary, locally once it has been built, else on SearchTruth.com"""
         try:
+            if self.dictionary is not None:
+                results = self.dictionary.search(word, word_option, max_results)
+                if results is not None:
+                    return results if results else [f"No dictionary entries found for '{word}'"]
+            
             url = "https://www.searchtruth.com/dictionary/arabic_english_dictionary.php"
             params = {
                 'word': word,
                 'word_option': word_option
             }
             
-            response = requests.get(url, params=params, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            results = []
-            
-            # Extract dictionary entries
-            entries = soup.find_all('tr', bgcolor=True)
-            
-            for entry in entries[:max_results]:
-                text = entry.get_text(strip=True, separator=' | ')
-                if text and len(text) > 10:
-                    text = self._clean_text(text)
-                    results.append(text[:400])
-            
-            if not results:
-                # Try alternative extraction
-                tables = soup.find_all('table', width=lambda x: x and x == '100%')
-                for table in tables:
-                    text = table.get_text(strip=True, separator=' | ')
-                    if word.lower() in text.lower() and len(text) > 20:
-                        results.append(text[:400])
-                        if len(results) >= max_results:
-                            break
+            key = TieredCache.make_key('dictionary', word, word_option, max_results)
+            results = await self._cached(key, url, params, parsers.parse_dictionary, word, max_results)
             
             return results if results else [f"No dictionary entries found for '{word}'"]
             
@@ -170,41 +260,14 @@ class SearchTruthAPI:
             logger.error(f"Dictionary search error: {e}")
             return ["Unable to access dictionary at the moment. Please try again later."]
     
-    def get_prayer_cities(self, country: str) -> Dict:
-        """Get list of cities for a country"""
-        try:
-            country_url = country.replace(' ', '_').lower()
-            url = f"https://www.searchtruth.com/prayertimes/city.php?country={country_url}"
-            
-            response = requests.get(url, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            cities = []
-            
-            # Extract city links
-            city_links = soup.find_all('a', href=lambda x: x and 'prayertimes' in x and 'city=' in x)
-            
-            for link in city_links:
-                city_name = link.get_text(strip=True)
-                if city_name and city_name not in cities:
-                    cities.append(city_name)
-            
-            return {
-                "country": country,
-                "available_cities": cities[:20],
-                "total_cities": len(cities)
-            }
-            
-        except Exception as e:
-            logger.error(f"Prayer cities error: {e}")
-            return {
-                "error": f"Unable to get cities for {country}",
-                "suggestion": "Please try a different country or check the country name."
-            }
-    
-    def _clean_text(self, text: str) -> str:
-        """Clean and format text"""
-        text = re.sub(r'\s+', ' ', text)
-        text = html.unescape(text)
-        return text.strip()
\ No newline at end of file
+    async def fetch_cities(self, country: str) -> List[str]:
+        """Every city SearchTruth lists for a country; raises on network errors"""
+        country_url = country.replace(' ', '_').lower()
+        url = f"https://www.searchtruth.com/prayertimes/city.php?country={country_url}"
+        
+        key = TieredCache.make_key('cities', country)
+        return await self._cached(key, url, None, parsers.parse_cities)
+
+# Process-wide instance shared by all handler modules
+search_api = SearchTruthAPI(client=http_client, cache=search_cache, quran_library=quran_library,
+                            hadith_library=hadith_library, dictionary=local_dictionary)
@@ -10,6 +10,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/yourusername/searchtruth-bot",
     packages=find_packages(),
+    package_data={"offline": ["data/*.tsv"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -17,13 +18,20 @@ setup(
         "Topic :: Communications :: Chat",
         "Topic :: Religion",
     ],
-    python_requires=">=3.8",
+    python_requires=">=3.9",
     install_requires=[
         "python-telegram-bot>=20.0",
-        "requests>=2.28.0",
+        "httpx[http2,brotli]>=0.25.0",
         "beautifulsoup4>=4.11.0",
         "lxml>=4.9.0",
+        "hijridate>=2.3.0",
+        "tzdata",
     ],
+    extras_require={
+        "webhook": ["uvicorn>=0.24.0"],
+        "redis": ["redis>=5.0.1"],
+        "test": ["pytest>=7.0", "fakeredis>=2.20"],
+    },
     entry_points={
         "console_scripts": [
             "searchtruth-bot=main:main",
@@ -0,0 +1,38 @@
+"""
+Request coalescing for identical in-flight searches
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers with the same key
+    
+    The first caller starts the work as a task; callers arriving while it
+    runs await the same task instead of starting their own fetch. A
+    cancelled caller does not cancel the shared work for the others.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """Run fn() once per key at a time and return its result to every caller"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+    
+    def stats(self) -> Dict:
+        """Upstream calls made, callers coalesced onto them and calls in flight"""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight)
+        }
@@ -0,0 +1,13 @@
+"""
+Test setup
+
+The bot's modules live at the repository root. Tests run from a scratch
+directory so the cache, callback and state files they create stay out of
+the checkout.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix='searchtruth-tests-'))
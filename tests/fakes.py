@@ -0,0 +1,31 @@
+"""
+Stand-ins for Telegram used by the tests
+"""
+import json
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+from telegram.request import BaseRequest
+
+class LocalBotAPI(BaseRequest):
+    """Answers getMe so an Application can initialize without Telegram"""
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        pass
+    
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        me = {'id': 1, 'is_bot': True, 'first_name': 'SearchTruth', 'username': 'searchtruth_test_bot'}
+        return 200, json.dumps({'ok': True, 'result': me}).encode()
+
+def text_update(update_id: int, text: str, user_id: int = 42, chat_id: int = None) -> Update:
+    """A text message from user_id, in their private chat unless chat_id is given"""
+    chat = Chat(id=chat_id or user_id, type=Chat.PRIVATE if chat_id is None else Chat.GROUP)
+    message = Message(
+        message_id=update_id, date=datetime.now(timezone.utc), chat=chat,
+        from_user=User(id=user_id, first_name='Test', is_bot=False), text=text
+    )
+    return Update(update_id=update_id, message=message)
@@ -0,0 +1,15 @@
+"""
+Tests for city_directory.py: every listed city can be answered
+"""
+from city_directory import CityDirectory
+from config import COUNTRIES, POPULAR_COUNTRIES
+from offline import prayer_times
+
+def test_every_listed_city_has_prayer_times():
+    directory = CityDirectory(COUNTRIES + POPULAR_COUNTRIES)
+    directory.load_all()
+    
+    for country in COUNTRIES + POPULAR_COUNTRIES:
+        index = directory._indexes[prayer_times.country_name(country)]
+        assert len(index), country
+        assert [name for name in index.names if prayer_times.find_city(country, name) is None] == []
@@ -0,0 +1,21 @@
+"""
+Tests for the Hijri date reply: the label names the calendar actually used
+"""
+from datetime import date
+
+import pytest
+
+from handlers.main_menu import hijri_date_text
+from offline import hijri
+
+@pytest.mark.skipif(hijri.UMM_AL_QURA is None, reason="needs hijridate")
+@pytest.mark.parametrize('day, label', [
+    (date(2024, 3, 11), "_Calendar: Umm al-Qura_"),
+    (date(1900, 1, 1), "_Calendar: tabular (arithmetic)_"),
+    (date(2100, 1, 1), "_Calendar: tabular (arithmetic)_"),
+])
+def test_date_is_labelled_with_the_calendar_that_converted_it(day, label):
+    text = hijri_date_text(day)
+    
+    assert text.endswith(label)
+    assert hijri.format_hijri(hijri.calendar_for(day).from_gregorian(day)) in text
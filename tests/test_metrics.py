@@ -0,0 +1,18 @@
+"""
+Tests for metrics.py: the rendered exposition stays valid
+"""
+from collections import Counter
+
+import main
+from metrics import registry
+
+from fakes import LocalBotAPI
+
+def test_rebuilding_the_application_renders_each_family_once():
+    main.build_application(request=LocalBotAPI())
+    main.build_application(request=LocalBotAPI())
+    
+    families = Counter(line.split()[2] for line in registry.render().splitlines() if line.startswith('# TYPE '))
+    
+    assert 'searchtruth_cache_hit_ratio' in families
+    assert [name for name, count in families.items() if count > 1] == []
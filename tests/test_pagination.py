@@ -0,0 +1,55 @@
+"""
+Tests for handlers/pagination.py: paging a search on any bot process
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from cache import LRUCache, RedisCache, TieredCache
+from handlers import pagination
+from handlers.pagination import ResultCursor, first_page, page_callback
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+class FakeQuery:
+    """The parts of telegram.CallbackQuery page_callback uses"""
+    
+    def __init__(self, data: str):
+        self.data = data
+        self.edits = []
+    
+    async def answer(self) -> None:
+        pass
+    
+    async def edit_message_text(self, text: str, **kwargs) -> None:
+        self.edits.append(text)
+
+def replica_cursors(server: 'fakeredis.FakeServer') -> TieredCache:
+    """One bot process's cursor cache on the shared Redis stand-in"""
+    return TieredCache(LRUCache(), RedisCache('', 'page:', client=fakeredis.FakeRedis(server=server)))
+
+@pytest.mark.skipif(fakeredis is None, reason="needs fakeredis: pip install -e .[test]")
+def test_next_page_on_another_replica(monkeypatch):
+    server = fakeredis.FakeServer()
+    cursor = ResultCursor("*Results*\n\n", [f"verse {i}" for i in range(1, 8)], 5, "_footer_",
+                          [[("🔍 New Search", 'main_quran')]])
+    
+    replica_a, replica_b = replica_cursors(server), replica_cursors(server)
+    monkeypatch.setattr(pagination, 'cursor_cache', replica_a)
+    _, keyboard = first_page(('quran', 'mercy'), cursor)
+    replica_a.close()  # waits for the write to Redis
+    next_button = keyboard.inline_keyboard[0][0]
+    assert next_button.text == "Next ➡️"
+    
+    monkeypatch.setattr(pagination, 'cursor_cache', replica_b)
+    query = FakeQuery(next_button.callback_data)
+    asyncio.run(page_callback(SimpleNamespace(callback_query=query), None))
+    replica_b.close()
+    
+    assert len(query.edits) == 1
+    assert "*6.* verse 6" in query.edits[0] and "*7.* verse 7" in query.edits[0]
+    assert "_Results 6-7 of 7_" in query.edits[0]
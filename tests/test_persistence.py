@@ -0,0 +1,121 @@
+"""
+Tests for persistence.py: state shared by several bot processes
+"""
+import asyncio
+import threading
+
+import pytest
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+import main
+from handlers import text_router
+from handlers.text_router import TEXT_STATES
+from persistence import RedisStateBackend, SQLiteStateBackend, StatePersistence
+
+from fakes import LocalBotAPI, text_update
+
+needs_fakeredis = pytest.mark.skipif(fakeredis is None, reason="needs fakeredis: pip install -e .[test]")
+
+def replica(server: 'fakeredis.FakeServer') -> StatePersistence:
+    """One bot process's persistence on the shared Redis stand-in"""
+    return StatePersistence(RedisStateBackend(client=fakeredis.FakeAsyncRedis(server=server)))
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Record text handling; quick search stands in for pressing 'Search Quran'"""
+    calls = []
+    
+    async def quick_search(update, context):
+        calls.append(('quick', update.message.text))
+        context.user_data['state'] = 'waiting_quran_search'
+    
+    async def quran_search(update, context):
+        calls.append(('quran', update.message.text))
+        context.user_data['state'] = None
+    
+    monkeypatch.setattr(text_router, 'quick_search', quick_search)
+    monkeypatch.setitem(TEXT_STATES, 'waiting_quran_search', quran_search)
+    return calls
+
+@needs_fakeredis
+def test_next_message_on_another_replica_sees_the_state(monkeypatch, calls):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(main, 'create_persistence', lambda: replica(server))
+    replica_a = main.build_application(request=LocalBotAPI())
+    replica_b = main.build_application(request=LocalBotAPI())
+    
+    async def conversation() -> None:
+        await replica_a.initialize()
+        await replica_b.initialize()
+        try:
+            await replica_a.process_update(text_update(1, 'hello'))
+            await replica_b.process_update(text_update(2, 'mercy'))
+            await replica_a.update_persistence()  # A's interval flush must not restore its older state
+            await replica_a.process_update(text_update(3, 'patience'))
+        finally:
+            await replica_a.shutdown()
+            await replica_b.shutdown()
+    
+    asyncio.run(conversation())
+    
+    assert calls == [('quick', 'hello'), ('quran', 'mercy'), ('quick', 'patience')]
+
+@needs_fakeredis
+def test_interval_flush_skips_unchanged_data():
+    server = fakeredis.FakeServer()
+    
+    async def flushes() -> int:
+        persistence = replica(server)
+        await persistence.update_user_data(42, {'state': None})
+        await persistence.backend.flush()
+        await persistence.update_user_data(42, {'state': None})
+        await persistence.update_user_data(42, {'state': 'waiting_dict_search'})
+        await persistence.flush()
+        return persistence.backend.writes
+    
+    assert asyncio.run(flushes()) == 2
+
+@needs_fakeredis
+def test_refreshed_data_is_not_written_back():
+    server = fakeredis.FakeServer()
+    
+    async def writes() -> int:
+        writer, reader = replica(server), replica(server)
+        await writer.update_user_data(42, {'state': 'waiting_hadith_search'})
+        await writer.flush()
+        
+        data = {}
+        await reader.refresh_user_data(42, data)
+        assert data == {'state': 'waiting_hadith_search'}
+        await reader.update_user_data(42, data)
+        await reader.flush()
+        return reader.backend.writes
+    
+    assert asyncio.run(writes()) == 0
+
+def test_sqlite_state_is_read_and_written_off_the_event_loop(monkeypatch):
+    threads = []
+    write = SQLiteStateBackend._write
+    
+    def recording_write(self, pending):
+        threads.append(threading.current_thread().name)
+        write(self, pending)
+    
+    monkeypatch.setattr(SQLiteStateBackend, '_write', recording_write)
+    
+    async def round_trip() -> dict:
+        persistence = StatePersistence(SQLiteStateBackend('state.sqlite3'))
+        await persistence.update_user_data(42, {'state': 'waiting_quran_search'})
+        await persistence.flush()
+        reader = StatePersistence(SQLiteStateBackend('state.sqlite3'))
+        try:
+            return await reader.get_user_data()
+        finally:
+            await reader.flush()
+    
+    assert asyncio.run(round_trip()) == {42: {'state': 'waiting_quran_search'}}
+    assert threads and all(name.startswith('state-store') for name in threads)
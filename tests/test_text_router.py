@@ -0,0 +1,147 @@
+"""
+Tests for handlers/text_router.py: which handler gets a text message
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import MessageHandler
+
+from city_directory import CityIndex, city_directory
+import main
+import rate_limiter
+from handlers import text_router
+from handlers.dictionary_handlers import handle_dictionary_search
+from handlers.hadith_handlers import handle_hadith_search
+from handlers.prayer_handlers import handle_city_search
+from handlers.quran_handlers import handle_quran_search
+from handlers.text_router import TEXT_STATES, route_text
+from search_apis import search_api
+
+from fakes import LocalBotAPI, text_update
+
+class FakeMessage:
+    """The parts of telegram.Message the text handlers use"""
+    
+    def __init__(self, text: str = ''):
+        self.text = text
+        self.replies = []
+        self.edits = []  # texts replaced by edit_text, oldest first
+    
+    async def reply_text(self, text: str, **kwargs) -> 'FakeMessage':
+        reply = FakeMessage(text)
+        self.replies.append(reply)
+        return reply
+    
+    async def edit_text(self, text: str, **kwargs) -> 'FakeMessage':
+        self.edits.append(self.text)
+        self.text = text
+        return self
+
+def send(text: str, user_data: dict) -> str:
+    """Route one text message and return the text of the bot's reply"""
+    message = FakeMessage(text)
+    asyncio.run(route_text(SimpleNamespace(message=message), SimpleNamespace(user_data=user_data)))
+    assert len(message.replies) == 1
+    return message.replies[0].text
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """Answer the searches that would reach SearchTruth.com locally"""
+    async def search_hadith(keyword, collection_id='1', max_results=5):
+        return [f"Hadith about {keyword}"]
+    
+    async def get(country):
+        return CityIndex(['Karachi', 'Lahore', 'Larkana'])
+    
+    monkeypatch.setattr(search_api, 'search_hadith', search_hadith)
+    monkeypatch.setattr(city_directory, 'get', get)
+
+def test_each_state_maps_to_its_handler():
+    assert {state: handler.__wrapped__ for state, handler in TEXT_STATES.items()} == {
+        'waiting_quran_search': handle_quran_search,
+        'waiting_hadith_search': handle_hadith_search,
+        'waiting_dict_search': handle_dictionary_search,
+        'waiting_city_search': handle_city_search,
+    }
+
+@pytest.mark.parametrize('state, text, expected', [
+    ('waiting_quran_search', 'mercy 2', "*Searching for:* `mercy` in chapter 2"),
+    ('waiting_hadith_search', 'prayer', "*Hadith Search Results*"),  # answered at once, no progress reply
+    ('waiting_dict_search', 'kitab', "*Search for:* `kitab`"),
+    ('waiting_city_search', 'la', "*Cities in Pakistan matching* `la`"),
+])
+def test_waiting_state_reaches_its_handler(state, text, expected):
+    user_data = {'state': state, 'city_country': 'Pakistan'}
+    
+    assert expected in send(text, user_data)
+    assert user_data['state'] is None
+
+@pytest.mark.parametrize('state', sorted(TEXT_STATES))
+def test_state_lasts_one_message(state):
+    user_data = {'state': state, 'city_country': 'Pakistan'}
+    
+    send('mercy', user_data)
+    
+    assert "*Quick Search for:* `mercy`" in send('mercy', user_data)
+
+def test_no_state_is_a_quick_search():
+    assert "*Quick Search for:* `patience`" in send('patience', {})
+
+def test_unknown_state_is_cleared_and_treated_as_quick_search():
+    user_data = {'state': 'waiting_something_removed'}
+    
+    assert "*Quick Search for:* `patience`" in send('patience', user_data)
+    assert user_data['state'] is None
+
+def test_application_sends_typed_keyword_to_search_handler_not_quick_search(monkeypatch):
+    """Regression: quick search (group 0) used to see the keyword before the
+    Quran search handler (group 1) and answer it as a quick search"""
+    calls = []
+    
+    async def record(name, update, context):
+        calls.append((name, update.message.text))
+    
+    monkeypatch.setitem(TEXT_STATES, 'waiting_quran_search', lambda u, c: record('quran', u, c))
+    monkeypatch.setattr(text_router, 'quick_search', lambda u, c: record('quick', u, c))
+    
+    application = main.build_application(request=LocalBotAPI())
+    text_handlers = [
+        handler for handlers in application.handlers.values() for handler in handlers
+        if isinstance(handler, MessageHandler)
+    ]
+    assert len(text_handlers) == 1
+    
+    async def dispatch() -> None:
+        await application.initialize()
+        try:
+            application.user_data[42]['state'] = 'waiting_quran_search'
+            await application.process_update(text_update(1, 'mercy'))
+        finally:
+            await application.shutdown()
+    
+    asyncio.run(dispatch())
+    
+    assert calls == [('quran', 'mercy')]
+
+def test_slow_hadith_search_edits_its_progress_reply(monkeypatch):
+    async def search_hadith(keyword, collection_id='1', max_results=5):
+        await asyncio.sleep(0.05)
+        return [f"Hadith about {keyword}"]
+    
+    monkeypatch.setattr(search_api, 'search_hadith', search_hadith)
+    monkeypatch.setattr(rate_limiter, 'INTERIM_EDIT_DELAY', 0.01)
+    message = FakeMessage('prayer')
+    asyncio.run(handle_hadith_search(SimpleNamespace(message=message), SimpleNamespace(user_data={})))
+    
+    assert len(message.replies) == 1
+    assert "*Hadith Search Results*" in message.replies[0].text
+    assert message.replies[0].edits == ["🔍 Searching *Sahih Bukhari* for `prayer`...\nPlease wait..."]
+
+def test_fast_hadith_search_replies_with_results_only():
+    message = FakeMessage('prayer')
+    asyncio.run(handle_hadith_search(SimpleNamespace(message=message), SimpleNamespace(user_data={})))
+    
+    assert len(message.replies) == 1
+    assert "*Hadith Search Results*" in message.replies[0].text
+    assert message.replies[0].edits == []
@@ -0,0 +1,37 @@
+"""
+Tests for update_processor.py: which updates may run at the same time
+"""
+import asyncio
+
+from update_processor import PerChatUpdateProcessor
+
+from fakes import text_update
+
+def max_overlap(updates) -> int:
+    """Most of updates that ran at once through one processor"""
+    processor = PerChatUpdateProcessor(max_workers=8)
+    running, overlap = 0, 0
+    
+    async def handle() -> None:
+        nonlocal running, overlap
+        running += 1
+        overlap = max(overlap, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+    
+    async def process() -> None:
+        await asyncio.gather(*(processor.do_process_update(update, handle()) for update in updates))
+    
+    asyncio.run(process())
+    return overlap
+
+def test_same_user_in_private_and_group_chat_runs_one_at_a_time():
+    """Regression: a private chat used to lock only the chat, so it ran
+    alongside the same user's group message and both edited user_data"""
+    assert max_overlap([text_update(1, 'mercy', user_id=42), text_update(2, 'mercy', user_id=42, chat_id=-100)]) == 1
+
+def test_same_chat_runs_one_at_a_time():
+    assert max_overlap([text_update(1, 'mercy', user_id=42), text_update(2, 'patience', user_id=42)]) == 1
+
+def test_different_users_run_concurrently():
+    assert max_overlap([text_update(1, 'mercy', user_id=42), text_update(2, 'mercy', user_id=43)]) == 2
@@ -0,0 +1,130 @@
+"""
+Concurrent update processing with per-chat ordering
+
+Updates from different chats run concurrently, at most
+CONCURRENT_UPDATES at a time, while updates from the same chat (and the
+same user) run one after another in arrival order. A user's
+context.user_data['state'] therefore never sees two of their own
+messages at once, and one user's slow search no longer holds up
+everyone else.
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Dict, Hashable, List
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import CONCURRENT_UPDATES, CONCURRENT_UPDATES_MAX_PENDING
+
+logger = logging.getLogger(__name__)
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Bounded worker pool that serializes updates per chat and per user
+    
+    The base class admits up to max_pending updates; an admitted update
+    first waits for its chat's lock and only then for one of max_workers
+    worker slots, so a chat with a backlog never holds slots while it waits.
+    """
+    
+    def __init__(self, max_workers: int = CONCURRENT_UPDATES, max_pending: int = CONCURRENT_UPDATES_MAX_PENDING):
+        super().__init__(max(max_pending, max_workers))
+        self.max_workers = max_workers
+        self._workers = asyncio.BoundedSemaphore(max_workers)
+        self._locks: Dict[Hashable, List] = {}  # key -> [lock, updates holding or waiting for it]
+        self._wait_ms = deque(maxlen=1000)  # recent waits for a worker, for percentiles
+        self.waiting = 0
+        self.running = 0
+        self.processed = 0
+        self.max_wait_ms = 0.0
+    
+    @staticmethod
+    def _keys(update: object) -> List[Hashable]:
+        """Lock keys for an update: its chat, then its user
+        
+        The user key is taken in private chats too (where it has the chat's
+        ID), so a user's private and group updates share one lock.
+        """
+        if not isinstance(update, Update):
+            return []
+        keys = []
+        if update.effective_chat is not None:
+            keys.append(('chat', update.effective_chat.id))
+        if update.effective_user is not None:
+            keys.append(('user', update.effective_user.id))
+        return keys
+    
+    def _acquire_entries(self, keys: List[Hashable]) -> List[List]:
+        entries = []
+        for key in keys:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            entries.append(entry)
+        return entries
+    
+    def _release_entries(self, keys: List[Hashable], entries: List[List]) -> None:
+        for key, entry in zip(keys, entries):
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+    
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        # Locks are always taken chat first, then user, so two updates cannot deadlock
+        keys = self._keys(update)
+        entries = self._acquire_entries(keys)
+        arrived = time.perf_counter()
+        started = False
+        held = []
+        self.waiting += 1
+        try:
+            for entry in entries:
+                await entry[0].acquire()
+                held.append(entry[0])
+            async with self._workers:
+                wait_ms = (time.perf_counter() - arrived) * 1000
+                self._wait_ms.append(wait_ms)
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+                self.waiting -= 1
+                self.running += 1
+                started = True
+                try:
+                    await coroutine
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            for lock in held:
+                lock.release()
+            if not started:
+                self.waiting -= 1
+                coroutine.close()  # cancelled while waiting
+            self._release_entries(keys, entries)
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        if self.processed:
+            logger.info(f"Update processing: {self.stats()}")
+    
+    def stats(self) -> Dict:
+        """Backlog, in-flight updates and how long updates waited for a worker"""
+        waits = sorted(self._wait_ms)
+        
+        def percentile(p: float) -> float:
+            return round(waits[min(int(len(waits) * p), len(waits) - 1)], 2) if waits else 0.0
+        
+        return {
+            "workers": self.max_workers,
+            "waiting": self.waiting,
+            "running": self.running,
+            "processed": self.processed,
+            "chats_active": sum(1 for key in self._locks if key[0] == 'chat'),
+            "wait_ms_p50": percentile(0.5),
+            "wait_ms_p95": percentile(0.95),
+            "wait_ms_max": round(self.max_wait_ms, 2)
+        }
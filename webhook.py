@@ -0,0 +1,193 @@
+"""
+Webhook serving mode
+
+WebhookApp is a plain ASGI application: Telegram POSTs each update to
+WEBHOOK_PATH and it is put straight on the Application's update queue, so
+no long-poll round trip sits in front of an update. GET WEBHOOK_HEALTH_PATH
+reports whether the bot is running, for load balancer health checks,
+along with the state of the SearchTruth circuit breakers. GET
+METRICS_PATH returns the Prometheus metrics only with WEBHOOK_SERVE_METRICS;
+otherwise they stay on the local metrics listener.
+
+Telegram echoes WEBHOOK_SECRET_TOKEN in a header on every update. A single
+instance that registers the webhook itself may generate one per run; when
+the webhook is registered elsewhere or served by several replicas, every
+instance must share the configured token, so startup fails without it.
+
+The app drives the Application lifecycle from the ASGI lifespan events and
+runs under uvicorn (pip install uvicorn); any other ASGI server works too.
+"""
+import hmac
+import json
+import logging
+import secrets
+from typing import Dict, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import (
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_HEALTH_PATH, WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_REPLICAS, WEBHOOK_MAX_BODY_BYTES, WEBHOOK_SERVE_METRICS, METRICS_PATH
+)
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
+from search_apis import search_api
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = b'x-telegram-bot-api-secret-token'
+
+class WebhookApp:
+    """ASGI app feeding Telegram webhook updates to an Application"""
+    
+    def __init__(self, application: Application, url: Optional[str] = WEBHOOK_URL, path: str = WEBHOOK_PATH,
+                 secret_token: Optional[str] = WEBHOOK_SECRET_TOKEN, health_path: str = WEBHOOK_HEALTH_PATH,
+                 max_body_bytes: int = WEBHOOK_MAX_BODY_BYTES, replicas: int = WEBHOOK_REPLICAS,
+                 metrics_path: Optional[str] = METRICS_PATH if WEBHOOK_SERVE_METRICS else None):
+        self.application = application
+        self.url = url
+        self.path = path
+        if not secret_token:
+            if not url or replicas > 1:
+                raise RuntimeError(
+                    "WEBHOOK_SECRET_TOKEN is required when the webhook is registered elsewhere "
+                    "(WEBHOOK_URL unset) or served by several replicas (WEBHOOK_REPLICAS > 1); "
+                    "set the same token on every instance"
+                )
+            # This run registers the webhook and is its only receiver, so it may pick its own
+            secret_token = secrets.token_urlsafe(32)
+        self.secret_token = secret_token
+        self.health_path = health_path
+        self.max_body_bytes = max_body_bytes
+        self.metrics_path = metrics_path
+        self.received = 0
+        self.rejected = 0
+    
+    async def startup(self) -> None:
+        """Start the Application and register the webhook with Telegram"""
+        application = self.application
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        if self.url:
+            await application.bot.set_webhook(
+                url=self.url.rstrip('/') + self.path,
+                secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+            logger.info(f"Webhook set to {self.url.rstrip('/')}{self.path}")
+        else:
+            logger.warning("WEBHOOK_URL is not set; expecting the webhook to be registered elsewhere")
+    
+    async def shutdown(self) -> None:
+        # The webhook is left registered: other instances behind the same URL keep serving
+        application = self.application
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+    
+    async def __call__(self, scope: Dict, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+    
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.error(f"Webhook startup failed: {e}")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                try:
+                    await self.shutdown()
+                except Exception as e:
+                    logger.error(f"Webhook shutdown failed: {e}")
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    async def _http(self, scope: Dict, receive, send) -> None:
+        method, path = scope['method'], scope['path']
+        if path == self.health_path and method in ('GET', 'HEAD'):
+            running = self.application.running
+            health = {
+                "status": "ok" if running else "starting",
+                "pending_updates": self.application.update_queue.qsize(),
+                "received": self.received,
+                "rejected": self.rejected
+            }
+            if hasattr(self.application.update_processor, 'stats'):
+                health["processing"] = self.application.update_processor.stats()
+            health["circuits"] = search_api.breaker_stats()
+            await self._respond(send, 200 if running else 503, health)
+        elif self.metrics_path and path == self.metrics_path and method in ('GET', 'HEAD'):
+            await self._send(send, 200, registry.render().encode(), METRICS_CONTENT_TYPE)
+        elif path == self.path:
+            if method != 'POST':
+                await self._respond(send, 405, {"error": "method not allowed"})
+            else:
+                await self._update(scope, receive, send)
+        else:
+            await self._respond(send, 404, {"error": "not found"})
+    
+    async def _update(self, scope: Dict, receive, send) -> None:
+        token = dict(scope['headers']).get(SECRET_HEADER, b'')
+        if not hmac.compare_digest(token, self.secret_token.encode()):
+            self.rejected += 1
+            await self._respond(send, 403, {"error": "invalid secret token"})
+            return
+        
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > self.max_body_bytes:
+                self.rejected += 1
+                await self._respond(send, 413, {"error": "update too large"})
+                return
+            if not message.get('more_body'):
+                break
+        
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            self.rejected += 1
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            await self._respond(send, 400, {"error": "malformed update"})
+            return
+        
+        self.received += 1
+        await self.application.update_queue.put(update)
+        await self._respond(send, 200, {"ok": True})
+    
+    @classmethod
+    async def _respond(cls, send, status: int, payload: Dict) -> None:
+        await cls._send(send, status, json.dumps(payload).encode(), 'application/json')
+    
+    @staticmethod
+    async def _send(send, status: int, body: bytes, content_type: str) -> None:
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+def run_webhook(application: Application, listen: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT,
+                url: Optional[str] = WEBHOOK_URL) -> None:
+    """Serve the bot's webhook with uvicorn until interrupted"""
+    app = WebhookApp(application, url=url)
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("Webhook mode needs uvicorn: pip install uvicorn")
+    
+    uvicorn.run(app, host=listen, port=port, lifespan='on', log_level='warning')